@@ -1,9 +1,37 @@
 import streamlit as st
 import pandas as pd
-import sqlite3
-import hashlib
-import secrets
-from datetime import datetime
+import math
+import io
+import os
+import time
+import tempfile
+import functools
+from datetime import datetime, date, timedelta
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+# Camada de dados (o esquema do banco é preparado uma única vez por processo)
+from statusrota import (
+    ARQUIVO_IDADE_DIAS, BACKUP_DIRETORIO, BACKUP_MANTER, BUSCA_MAX_RESULTADOS, COLUNAS_IMPORTACAO,
+    DESEMPENHO_MAX_REGISTROS, FORMATOS_EXPORTACAO, GEO_RAIO_PADRAO_KM, OPCOES_ALIMENTACAO, OPCOES_STATUS,
+    ROTAS_POR_PAGINA,
+    CODIGOS_ALIMENTACAO, CODIGOS_STATUS, COLUNAS_CODIFICADAS, STATUS_EM_ANDAMENTO, categorizar_status,
+    codificar_status, registro_com_rotulos, rotulo_status,
+    finalizar_execucao, get_registro_desempenho, iniciar_execucao, resumo_desempenho, versao_banco,
+    reconstruir_estatisticas,
+    criar_sessao, criar_usuario, encerrar_sessao, excluir_usuario, get_all_usuarios, validar_sessao,
+    verificar_login,
+    add_cidade, add_pop, add_rota, buscar_rotas, contar_rotas_by_pop, delete_rota, excluir_cidades, excluir_pops,
+    excluir_rotas, get_all_cidades, get_all_pops, get_assinatura_rotas_pop, get_posicao_rota, get_rota, listar_cidades,
+    listar_cidades_by_pop, listar_pagina_rotas_by_pop, listar_pops, listar_rotas_by_pop, mover_cidades, mover_rotas,
+    update_status_rota, update_status_rotas_em_lote,
+    contar_cidades, get_burndown, get_estatisticas_alimentacao, get_estatisticas_status,
+    get_tempo_em_andamento, get_vazao_diaria,
+    exportar_rotas_para_arquivo, gerar_relatorio_pop,
+    importar_planilha, ler_planilha, validar_planilha,
+    arquivar_rotas, get_rotas_arquivadas_by_pop, restaurar_rotas_arquivadas,
+    atualizar_coordenadas_pop, extrair_coordenadas, geocodificar_pops, get_mapa_pops, ler_gazetteer, pops_proximos,
+    criar_backup, listar_backups,
+)
 
 # Configuração da página
 st.set_page_config(
@@ -12,320 +40,396 @@ st.set_page_config(
     layout="wide"
 )
 
-# Funções de segurança
-def hash_password(password):
-    """Gera hash da senha"""
-    return hashlib.sha256(password.encode()).hexdigest()
+# Atualização automática e paginação das listas de rotas
+INTERVALO_ATUALIZACAO_SEGUNDOS = 5
+OPCOES_ROTAS_POR_PAGINA = [10, 25, 50, 100]
 
-def generate_session_token():
-    """Gera token de sessão seguro"""
-    return secrets.token_hex(32)
+# Os status vêm do banco como códigos: são as opções dos selectbox, exibidas pelo rótulo
+CODIGOS_OPCOES_STATUS = list(CODIGOS_STATUS.values())
+CODIGOS_OPCOES_ALIMENTACAO = list(CODIGOS_ALIMENTACAO.values())
 
-# Inicialização do banco de dados
-def init_db():
-    conn = sqlite3.connect('pops_rotas.db', check_same_thread=False)
-    c = conn.cursor()
-    
-    # Tabela de Usuários
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS usuarios (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL,
-            nome_completo TEXT NOT NULL,
-            matricula TEXT UNIQUE NOT NULL,
-            permissao TEXT DEFAULT 'USER',
-            data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            ativo INTEGER DEFAULT 1
-        )
-    ''')
-    
-    # Tabela de POPs
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS pops (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            nome_pop TEXT NOT NULL,
-            localizacao TEXT,
-            capacidade INTEGER,
-            data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Tabela de Cidades
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS cidades (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            nome_cidade TEXT NOT NULL,
-            pop_id INTEGER,
-            data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (pop_id) REFERENCES pops (id)
-        )
-    ''')
-    
-    # Tabela de Rotas
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS rotas (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            pop_id INTEGER,
-            cidade_id INTEGER,
-            nome_rota TEXT NOT NULL,
-            status_lancamento TEXT DEFAULT 'PENDENTE',
-            status_fusao TEXT DEFAULT 'PENDENTE',
-            observacoes_lancamento TEXT,
-            observacoes_fusao TEXT,
-            status_alimentacao TEXT,
-            data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            data_atualizacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            usuario_atualizacao TEXT,
-            FOREIGN KEY (pop_id) REFERENCES pops (id),
-            FOREIGN KEY (cidade_id) REFERENCES cidades (id)
+# Instrumentação da interface (as consultas são medidas pela camada de dados)
+def contar_widgets():
+    """Widgets criados na execução atual do script, ou None se não for possível saber"""
+    # Não há API pública para isso; o conjunto interno mudou de lugar entre versões do Streamlit
+    ctx = get_script_run_ctx()
+    ids = getattr(getattr(ctx, 'shared', None), 'widget_ids_this_run', None)
+    if ids is None:
+        ids = getattr(ctx, 'widget_ids_this_run', None)
+    if ids is None:
+        return None
+    return len(ids.snapshot()) if hasattr(ids, 'snapshot') else len(ids)
+
+# Contexto de dados da execução atual do script
+class ContextoDados:
+    """Carrega cada conjunto de dados no máximo uma vez por execução (rerun) do script,
+    junto com os dicionários de opções derivados dele.
+
+    As opções vêm de registros leves (listar_*); os DataFrames só são lidos pelas
+    páginas que exibem tabelas ou gráficos.
+    """
+
+    def __init__(self):
+        self.carregamentos = 0
+        self._cidades_por_pop = {}
+
+    def _carregar(self, funcao, *args):
+        self.carregamentos += 1
+        return funcao(*args)
+
+    @functools.cached_property
+    def pops_df(self):
+        return self._carregar(get_all_pops)
+
+    @functools.cached_property
+    def opcoes_pops(self):
+        """Rótulo "nome (ID: id)" -> id do POP"""
+        return {f"{pop['nome_pop']} (ID: {pop['id']})": pop['id'] for pop in self._carregar(listar_pops)}
+
+    @functools.cached_property
+    def cidades_df(self):
+        return self._carregar(get_all_cidades)
+
+    @functools.cached_property
+    def opcoes_cidades(self):
+        """Rótulo "cidade (POP: nome)" -> id da cidade"""
+        return {f"{cidade['nome_cidade']} (POP: {cidade['nome_pop']})": cidade['id']
+                for cidade in self._carregar(listar_cidades)}
+
+    def opcoes_cidades_do_pop(self, pop_id):
+        """Nome da cidade -> id, para as cidades do POP"""
+        if pop_id not in self._cidades_por_pop:
+            self._cidades_por_pop[pop_id] = {cidade['nome_cidade']: cidade['id']
+                                             for cidade in self._carregar(listar_cidades_by_pop, pop_id)}
+        return self._cidades_por_pop[pop_id]
+
+    @functools.cached_property
+    def usuarios_df(self):
+        return self._carregar(get_all_usuarios)
+
+    @functools.cached_property
+    def opcoes_usuarios(self):
+        """Rótulo "nome (username)" -> id, sem o admin padrão"""
+        usuarios_df = self.usuarios_df[self.usuarios_df['username'] != 'admin']
+        rotulos = usuarios_df['nome_completo'].astype(str) + " (" + usuarios_df['username'].astype(str) + ")"
+        return dict(zip(rotulos, usuarios_df['id'].tolist()))
+
+# Atualização automática das listas
+def acompanhar_alteracoes(chave, assinatura=None, pausar=False):
+    """Recarrega a página quando os dados exibidos mudarem, sem o usuário clicar em atualizar.
+
+    assinatura: função sem argumentos cujo valor muda junto com os dados da página;
+    sem ela, qualquer alteração no banco recarrega a página.
+    Deve ser chamada antes de ler os dados exibidos, para nenhuma alteração escapar.
+    """
+    if not st.toggle("🔄 Atualização automática", value=True, key=f"{chave}_ativa"):
+        return
+    if pausar:
+        st.caption("Atualização automática pausada durante a edição em lote.")
+        return
+    st.session_state[chave] = versao_banco()
+    _verificar_alteracoes(chave, assinatura, assinatura() if assinatura else None)
+
+@st.fragment(run_every=INTERVALO_ATUALIZACAO_SEGUNDOS)
+def _verificar_alteracoes(chave, assinatura, valor):
+    # Nas execuções periódicas só o PRAGMA data_version é consultado, até algo mudar
+    versao = versao_banco()
+    if versao == st.session_state.get(chave):
+        return
+    st.session_state[chave] = versao
+    if assinatura is None or assinatura() != valor:
+        st.rerun(scope="app")
+
+# Paginação das rotas na interface
+def _cursor_rota(rota):
+    return (rota['data_criacao'], rota['id'])
+
+def _ir_para_pagina(chave, pagina, apos=None, antes=None):
+    # Voltar à primeira página sempre descarta o cursor para ancorar no início
+    if pagina <= 1:
+        pagina, apos, antes = 1, None, None
+    st.session_state[chave].update(pagina=pagina, apos=apos, antes=antes)
+
+def paginar_rotas(chave, pop_id):
+    """Busca apenas a página atual de rotas do POP (registros sqlite3.Row) e desenha a navegação"""
+    estado = st.session_state.get(chave)
+    if estado is None or estado['pop_id'] != pop_id:
+        estado = {'pop_id': pop_id, 'pagina': 1, 'apos': None, 'antes': None}
+        st.session_state[chave] = estado
+
+    tamanho = st.selectbox(
+        "Rotas por página:",
+        OPCOES_ROTAS_POR_PAGINA,
+        index=OPCOES_ROTAS_POR_PAGINA.index(ROTAS_POR_PAGINA),
+        key=f"{chave}_tamanho",
+        on_change=_ir_para_pagina,
+        args=(chave, 1)
+    )
+
+    total = contar_rotas_by_pop(pop_id)
+    # Uma rota a mais só para saber se existe a página seguinte (ou, voltando, a anterior)
+    rotas = listar_pagina_rotas_by_pop(pop_id, tamanho + 1, estado['apos'], estado['antes'])
+
+    # Página ficou vazia (ex.: rotas excluídas); volta para o início
+    if not rotas and estado['pagina'] > 1:
+        _ir_para_pagina(chave, 1)
+        rotas = listar_pagina_rotas_by_pop(pop_id, tamanho + 1)
+
+    # Voltando, a página só é completa se ainda houver rotas antes dela;
+    # senão chegou ao início da lista, e a primeira página é buscada inteira
+    if estado['antes'] is not None and len(rotas) <= tamanho:
+        _ir_para_pagina(chave, 1)
+        rotas = listar_pagina_rotas_by_pop(pop_id, tamanho + 1)
+
+    if estado['antes'] is not None:
+        tem_anterior, tem_proxima = True, True
+        rotas = rotas[-tamanho:]
+    else:
+        tem_anterior, tem_proxima = estado['apos'] is not None, len(rotas) > tamanho
+        rotas = rotas[:tamanho]
+
+    total_paginas = max(1, math.ceil(total / tamanho))
+    pagina = min(estado['pagina'], total_paginas)
+    if not tem_proxima:
+        # Página aberta fora do alinhamento (abrir_rota) termina antes da conta
+        total_paginas = pagina
+
+    if tem_anterior or tem_proxima:
+        col_ant, col_info, col_prox = st.columns([1, 2, 1])
+        with col_ant:
+            st.button(
+                "⬅️ Anterior",
+                key=f"{chave}_anterior",
+                disabled=not tem_anterior or not rotas,
+                on_click=_ir_para_pagina,
+                args=(chave, pagina - 1),
+                kwargs={'antes': _cursor_rota(rotas[0])} if rotas else {}
+            )
+        with col_info:
+            st.caption(f"Página {pagina} de {total_paginas} ({total} rotas)")
+        with col_prox:
+            st.button(
+                "Próxima ➡️",
+                key=f"{chave}_proxima",
+                disabled=not tem_proxima or not rotas,
+                on_click=_ir_para_pagina,
+                args=(chave, pagina + 1),
+                kwargs={'apos': _cursor_rota(rotas[-1])} if rotas else {}
+            )
+
+    return rotas, total
+
+def abrir_rota(rota_id, pop_id, rotulo_pop):
+    """Leva para Visualizar Rotas já no POP e na página da rota, com ela expandida"""
+    anteriores, cursor = get_posicao_rota(rota_id)
+    tamanho = st.session_state.get('paginacao_visualizar_tamanho', ROTAS_POR_PAGINA)
+    estado = {'pop_id': pop_id, 'pagina': 1, 'apos': None, 'antes': None}
+    if anteriores >= tamanho:
+        # A página passa a começar na rota aberta
+        estado.update(pagina=anteriores // tamanho + 1, apos=cursor)
+    st.session_state['paginacao_visualizar'] = estado
+    st.session_state['pop_visualizar'] = rotulo_pop
+    st.session_state['menu'] = "Visualizar Rotas"
+    st.session_state['rota_aberta'] = rota_id
+
+# Edição em lote das rotas
+COLUNAS_EDITAVEIS_LOTE = ['status_lancamento', 'status_fusao', 'status_alimentacao',
+                          'observacoes_lancamento', 'observacoes_fusao']
+
+def rotas_alteradas(original_df, editado_df):
+    """Compara a grade editada com a original e retorna só as rotas que mudaram"""
+    # None/NaN e texto vazio são equivalentes para a comparação
+    original = original_df[COLUNAS_EDITAVEIS_LOTE].astype(object).where(original_df[COLUNAS_EDITAVEIS_LOTE].notna(), '')
+    editado = editado_df[COLUNAS_EDITAVEIS_LOTE].astype(object).where(editado_df[COLUNAS_EDITAVEIS_LOTE].notna(), '')
+    mudou = (original != editado).any(axis=1)
+
+    # A grade mostra os rótulos; o banco grava os códigos
+    alteracoes = codificar_status(editado[mudou].replace('', None))
+    alteracoes['id'] = editado_df.loc[mudou, 'id'].astype(int)
+    alteracoes['versao'] = original_df.loc[mudou, 'versao'].astype(int)
+    return alteracoes.to_dict('records')
+
+def editar_rotas_em_lote(chave, rotas, usuario):
+    """Grade editável das rotas da página; grava todas as alterações de uma vez"""
+    # A grade é o único uso da página que precisa de um DataFrame (status como categóricos)
+    rotas_df = categorizar_status(pd.DataFrame([dict(rota) for rota in rotas]))
+    with st.form(chave):
+        editado_df = st.data_editor(
+            rotas_df[['id', 'nome_rota', 'nome_cidade'] + COLUNAS_EDITAVEIS_LOTE],
+            key=f"{chave}_editor",
+            hide_index=True,
+            use_container_width=True,
+            disabled=['id', 'nome_rota', 'nome_cidade'],
+            column_config={
+                'id': st.column_config.NumberColumn("ID"),
+                'nome_rota': st.column_config.TextColumn("Rota"),
+                'nome_cidade': st.column_config.TextColumn("Cidade"),
+                'status_lancamento': st.column_config.SelectboxColumn("Lançamento", options=OPCOES_STATUS, required=True),
+                'status_fusao': st.column_config.SelectboxColumn("Fusão", options=OPCOES_STATUS, required=True),
+                'status_alimentacao': st.column_config.SelectboxColumn("Alimentação", options=OPCOES_ALIMENTACAO),
+                'observacoes_lancamento': st.column_config.TextColumn("Obs. Lançamento"),
+                'observacoes_fusao': st.column_config.TextColumn("Obs. Fusão"),
+            }
         )
-    ''')
-    
-    # Criar usuário admin padrão se não existir
-    c.execute('''
-        INSERT OR IGNORE INTO usuarios (username, password_hash, nome_completo, matricula, permissao)
-        VALUES (?, ?, ?, ?, ?)
-    ''', ('admin', hash_password('admin123'), 'Administrador do Sistema', '000000', 'ADMIN'))
-    
-    conn.commit()
-    conn.close()
+        submitted = st.form_submit_button("💾 Salvar Alterações em Lote")
 
-# Funções para gerenciamento de usuários
-def criar_usuario(username, password, nome_completo, matricula, permissao='USER'):
-    conn = sqlite3.connect('pops_rotas.db', check_same_thread=False)
-    c = conn.cursor()
-    try:
-        c.execute('''
-            INSERT INTO usuarios (username, password_hash, nome_completo, matricula, permissao)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (username, hash_password(password), nome_completo, matricula, permissao))
-        conn.commit()
-        return True
-    except sqlite3.IntegrityError:
-        return False
-    finally:
-        conn.close()
-
-def verificar_login(username, password):
-    conn = sqlite3.connect('pops_rotas.db', check_same_thread=False)
-    c = conn.cursor()
-    c.execute('''
-        SELECT id, username, nome_completo, permissao, matricula 
-        FROM usuarios 
-        WHERE username = ? AND password_hash = ? AND ativo = 1
-    ''', (username, hash_password(password)))
-    usuario = c.fetchone()
-    conn.close()
-    
-    if usuario:
-        return {
-            'id': usuario[0],
-            'username': usuario[1],
-            'nome_completo': usuario[2],
-            'permissao': usuario[3],
-            'matricula': usuario[4]
-        }
-    return None
-
-def get_all_usuarios():
-    conn = sqlite3.connect('pops_rotas.db', check_same_thread=False)
-    df = pd.read_sql('''
-        SELECT id, username, nome_completo, matricula, permissao, data_criacao 
-        FROM usuarios 
-        WHERE ativo = 1
-    ''', conn)
-    conn.close()
-    return df
-
-def excluir_usuario(usuario_id):
-    conn = sqlite3.connect('pops_rotas.db', check_same_thread=False)
-    c = conn.cursor()
-    c.execute('UPDATE usuarios SET ativo = 0 WHERE id = ?', (usuario_id,))
-    conn.commit()
-    conn.close()
-
-# Funções para operações no banco de dados - POPs
-def add_pop(nome_pop, localizacao, capacidade):
-    conn = sqlite3.connect('pops_rotas.db', check_same_thread=False)
-    c = conn.cursor()
-    c.execute('INSERT INTO pops (nome_pop, localizacao, capacidade) VALUES (?, ?, ?)',
-              (nome_pop, localizacao, capacidade))
-    conn.commit()
-    conn.close()
-
-def get_all_pops():
-    conn = sqlite3.connect('pops_rotas.db', check_same_thread=False)
-    df = pd.read_sql('''
-        SELECT p.*, COUNT(r.id) as quantidade_rotas 
-        FROM pops p 
-        LEFT JOIN rotas r ON p.id = r.pop_id 
-        GROUP BY p.id
-    ''', conn)
-    conn.close()
-    return df
-
-def delete_pop(pop_id):
-    conn = sqlite3.connect('pops_rotas.db', check_same_thread=False)
-    c = conn.cursor()
-    # Primeiro deleta as rotas associadas
-    c.execute('DELETE FROM rotas WHERE pop_id = ?', (pop_id,))
-    # Depois deleta as cidades associadas
-    c.execute('DELETE FROM cidades WHERE pop_id = ?', (pop_id,))
-    # Depois deleta o POP
-    c.execute('DELETE FROM pops WHERE id = ?', (pop_id,))
-    conn.commit()
-    conn.close()
-
-# Funções para operações no banco de dados - Cidades
-def add_cidade(nome_cidade, pop_id):
-    conn = sqlite3.connect('pops_rotas.db', check_same_thread=False)
-    c = conn.cursor()
-    c.execute('INSERT INTO cidades (nome_cidade, pop_id) VALUES (?, ?)',
-              (nome_cidade, pop_id))
-    conn.commit()
-    conn.close()
-
-def get_cidades_by_pop(pop_id):
-    conn = sqlite3.connect('pops_rotas.db', check_same_thread=False)
-    df = pd.read_sql('SELECT * FROM cidades WHERE pop_id = ? ORDER BY nome_cidade', conn, params=(pop_id,))
-    conn.close()
-    return df
-
-def get_all_cidades():
-    conn = sqlite3.connect('pops_rotas.db', check_same_thread=False)
-    df = pd.read_sql('''
-        SELECT c.*, p.nome_pop 
-        FROM cidades c 
-        LEFT JOIN pops p ON c.pop_id = p.id 
-        ORDER BY p.nome_pop, c.nome_cidade
-    ''', conn)
-    conn.close()
-    return df
-
-def delete_cidade(cidade_id):
-    conn = sqlite3.connect('pops_rotas.db', check_same_thread=False)
-    c = conn.cursor()
-    # Primeiro verifica se existem rotas vinculadas a esta cidade
-    c.execute('SELECT COUNT(*) FROM rotas WHERE cidade_id = ?', (cidade_id,))
-    count_rotas = c.fetchone()[0]
-    
-    if count_rotas > 0:
-        conn.close()
-        return False, f"Não é possível excluir a cidade pois existem {count_rotas} rota(s) vinculada(s) a ela."
-    
-    # Se não houver rotas vinculadas, exclui a cidade
-    c.execute('DELETE FROM cidades WHERE id = ?', (cidade_id,))
-    conn.commit()
-    conn.close()
-    return True, "Cidade excluída com sucesso!"
-
-# Funções para operações no banco de dados - Rotas
-def add_rota(pop_id, cidade_id, nome_rota):
-    conn = sqlite3.connect('pops_rotas.db', check_same_thread=False)
-    c = conn.cursor()
-    c.execute('INSERT INTO rotas (pop_id, cidade_id, nome_rota) VALUES (?, ?, ?)',
-              (pop_id, cidade_id, nome_rota))
-    conn.commit()
-    conn.close()
-
-def get_rotas_by_pop(pop_id):
-    conn = sqlite3.connect('pops_rotas.db', check_same_thread=False)
-    df = pd.read_sql('''
-        SELECT r.*, c.nome_cidade, p.nome_pop 
-        FROM rotas r 
-        LEFT JOIN cidades c ON r.cidade_id = c.id 
-        LEFT JOIN pops p ON r.pop_id = p.id 
-        WHERE r.pop_id = ? 
-        ORDER BY r.data_criacao ASC, r.id ASC
-    ''', conn, params=(pop_id,))
-    conn.close()
-    return df
-
-def get_rotas_by_cidade(cidade_id):
-    conn = sqlite3.connect('pops_rotas.db', check_same_thread=False)
-    df = pd.read_sql('''
-        SELECT r.*, c.nome_cidade, p.nome_pop 
-        FROM rotas r 
-        LEFT JOIN cidades c ON r.cidade_id = c.id 
-        LEFT JOIN pops p ON r.pop_id = p.id 
-        WHERE r.cidade_id = ? 
-        ORDER BY r.data_criacao ASC, r.id ASC
-    ''', conn, params=(cidade_id,))
-    conn.close()
-    return df
-
-def update_status_rota(rota_id, status_lancamento, status_fusao, observacoes_lancamento=None, observacoes_fusao=None, status_alimentacao=None, usuario=None):
-    conn = sqlite3.connect('pops_rotas.db', check_same_thread=False)
-    c = conn.cursor()
-    c.execute('''
-        UPDATE rotas 
-        SET status_lancamento = ?, status_fusao = ?, observacoes_lancamento = ?, 
-            observacoes_fusao = ?, status_alimentacao = ?, 
-            data_atualizacao = CURRENT_TIMESTAMP, usuario_atualizacao = ?
-        WHERE id = ?
-    ''', (status_lancamento, status_fusao, observacoes_lancamento, observacoes_fusao, status_alimentacao, usuario, rota_id))
-    conn.commit()
-    conn.close()
-
-def delete_rota(rota_id):
-    conn = sqlite3.connect('pops_rotas.db', check_same_thread=False)
-    c = conn.cursor()
-    c.execute('DELETE FROM rotas WHERE id = ?', (rota_id,))
-    conn.commit()
-    conn.close()
-
-def get_estatisticas_status():
-    conn = sqlite3.connect('pops_rotas.db', check_same_thread=False)
-    df_lancamento = pd.read_sql('SELECT status_lancamento as status, COUNT(*) as count FROM rotas GROUP BY status_lancamento', conn)
-    df_fusao = pd.read_sql('SELECT status_fusao as status, COUNT(*) as count FROM rotas GROUP BY status_fusao', conn)
-    conn.close()
-    return df_lancamento, df_fusao
-
-# Função para gerar relatório copiável
-def gerar_relatorio_copiavel(pop_nome, rotas_df):
-    """Gera um relatório formatado para cópia"""
-    
-    # Mapeamento de emojis para status
-    emojis_lancamento = {
-        "PENDENTE": "☑️",
-        "EM ANDAMENTO": "⚙️",
-        "FINALIZADA": "✅"
-    }
-    
-    emojis_fusao = {
-        "PENDENTE": "☑️",
-        "EM ANDAMENTO": "⚙️",
-        "FINALIZADA": "✳️"
+    # Conflitos do último salvamento (a grade já foi recarregada com os valores atuais)
+    conflitos = st.session_state.pop(f"{chave}_conflitos", None)
+    if conflitos:
+        st.warning(f"{len(conflitos)} rota(s) foram alteradas por outro usuário e não foram salvas "
+                   f"(IDs: {', '.join(map(str, conflitos))}). Confira os valores atuais e edite novamente.")
+
+    if submitted:
+        alteracoes = rotas_alteradas(rotas_df, editado_df)
+        if alteracoes:
+            quantidade, conflitos = update_status_rotas_em_lote(alteracoes, usuario)
+            if conflitos:
+                st.session_state[f"{chave}_conflitos"] = conflitos
+            st.success(f"{quantidade} rota(s) atualizada(s)!")
+            st.rerun()
+        else:
+            st.info("Nenhuma alteração para salvar.")
+
+# Ações em lote sobre rotas selecionadas (cada uma é uma única instrução no banco)
+def acoes_em_lote_rotas(pop_id, cidade_options, opcoes_destino, usuario):
+    """Exclui ou transfere para outra cidade várias rotas do POP de uma vez.
+
+    cidade_options: cidades do POP (nome -> id); opcoes_destino: todas as cidades.
+    """
+    cidade_origem = st.selectbox("Filtrar por cidade:", ["Todas"] + list(cidade_options.keys()), key='lote_cidade_origem')
+    rotas_pop = listar_rotas_by_pop(pop_id)
+    if cidade_origem != "Todas":
+        rotas_pop = [rota for rota in rotas_pop if rota['cidade_id'] == cidade_options[cidade_origem]]
+    if not rotas_pop:
+        st.info("Nenhuma rota para selecionar.")
+        return
+
+    rotulos = {rota['id']: f"{rota['nome_rota']} - Cidade: {rota['nome_cidade']} (ID: {rota['id']})" for rota in rotas_pop}
+    if st.checkbox(f"Selecionar todas as {len(rotulos)} rota(s) listadas", key='lote_todas_rotas'):
+        rota_ids = list(rotulos)
+    else:
+        rota_ids = st.multiselect("Rotas:", list(rotulos), format_func=rotulos.__getitem__, key='lote_rotas')
+
+    col1, col2 = st.columns(2)
+    with col1:
+        # Qualquer cidade, de qualquer POP: a rota passa para o POP da cidade de destino
+        cidade_destino = st.selectbox("Mover para a cidade:", list(opcoes_destino.keys()), key='lote_cidade_destino')
+        if st.button("🔀 Mover Rotas Selecionadas", disabled=not rota_ids):
+            try:
+                movidas = mover_rotas(rota_ids, opcoes_destino[cidade_destino], usuario)
+            except ValueError as erro:
+                # Ex.: a cidade foi excluída por outra pessoa depois de listada
+                st.error(str(erro))
+            else:
+                st.success(f"{movidas} rota(s) movida(s) para '{cidade_destino}'!")
+                st.rerun()
+
+    with col2:
+        confirmar = st.checkbox("Confirmo a exclusão das rotas selecionadas", key='lote_confirmar_exclusao')
+        if st.button("🗑️ Excluir Rotas Selecionadas", disabled=not (rota_ids and confirmar)):
+            excluidas = excluir_rotas(rota_ids)
+            st.success(f"{excluidas} rota(s) excluída(s)!")
+            st.rerun()
+
+def mostrar_rotas_arquivadas(pop_id):
+    """Tabela das rotas arquivadas do POP (lidas só quando pedidas); retorna o DataFrame"""
+    arquivadas_df = get_rotas_arquivadas_by_pop(pop_id)
+    if arquivadas_df.empty:
+        st.info("Este POP não possui rotas arquivadas.")
+        return arquivadas_df
+    exibicao = arquivadas_df[['id', 'nome_rota', 'nome_cidade', 'status_lancamento', 'status_fusao',
+                              'status_alimentacao', 'data_atualizacao', 'data_arquivamento']].copy()
+    for coluna in ('data_atualizacao', 'data_arquivamento'):
+        exibicao[coluna] = pd.to_datetime(exibicao[coluna], format='mixed').dt.strftime('%d/%m/%Y %H:%M')
+    st.dataframe(exibicao, use_container_width=True, hide_index=True)
+    return arquivadas_df
+
+# Conflitos de edição de rotas (controle de concorrência otimista)
+CAMPOS_EDICAO_ROTA = {
+    'status_lancamento': "Status Lançamento",
+    'observacoes_lancamento': "Observações Lançamento",
+    'status_fusao': "Status Fusão",
+    'status_alimentacao': "Status Alimentação",
+    'observacoes_fusao': "Observações Fusão",
+}
+PREFIXOS_WIDGETS_ROTA = ['lanc_', 'obs_lanc_', 'fusao_', 'alim_select_', 'obs_fusao_', 'versao_',
+                         'lanc_view_', 'obs_lanc_view_', 'fusao_view_', 'alim_select_view_', 'obs_fusao_view_', 'versao_view_']
+
+def _texto_campo_rota(campo, valor):
+    # Status chegam como códigos; texto vazio e None são exibidos igualmente
+    if campo in COLUNAS_CODIFICADAS:
+        valor = rotulo_status(campo, valor)
+    return valor or '—'
+
+def registrar_conflito_rota(rota_id, edicao):
+    """Guarda as alterações não gravadas para o usuário mesclar com a versão atual"""
+    st.session_state[f"conflito_{rota_id}"] = edicao
+
+def _encerrar_conflito_rota(rota_id):
+    st.session_state.pop(f"conflito_{rota_id}", None)
+    # Os campos da rota voltam a ser preenchidos a partir do banco
+    for prefixo in PREFIXOS_WIDGETS_ROTA:
+        st.session_state.pop(f"{prefixo}{rota_id}", None)
+
+def _salvar_mesclagem(rota_id, atual, usuario):
+    mesclado = {
+        campo: (st.session_state[f"conflito_{rota_id}"][campo]
+                if st.session_state.get(f"mesclar_{campo}_{rota_id}") == 'minha' else atual[campo])
+        for campo in CAMPOS_EDICAO_ROTA
     }
+    if update_status_rota(rota_id, mesclado['status_lancamento'], mesclado['status_fusao'],
+                          mesclado['observacoes_lancamento'], mesclado['observacoes_fusao'],
+                          mesclado['status_alimentacao'], usuario, versao=atual['versao']):
+        _encerrar_conflito_rota(rota_id)
+    # Se a rota mudou de novo, o conflito continua aberto e é exibido com os valores novos
+
+def mostrar_conflito_rota(rota_id, usuario):
+    """Mostra a versão atual da rota ao lado das alterações pendentes e permite mesclar"""
+    edicao = st.session_state[f"conflito_{rota_id}"]
+    atual = get_rota(rota_id)
     
-    emojis_alimentacao = {
-        "ALIMENTADA": "✴️",
-        "EM PRODUÇÃO": "⚙️",
-        "SEM SINAL PARCIAL": "⚠️",
-        "SEM SINAL TOTAL": "🚫"
-    }
+    if atual is None:
+        st.error("Esta rota foi excluída por outro usuário; suas alterações não foram salvas.")
+        st.button("OK", key=f"mesclar_ok_{rota_id}", on_click=_encerrar_conflito_rota, args=(rota_id,))
+        return
     
-    relatorio = f"POP {pop_nome}\n"
-    relatorio += "LEGENDA: (LANÇAMENTO: PENDENTE ☑️ / EM ANDAMENTO ⚙️ / FINALIZADA ✅)\n"
-    relatorio += "(FUSÃO: PENDENTE ☑️ / EM ANDAMENTO: ALIMENTADA ✴️, SEM SINAL PARCIAL ⚠️ / SEM SINAL TOTAL 🚫/ FINALIZADA ✳️)\n\n"
+    st.warning(f"⚠️ Esta rota foi alterada por {atual['usuario_atualizacao'] or 'outro usuário'} enquanto você editava. "
+               "Escolha qual valor manter em cada campo diferente:")
     
-    for _, rota in rotas_df.iterrows():
-        # Emoji do lançamento
-        emoji_lancamento = emojis_lancamento.get(rota['status_lancamento'], "☑️")
-        
-        # Emoji da fusão
-        if rota['status_fusao'] == "EM ANDAMENTO" and rota['status_alimentacao']:
-            emoji_fusao = emojis_alimentacao.get(rota['status_alimentacao'], "⚙️")
-        else:
-            emoji_fusao = emojis_fusao.get(rota['status_fusao'], "☑️")
-        
-        # Usuário da última atualização
-        usuario = rota['usuario_atualizacao'] or 'N/A'
-        
-        relatorio += f"{rota['nome_rota']} - {emoji_lancamento}{emoji_fusao} {rota['nome_cidade']} ({usuario})\n"
+    for campo, rotulo in CAMPOS_EDICAO_ROTA.items():
+        # Observação vazia e sem observação são o mesmo valor (o código 0 de um status não)
+        valor_atual, valor_meu = (None if valor == '' else valor for valor in (atual[campo], edicao[campo]))
+        if valor_atual == valor_meu:
+            continue
+        st.radio(
+            rotulo,
+            ['atual', 'minha'],
+            format_func=lambda opcao, a=_texto_campo_rota(campo, valor_atual), m=_texto_campo_rota(campo, valor_meu):
+                f"Atual: {a}" if opcao == 'atual' else f"Sua edição: {m}",
+            key=f"mesclar_{campo}_{rota_id}",
+            index=1,
+            horizontal=True
+        )
     
-    return relatorio
+    col1, col2 = st.columns(2)
+    with col1:
+        st.button("🔀 Salvar Mesclagem", key=f"mesclar_salvar_{rota_id}",
+                  on_click=_salvar_mesclagem, args=(rota_id, atual, usuario))
+    with col2:
+        st.button("↩️ Descartar Minhas Alterações", key=f"mesclar_descartar_{rota_id}",
+                  on_click=_encerrar_conflito_rota, args=(rota_id,))
+
+# Relatório geral
+def _arquivo_relatorio(formato):
+    # Chamado pelo Streamlit só no clique do download, que serve o conteúdo em memória;
+    # a exportação em lotes vai para um arquivo temporário e só o resultado final é lido
+    with tempfile.TemporaryFile(mode='w+b') as arquivo:
+        texto = io.TextIOWrapper(arquivo, encoding='utf-8', newline='')
+        exportar_rotas_para_arquivo(texto, formato)
+        texto.flush()
+        texto.detach()
+        arquivo.seek(0)
+        return arquivo.read()
 
 # Sistema de autenticação
 def login():
@@ -339,28 +443,49 @@ def login():
         if submitted:
             usuario = verificar_login(username, password)
             if usuario:
+                token = criar_sessao(usuario['id'])
                 st.session_state['usuario'] = usuario
                 st.session_state['logado'] = True
-                st.session_state['token'] = generate_session_token()
+                st.session_state['token'] = token
+                # O token na URL permite retomar a sessão após recarregar a página
+                st.query_params['sessao'] = token
                 st.sidebar.success(f"Bem-vindo, {usuario['nome_completo']}!")
                 st.rerun()
             else:
                 st.sidebar.error("Usuário ou senha inválidos!")
 
 def logout():
+    if st.session_state.get('token'):
+        encerrar_sessao(st.session_state['token'])
+    st.query_params.clear()
     st.session_state.clear()
     st.rerun()
 
+def retomar_sessao():
+    """Valida a sessão atual ou retoma a do token da URL; retorna True se o usuário estiver logado"""
+    token = st.session_state.get('token') or st.query_params.get('sessao')
+    usuario = validar_sessao(token) if token else None
+    
+    if usuario is None:
+        if st.session_state.get('logado'):
+            # Sessão expirada ou revogada
+            st.session_state.clear()
+            st.query_params.clear()
+        return False
+    
+    st.session_state['usuario'] = usuario
+    st.session_state['logado'] = True
+    st.session_state['token'] = token
+    return True
+
 def usuario_eh_admin():
     return st.session_state.get('usuario', {}).get('permissao') == 'ADMIN'
 
-# Inicializar banco de dados
-init_db()
-
 # Interface principal
-def main():
-    # Verificar se usuário está logado
-    if 'logado' not in st.session_state or not st.session_state['logado']:
+def main(dados):
+    """dados: ContextoDados compartilhado por todas as seções desta execução"""
+    # Verificar se usuário está logado (sessão atual ou token da URL)
+    if not retomar_sessao():
         login()
         return
     
@@ -380,11 +505,11 @@ def main():
     
     # Menu baseado na permissão
     if usuario_eh_admin():
-        menu_options = ["Cadastrar POP", "Cadastrar Cidade", "Listar POPs", "Listar Cidades", "Gerenciar Rotas", "Visualizar Rotas", "Estatísticas", "Gerenciar Usuários"]
+        menu_options = ["Cadastrar POP", "Cadastrar Cidade", "Listar POPs", "Listar Cidades", "Gerenciar Rotas", "Visualizar Rotas", "Buscar Rotas", "Estatísticas", "Mapa", "Relatório Geral", "Importar Planilha", "Gerenciar Usuários", "Desempenho", "Backups", "Arquivo de Rotas"]
     else:
-        menu_options = ["Visualizar Rotas", "Estatísticas"]
+        menu_options = ["Visualizar Rotas", "Buscar Rotas", "Estatísticas", "Mapa"]
     
-    menu = st.sidebar.selectbox("Menu", menu_options)
+    menu = st.sidebar.selectbox("Menu", menu_options, key='menu')
     
     if menu == "Cadastrar POP" and usuario_eh_admin():
         st.header("📝 Cadastrar Novo POP")
@@ -398,12 +523,19 @@ def main():
             
             with col2:
                 capacidade = st.number_input("Capacidade", min_value=1, value=100)
+                latitude = st.number_input("Latitude", min_value=-90.0, max_value=90.0, value=None, format="%.6f")
+                longitude = st.number_input("Longitude", min_value=-180.0, max_value=180.0, value=None, format="%.6f")
             
             submitted = st.form_submit_button("Cadastrar POP")
             
             if submitted:
-                if nome_pop:
-                    add_pop(nome_pop, localizacao, capacidade)
+                if (latitude is None) != (longitude is None):
+                    st.error("Informe a latitude e a longitude, ou deixe as duas em branco!")
+                elif nome_pop:
+                    # Sem coordenadas informadas, aproveita a localização quando ela já é "latitude, longitude"
+                    if latitude is None:
+                        latitude, longitude = extrair_coordenadas(localizacao) or (None, None)
+                    add_pop(nome_pop, localizacao, capacidade, latitude, longitude)
                     st.success(f"POP '{nome_pop}' cadastrado com sucesso!")
                     st.rerun()
                 else:
@@ -412,9 +544,9 @@ def main():
     elif menu == "Cadastrar Cidade" and usuario_eh_admin():
         st.header("🏙️ Cadastrar Nova Cidade")
         
-        pops_df = get_all_pops()
+        pop_options = dados.opcoes_pops
         
-        if not pops_df.empty:
+        if pop_options:
             with st.form("cadastro_cidade"):
                 col1, col2 = st.columns(2)
                 
@@ -422,7 +554,6 @@ def main():
                     nome_cidade = st.text_input("Nome da Cidade*")
                 
                 with col2:
-                    pop_options = {f"{row['nome_pop']} (ID: {row['id']})": row['id'] for _, row in pops_df.iterrows()}
                     selected_pop = st.selectbox("Selecione o POP*:", list(pop_options.keys()))
                     pop_id = pop_options[selected_pop]
                 
@@ -441,7 +572,8 @@ def main():
     elif menu == "Listar POPs" and usuario_eh_admin():
         st.header("📋 Lista de POPs")
         
-        pops_df = get_all_pops()
+        acompanhar_alteracoes('monitor_pops')
+        pops_df = dados.pops_df
         
         if not pops_df.empty:
             pops_df_display = pops_df.copy()
@@ -450,21 +582,14 @@ def main():
             st.dataframe(pops_df_display, use_container_width=True)
             
             st.subheader("Ações")
-            pop_options = {f"{row['nome_pop']} (ID: {row['id']})": row['id'] for _, row in pops_df.iterrows()}
-            selected_pop = st.selectbox("Selecione um POP para ações:", list(pop_options.keys()))
-            
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                if st.button("🗑️ Excluir POP Selecionado"):
-                    pop_id = pop_options[selected_pop]
-                    delete_pop(pop_id)
-                    st.success("POP excluído com sucesso!")
-                    st.rerun()
+            pop_options = dados.opcoes_pops
+            selected_pops = st.multiselect("Selecione os POPs para excluir:", list(pop_options.keys()))
             
-            with col2:
-                if st.button("🔄 Atualizar Lista"):
-                    st.rerun()
+            if st.button("🗑️ Excluir POPs Selecionados", disabled=not selected_pops):
+                # Cidades e rotas dos POPs são excluídas junto, na mesma transação
+                excluidos = excluir_pops([pop_options[pop] for pop in selected_pops])
+                st.success(f"{excluidos} POP(s) excluído(s) com suas cidades e rotas!")
+                st.rerun()
                     
         else:
             st.info("Nenhum POP cadastrado ainda.")
@@ -472,7 +597,7 @@ def main():
     elif menu == "Listar Cidades" and usuario_eh_admin():
         st.header("🏙️ Lista de Cidades")
         
-        cidades_df = get_all_cidades()
+        cidades_df = dados.cidades_df
         
         if not cidades_df.empty:
             cidades_df_display = cidades_df.copy()
@@ -481,17 +606,27 @@ def main():
             st.dataframe(cidades_df_display, use_container_width=True)
             
             st.subheader("Ações")
-            cidade_options = {f"{row['nome_cidade']} (POP: {row['nome_pop']})": row['id'] for _, row in cidades_df.iterrows()}
-            selected_cidade = st.selectbox("Selecione uma cidade para excluir:", list(cidade_options.keys()))
-            
-            if st.button("🗑️ Excluir Cidade Selecionada"):
-                cidade_id = cidade_options[selected_cidade]
-                sucesso, mensagem = delete_cidade(cidade_id)
-                if sucesso:
-                    st.success(mensagem)
-                else:
-                    st.error(mensagem)
-                st.rerun()
+            cidade_options = dados.opcoes_cidades
+            selected_cidades = st.multiselect("Selecione as cidades:", list(cidade_options.keys()))
+            cidade_ids = [cidade_options[cidade] for cidade in selected_cidades]
+            
+            col1, col2 = st.columns(2)
+            with col1:
+                if st.button("🗑️ Excluir Cidades Selecionadas", disabled=not cidade_ids):
+                    sucesso, mensagem = excluir_cidades(cidade_ids)
+                    if sucesso:
+                        st.success(mensagem)
+                    else:
+                        st.error(mensagem)
+                    st.rerun()
+            
+            with col2:
+                pop_options = dados.opcoes_pops
+                pop_destino = st.selectbox("Mover para o POP:", list(pop_options.keys()), key='pop_destino_cidades')
+                if st.button("🔀 Mover Cidades e suas Rotas", disabled=not cidade_ids):
+                    cidades_movidas, rotas_movidas = mover_cidades(cidade_ids, pop_options[pop_destino], usuario['username'])
+                    st.success(f"{cidades_movidas} cidade(s) e {rotas_movidas} rota(s) movidas para '{pop_destino}'!")
+                    st.rerun()
                     
         else:
             st.info("Nenhuma cidade cadastrada ainda.")
@@ -499,18 +634,17 @@ def main():
     elif menu == "Gerenciar Rotas" and usuario_eh_admin():
         st.header("🛣️ Gerenciar Rotas")
         
-        pops_df = get_all_pops()
+        pop_options = dados.opcoes_pops
         
-        if not pops_df.empty:
+        if pop_options:
             # Selecionar POP
-            pop_options = {f"{row['nome_pop']} (ID: {row['id']})": row['id'] for _, row in pops_df.iterrows()}
             selected_pop = st.selectbox("Selecione um POP:", list(pop_options.keys()))
             pop_id = pop_options[selected_pop]
             
             # Buscar cidades do POP selecionado
-            cidades_df = get_cidades_by_pop(pop_id)
+            cidade_options = dados.opcoes_cidades_do_pop(pop_id)
             
-            if not cidades_df.empty:
+            if cidade_options:
                 # Adicionar nova rota
                 st.subheader("Adicionar Nova Rota")
                 col1, col2, col3 = st.columns([2, 2, 1])
@@ -519,7 +653,6 @@ def main():
                     nome_rota = st.text_input("Nome da Rota*")
                 
                 with col2:
-                    cidade_options = {row['nome_cidade']: row['id'] for _, row in cidades_df.iterrows()}
                     selected_cidade = st.selectbox("Selecione a Cidade*:", list(cidade_options.keys()))
                     cidade_id = cidade_options[selected_cidade]
                 
@@ -532,97 +665,127 @@ def main():
                         else:
                             st.error("Digite um nome para a rota!")
                 
+                # Exclusão e transferência de várias rotas de uma vez
+                with st.expander("📦 Ações em lote"):
+                    acoes_em_lote_rotas(pop_id, cidade_options, dados.opcoes_cidades, usuario['username'])
+                
                 # Listar e gerenciar rotas do POP selecionado
                 st.subheader(f"Rotas do POP: {selected_pop}")
-                rotas_df = get_rotas_by_pop(pop_id)
+                acompanhar_alteracoes('monitor_gerenciar', functools.partial(get_assinatura_rotas_pop, pop_id),
+                                      pausar=st.session_state.get('lote_gerenciar', False))
+                rotas, total_rotas = paginar_rotas('paginacao_gerenciar', pop_id)
                 
-                if not rotas_df.empty:
-                    for _, rota in rotas_df.iterrows():
-                        with st.expander(f"🛣️ {rota['nome_rota']} - Cidade: {rota['nome_cidade']}"):
-                            col1, col2 = st.columns(2)
-                            
-                            with col1:
-                                st.subheader("📡 Status Lançamento")
-                                status_lancamento = st.selectbox(
-                                    "Status Lançamento:",
-                                    ["PENDENTE", "EM ANDAMENTO", "FINALIZADA"],
-                                    key=f"lanc_{rota['id']}",
-                                    index=["PENDENTE", "EM ANDAMENTO", "FINALIZADA"].index(rota['status_lancamento'])
-                                )
+                if rotas:
+                    if st.toggle("✏️ Edição em lote (grade)", key='lote_gerenciar'):
+                        editar_rotas_em_lote('lote_gerenciar_grade', rotas, usuario['username'])
+                    else:
+                        for rota in rotas:
+                            em_conflito = f"conflito_{rota['id']}" in st.session_state
+                            with st.expander(f"🛣️ {rota['nome_rota']} - Cidade: {rota['nome_cidade']}", expanded=em_conflito):
+                                if em_conflito:
+                                    mostrar_conflito_rota(int(rota['id']), usuario['username'])
+                                    continue
                                 
-                                if status_lancamento == "EM ANDAMENTO":
-                                    observacoes_lancamento = st.text_area(
-                                        "Observações Lançamento:",
-                                        value=rota['observacoes_lancamento'] if rota['observacoes_lancamento'] else "",
-                                        key=f"obs_lanc_{rota['id']}",
-                                        height=100,
-                                        placeholder="Digite observações sobre o andamento do lançamento..."
+                                # Versão da rota quando os campos abaixo foram preenchidos a partir do banco;
+                                # é ela que a gravação compara, não a versão recarregada neste rerun
+                                chave_versao = f"versao_{rota['id']}"
+                                if f"lanc_{rota['id']}" not in st.session_state:
+                                    st.session_state[chave_versao] = int(rota['versao'])
+                                
+                                col1, col2 = st.columns(2)
+                            
+                                with col1:
+                                    st.subheader("📡 Status Lançamento")
+                                    status_lancamento = st.selectbox(
+                                        "Status Lançamento:",
+                                        CODIGOS_OPCOES_STATUS,
+                                        format_func=OPCOES_STATUS.__getitem__,
+                                        key=f"lanc_{rota['id']}",
+                                        index=rota['status_lancamento']
                                     )
-                                else:
-                                    observacoes_lancamento = rota['observacoes_lancamento']
+                                
+                                    if status_lancamento == STATUS_EM_ANDAMENTO:
+                                        observacoes_lancamento = st.text_area(
+                                            "Observações Lançamento:",
+                                            value=rota['observacoes_lancamento'] if rota['observacoes_lancamento'] else "",
+                                            key=f"obs_lanc_{rota['id']}",
+                                            height=100,
+                                            placeholder="Digite observações sobre o andamento do lançamento..."
+                                        )
+                                    else:
+                                        observacoes_lancamento = rota['observacoes_lancamento']
                             
-                            with col2:
-                                st.subheader("🔗 Status Fusão")
-                                status_fusao = st.selectbox(
-                                    "Status Fusão:",
-                                    ["PENDENTE", "EM ANDAMENTO", "FINALIZADA"],
-                                    key=f"fusao_{rota['id']}",
-                                    index=["PENDENTE", "EM ANDAMENTO", "FINALIZADA"].index(rota['status_fusao'])
-                                )
+                                with col2:
+                                    st.subheader("🔗 Status Fusão")
+                                    status_fusao = st.selectbox(
+                                        "Status Fusão:",
+                                        CODIGOS_OPCOES_STATUS,
+                                        format_func=OPCOES_STATUS.__getitem__,
+                                        key=f"fusao_{rota['id']}",
+                                        index=rota['status_fusao']
+                                    )
                                 
-                                # Inicializar status_alimentacao com o valor atual
-                                status_alimentacao = rota['status_alimentacao']
+                                    # Inicializar status_alimentacao com o valor atual
+                                    status_alimentacao = rota['status_alimentacao']
                                 
-                                if status_fusao == "EM ANDAMENTO":
-                                    st.write("**Status Alimentação:**")
+                                    if status_fusao == STATUS_EM_ANDAMENTO:
+                                        st.write("**Status Alimentação:**")
                                     
-                                    # Seleção do status de alimentação
-                                    status_alimentacao = st.selectbox(
-                                        "Selecione o Status de Alimentação:",
-                                        ["ALIMENTADA", "EM PRODUÇÃO", "SEM SINAL PARCIAL", "SEM SINAL TOTAL"],
-                                        key=f"alim_select_{rota['id']}",
-                                        index=0 if not rota['status_alimentacao'] else ["ALIMENTADA", "EM PRODUÇÃO", "SEM SINAL PARCIAL", "SEM SINAL TOTAL"].index(rota['status_alimentacao'])
-                                    )
+                                        # Seleção do status de alimentação
+                                        status_alimentacao = st.selectbox(
+                                            "Selecione o Status de Alimentação:",
+                                            CODIGOS_OPCOES_ALIMENTACAO,
+                                            format_func=OPCOES_ALIMENTACAO.__getitem__,
+                                            key=f"alim_select_{rota['id']}",
+                                            index=0 if rota['status_alimentacao'] is None else rota['status_alimentacao']
+                                        )
                                     
-                                    # Mostrar status atual da alimentação
-                                    if rota['status_alimentacao']:
-                                        st.info(f"Status atual: {rota['status_alimentacao']}")
+                                        # Mostrar status atual da alimentação
+                                        if rota['status_alimentacao'] is not None:
+                                            st.info(f"Status atual: {OPCOES_ALIMENTACAO[rota['status_alimentacao']]}")
                                     
-                                    observacoes_fusao = st.text_area(
-                                        "Observações Fusão:",
-                                        value=rota['observacoes_fusao'] if rota['observacoes_fusao'] else "",
-                                        key=f"obs_fusao_{rota['id']}",
-                                        height=100,
-                                        placeholder="Digite observações sobre o andamento da fusão..."
-                                    )
-                                else:
-                                    observacoes_fusao = rota['observacoes_fusao']
+                                        observacoes_fusao = st.text_area(
+                                            "Observações Fusão:",
+                                            value=rota['observacoes_fusao'] if rota['observacoes_fusao'] else "",
+                                            key=f"obs_fusao_{rota['id']}",
+                                            height=100,
+                                            placeholder="Digite observações sobre o andamento da fusão..."
+                                        )
+                                    else:
+                                        observacoes_fusao = rota['observacoes_fusao']
                             
-                            # Botões de ação
-                            col_btn1, col_btn2, col_btn3 = st.columns([1, 1, 2])
-                            with col_btn1:
-                                if st.button("💾 Salvar Alterações", key=f"save_{rota['id']}"):
-                                    update_status_rota(rota['id'], status_lancamento, status_fusao, 
-                                                      observacoes_lancamento, observacoes_fusao, 
-                                                      status_alimentacao, usuario['username'])
-                                    st.success("Status atualizado!")
-                                    st.rerun()
+                                # Botões de ação
+                                col_btn1, col_btn2, col_btn3 = st.columns([1, 1, 2])
+                                with col_btn1:
+                                    if st.button("💾 Salvar Alterações", key=f"save_{rota['id']}"):
+                                        if update_status_rota(int(rota['id']), status_lancamento, status_fusao, 
+                                                              observacoes_lancamento, observacoes_fusao, 
+                                                              status_alimentacao, usuario['username'], versao=st.session_state[chave_versao]):
+                                            st.session_state[chave_versao] += 1
+                                            st.success("Status atualizado!")
+                                        else:
+                                            registrar_conflito_rota(int(rota['id']), {
+                                                'status_lancamento': status_lancamento, 'status_fusao': status_fusao,
+                                                'observacoes_lancamento': observacoes_lancamento, 'observacoes_fusao': observacoes_fusao,
+                                                'status_alimentacao': status_alimentacao
+                                            })
+                                        st.rerun()
                             
-                            with col_btn2:
-                                if st.button("🗑️ Excluir Rota", key=f"del_{rota['id']}"):
-                                    delete_rota(rota['id'])
-                                    st.success("Rota excluída!")
-                                    st.rerun()
+                                with col_btn2:
+                                    if st.button("🗑️ Excluir Rota", key=f"del_{rota['id']}"):
+                                        delete_rota(rota['id'])
+                                        st.success("Rota excluída!")
+                                        st.rerun()
                             
-                            # Informações da rota
-                            if rota['data_criacao']:
-                                data_criacao_formatada = pd.to_datetime(rota['data_criacao']).strftime('%d/%m/%Y %H:%M')
-                                st.caption(f"Data de criação: {data_criacao_formatada}")
+                                # Informações da rota
+                                if rota['data_criacao']:
+                                    data_criacao_formatada = datetime.fromisoformat(rota['data_criacao']).strftime('%d/%m/%Y %H:%M')
+                                    st.caption(f"Data de criação: {data_criacao_formatada}")
                             
-                            if rota['data_atualizacao']:
-                                data_atualizacao_formatada = pd.to_datetime(rota['data_atualizacao']).strftime('%d/%m/%Y %H:%M')
-                                usuario_atualizacao = rota['usuario_atualizacao'] or 'N/A'
-                                st.caption(f"Última atualização: {data_atualizacao_formatada} por {usuario_atualizacao}")
+                                if rota['data_atualizacao']:
+                                    data_atualizacao_formatada = datetime.fromisoformat(rota['data_atualizacao']).strftime('%d/%m/%Y %H:%M')
+                                    usuario_atualizacao = rota['usuario_atualizacao'] or 'N/A'
+                                    st.caption(f"Última atualização: {data_atualizacao_formatada} por {usuario_atualizacao}")
                 else:
                     st.info("Este POP não possui rotas cadastradas.")
             else:
@@ -634,174 +797,239 @@ def main():
     elif menu == "Visualizar Rotas":
         st.header("👀 Visualizar e Atualizar Rotas")
         
-        pops_df = get_all_pops()
+        pop_options = dados.opcoes_pops
         
-        if not pops_df.empty:
-            pop_options = {f"{row['nome_pop']} (ID: {row['id']})": row['id'] for _, row in pops_df.iterrows()}
-            selected_pop = st.selectbox("Selecione um POP para visualizar rotas:", list(pop_options.keys()))
+        if pop_options:
+            selected_pop = st.selectbox("Selecione um POP para visualizar rotas:", list(pop_options.keys()), key='pop_visualizar')
             pop_id = pop_options[selected_pop]
             
             # Extrair apenas o nome do POP (remover o ID)
             pop_nome = selected_pop.split(' (ID:')[0]
             
             st.subheader(f"Rotas do POP: {pop_nome}")
-            rotas_df = get_rotas_by_pop(pop_id)
+            acompanhar_alteracoes('monitor_visualizar', functools.partial(get_assinatura_rotas_pop, pop_id),
+                                  pausar=st.session_state.get('lote_visualizar', False))
+            rotas, total_rotas = paginar_rotas('paginacao_visualizar', pop_id)
             
             # Botão para copiar relatório
-            if not rotas_df.empty:
+            if rotas:
                 col1, col2 = st.columns([3, 1])
                 with col2:
                     if st.button("📋 Copiar Relatório", use_container_width=True):
-                        relatorio = gerar_relatorio_copiavel(pop_nome, rotas_df)
+                        # O relatório cobre todas as rotas do POP, não só a página atual
+                        relatorio = gerar_relatorio_pop(pop_id, pop_nome)
                         st.code(relatorio, language='text')
                         st.success("Relatório gerado! Copie o texto acima.")
             
-            if not rotas_df.empty:
-                st.info(f"Total de rotas encontradas: {len(rotas_df)}")
+            if rotas:
+                st.info(f"Total de rotas encontradas: {total_rotas}")
                 
-                # Exibir as rotas em expanders
-                for _, rota in rotas_df.iterrows():
-                    # Criar um badge de status resumido
-                    status_lancamento = rota['status_lancamento']
-                    status_fusao = rota['status_fusao']
+                if st.toggle("✏️ Edição em lote (grade)", key='lote_visualizar'):
+                    editar_rotas_em_lote('lote_visualizar_grade', rotas, usuario['username'])
+                else:
+                    # Exibir as rotas em expanders
+                    for rota in rotas:
+                        # Criar um badge de status resumido
+                        status_lancamento = OPCOES_STATUS[rota['status_lancamento']]
+                        status_fusao = OPCOES_STATUS[rota['status_fusao']]
                     
-                    # Definir cores para os status
-                    cores_lancamento = {
-                        "PENDENTE": "🔴",
-                        "EM ANDAMENTO": "🟡", 
-                        "FINALIZADA": "🟢"
-                    }
+                        # Definir cores para os status
+                        cores_lancamento = {
+                            "PENDENTE": "🔴",
+                            "EM ANDAMENTO": "🟡", 
+                            "FINALIZADA": "🟢"
+                        }
                     
-                    cores_fusao = {
-                        "PENDENTE": "🔴",
-                        "EM ANDAMENTO": "🟡",
-                        "FINALIZADA": "🟢"
-                    }
+                        cores_fusao = {
+                            "PENDENTE": "🔴",
+                            "EM ANDAMENTO": "🟡",
+                            "FINALIZADA": "🟢"
+                        }
                     
-                    # Definir cores para status de alimentação
-                    cores_alimentacao = {
-                        "ALIMENTADA": "🟢",
-                        "EM PRODUÇÃO": "🟡",
-                        "SEM SINAL PARCIAL": "🟠",
-                        "SEM SINAL TOTAL": "🔴"
-                    }
+                        # Definir cores para status de alimentação
+                        cores_alimentacao = {
+                            "ALIMENTADA": "🟢",
+                            "EM PRODUÇÃO": "🟡",
+                            "SEM SINAL PARCIAL": "🟠",
+                            "SEM SINAL TOTAL": "🔴"
+                        }
                     
-                    # Texto do expander
-                    expander_text = f"🛣️ {rota['nome_rota']} - Cidade: {rota['nome_cidade']} - Lançamento: {cores_lancamento[status_lancamento]} {status_lancamento} - Fusão: {cores_fusao[status_fusao]} {status_fusao}"
+                        # Texto do expander
+                        expander_text = f"🛣️ {rota['nome_rota']} - Cidade: {rota['nome_cidade']} - Lançamento: {cores_lancamento[status_lancamento]} {status_lancamento} - Fusão: {cores_fusao[status_fusao]} {status_fusao}"
                     
-                    # Adicionar status de alimentação se existir
-                    if rota['status_alimentacao']:
-                        expander_text += f" - Alimentação: {cores_alimentacao.get(rota['status_alimentacao'], '⚪')} {rota['status_alimentacao']}"
+                        # Adicionar status de alimentação se existir
+                        if rota['status_alimentacao'] is not None:
+                            status_alimentacao = OPCOES_ALIMENTACAO[rota['status_alimentacao']]
+                            expander_text += f" - Alimentação: {cores_alimentacao.get(status_alimentacao, '⚪')} {status_alimentacao}"
                     
-                    with st.expander(expander_text, expanded=False):
-                        col1, col2 = st.columns(2)
-                        
-                        with col1:
-                            st.subheader("📡 Status Lançamento")
-                            status_lancamento = st.selectbox(
-                                "Status Lançamento:",
-                                ["PENDENTE", "EM ANDAMENTO", "FINALIZADA"],
-                                key=f"lanc_view_{rota['id']}",
-                                index=["PENDENTE", "EM ANDAMENTO", "FINALIZADA"].index(rota['status_lancamento'])
-                            )
+                        em_conflito = f"conflito_{rota['id']}" in st.session_state
+                        aberta = rota['id'] == st.session_state.get('rota_aberta')
+                        with st.expander(expander_text, expanded=em_conflito or aberta):
+                            if em_conflito:
+                                mostrar_conflito_rota(int(rota['id']), usuario['username'])
+                                continue
                             
-                            if status_lancamento == "EM ANDAMENTO":
-                                observacoes_lancamento = st.text_area(
-                                    "Observações Lançamento:",
-                                    value=rota['observacoes_lancamento'] if rota['observacoes_lancamento'] else "",
-                                    key=f"obs_lanc_view_{rota['id']}",
-                                    height=100,
-                                    placeholder="Digite observações sobre o andamento do lançamento..."
+                            # Versão da rota quando os campos abaixo foram preenchidos a partir do banco;
+                            # é ela que a gravação compara, não a versão recarregada neste rerun
+                            chave_versao = f"versao_view_{rota['id']}"
+                            if f"lanc_view_{rota['id']}" not in st.session_state:
+                                st.session_state[chave_versao] = int(rota['versao'])
+                            
+                            col1, col2 = st.columns(2)
+                        
+                            with col1:
+                                st.subheader("📡 Status Lançamento")
+                                status_lancamento = st.selectbox(
+                                    "Status Lançamento:",
+                                    CODIGOS_OPCOES_STATUS,
+                                    format_func=OPCOES_STATUS.__getitem__,
+                                    key=f"lanc_view_{rota['id']}",
+                                    index=rota['status_lancamento']
                                 )
-                            else:
-                                observacoes_lancamento = rota['observacoes_lancamento']
+                            
+                                if status_lancamento == STATUS_EM_ANDAMENTO:
+                                    observacoes_lancamento = st.text_area(
+                                        "Observações Lançamento:",
+                                        value=rota['observacoes_lancamento'] if rota['observacoes_lancamento'] else "",
+                                        key=f"obs_lanc_view_{rota['id']}",
+                                        height=100,
+                                        placeholder="Digite observações sobre o andamento do lançamento..."
+                                    )
+                                else:
+                                    observacoes_lancamento = rota['observacoes_lancamento']
                         
-                        with col2:
-                            st.subheader("🔗 Status Fusão")
-                            status_fusao = st.selectbox(
-                                "Status Fusão:",
-                                ["PENDENTE", "EM ANDAMENTO", "FINALIZADA"],
-                                key=f"fusao_view_{rota['id']}",
-                                index=["PENDENTE", "EM ANDAMENTO", "FINALIZADA"].index(rota['status_fusao'])
-                            )
+                            with col2:
+                                st.subheader("🔗 Status Fusão")
+                                status_fusao = st.selectbox(
+                                    "Status Fusão:",
+                                    CODIGOS_OPCOES_STATUS,
+                                    format_func=OPCOES_STATUS.__getitem__,
+                                    key=f"fusao_view_{rota['id']}",
+                                    index=rota['status_fusao']
+                                )
                             
-                            # Inicializar status_alimentacao com o valor atual
-                            status_alimentacao = rota['status_alimentacao']
+                                # Inicializar status_alimentacao com o valor atual
+                                status_alimentacao = rota['status_alimentacao']
                             
-                            if status_fusao == "EM ANDAMENTO":
-                                st.write("**Status Alimentação:**")
+                                if status_fusao == STATUS_EM_ANDAMENTO:
+                                    st.write("**Status Alimentação:**")
                                 
-                                # Seleção do status de alimentação
-                                status_alimentacao = st.selectbox(
-                                    "Selecione o Status de Alimentação:",
-                                    ["ALIMENTADA", "EM PRODUÇÃO", "SEM SINAL PARCIAL", "SEM SINAL TOTAL"],
-                                    key=f"alim_select_view_{rota['id']}",
-                                    index=0 if not rota['status_alimentacao'] else ["ALIMENTADA", "EM PRODUÇÃO", "SEM SINAL PARCIAL", "SEM SINAL TOTAL"].index(rota['status_alimentacao'])
-                                )
+                                    # Seleção do status de alimentação
+                                    status_alimentacao = st.selectbox(
+                                        "Selecione o Status de Alimentação:",
+                                        CODIGOS_OPCOES_ALIMENTACAO,
+                                        format_func=OPCOES_ALIMENTACAO.__getitem__,
+                                        key=f"alim_select_view_{rota['id']}",
+                                        index=0 if rota['status_alimentacao'] is None else rota['status_alimentacao']
+                                    )
                                 
-                                # Mostrar status atual da alimentação
-                                if rota['status_alimentacao']:
-                                    st.info(f"Status atual: {rota['status_alimentacao']}")
+                                    # Mostrar status atual da alimentação
+                                    if rota['status_alimentacao'] is not None:
+                                        st.info(f"Status atual: {OPCOES_ALIMENTACAO[rota['status_alimentacao']]}")
                                 
-                                observacoes_fusao = st.text_area(
-                                    "Observações Fusão:",
-                                    value=rota['observacoes_fusao'] if rota['observacoes_fusao'] else "",
-                                    key=f"obs_fusao_view_{rota['id']}",
-                                    height=100,
-                                    placeholder="Digite observações sobre o andamento da fusão..."
-                                )
-                            else:
-                                observacoes_fusao = rota['observacoes_fusao']
-                        
-                        # Botões de ação
-                        col_btn1, col_btn2, col_btn3 = st.columns([1, 1, 2])
-                        with col_btn1:
-                            if st.button("💾 Salvar Alterações", key=f"save_view_{rota['id']}"):
-                                update_status_rota(rota['id'], status_lancamento, status_fusao, 
-                                                  observacoes_lancamento, observacoes_fusao, 
-                                                  status_alimentacao, usuario['username'])
-                                st.success("Status atualizado!")
-                                st.rerun()
+                                    observacoes_fusao = st.text_area(
+                                        "Observações Fusão:",
+                                        value=rota['observacoes_fusao'] if rota['observacoes_fusao'] else "",
+                                        key=f"obs_fusao_view_{rota['id']}",
+                                        height=100,
+                                        placeholder="Digite observações sobre o andamento da fusão..."
+                                    )
+                                else:
+                                    observacoes_fusao = rota['observacoes_fusao']
                         
-                        with col_btn2:
-                            if usuario_eh_admin():
-                                if st.button("🗑️ Excluir Rota", key=f"del_view_{rota['id']}"):
-                                    delete_rota(rota['id'])
-                                    st.success("Rota excluída!")
+                            # Botões de ação
+                            col_btn1, col_btn2, col_btn3 = st.columns([1, 1, 2])
+                            with col_btn1:
+                                if st.button("💾 Salvar Alterações", key=f"save_view_{rota['id']}"):
+                                    if update_status_rota(int(rota['id']), status_lancamento, status_fusao, 
+                                                          observacoes_lancamento, observacoes_fusao, 
+                                                          status_alimentacao, usuario['username'], versao=st.session_state[chave_versao]):
+                                        st.session_state[chave_versao] += 1
+                                        st.success("Status atualizado!")
+                                    else:
+                                        registrar_conflito_rota(int(rota['id']), {
+                                            'status_lancamento': status_lancamento, 'status_fusao': status_fusao,
+                                            'observacoes_lancamento': observacoes_lancamento, 'observacoes_fusao': observacoes_fusao,
+                                            'status_alimentacao': status_alimentacao
+                                        })
                                     st.rerun()
                         
-                        # Informações da rota
-                        if rota['data_criacao']:
-                            data_criacao_formatada = pd.to_datetime(rota['data_criacao']).strftime('%d/%m/%Y %H:%M')
-                            st.caption(f"Data de criação: {data_criacao_formatada}")
+                            with col_btn2:
+                                if usuario_eh_admin():
+                                    if st.button("🗑️ Excluir Rota", key=f"del_view_{rota['id']}"):
+                                        delete_rota(rota['id'])
+                                        st.success("Rota excluída!")
+                                        st.rerun()
                         
-                        if rota['data_atualizacao']:
-                            data_atualizacao_formatada = pd.to_datetime(rota['data_atualizacao']).strftime('%d/%m/%Y %H:%M')
-                            usuario_atualizacao = rota['usuario_atualizacao'] or 'N/A'
-                            st.caption(f"Última atualização: {data_atualizacao_formatada} por {usuario_atualizacao}")
-                
-                # Botão para atualizar a lista
-                if st.button("🔄 Atualizar Lista de Rotas"):
-                    st.rerun()
+                            # Informações da rota
+                            if rota['data_criacao']:
+                                data_criacao_formatada = datetime.fromisoformat(rota['data_criacao']).strftime('%d/%m/%Y %H:%M')
+                                st.caption(f"Data de criação: {data_criacao_formatada}")
+                        
+                            if rota['data_atualizacao']:
+                                data_atualizacao_formatada = datetime.fromisoformat(rota['data_atualizacao']).strftime('%d/%m/%Y %H:%M')
+                                usuario_atualizacao = rota['usuario_atualizacao'] or 'N/A'
+                                st.caption(f"Última atualização: {data_atualizacao_formatada} por {usuario_atualizacao}")
                     
             else:
                 st.info("Este POP não possui rotas cadastradas.")
+            
+            if st.toggle("🗄️ Mostrar rotas arquivadas", key='arquivadas_visualizar'):
+                mostrar_rotas_arquivadas(pop_id)
         else:
             st.info("Nenhum POP cadastrado no sistema.")
     
+    elif menu == "Buscar Rotas":
+        st.header("🔎 Buscar Rotas")
+        
+        termo = st.text_input("Buscar em todos os POPs (nome da rota, cidade ou observações):",
+                              key='busca_termo', placeholder="Ex.: centro rompimento")
+        
+        if termo:
+            resultados = buscar_rotas(termo)
+            
+            if not resultados:
+                st.info("Nenhuma rota encontrada.")
+            else:
+                if len(resultados) == BUSCA_MAX_RESULTADOS:
+                    st.caption(f"Mostrando as {BUSCA_MAX_RESULTADOS} rotas mais relevantes. Refine a busca para ver outras.")
+                else:
+                    st.caption(f"{len(resultados)} rota(s) encontrada(s).")
+                
+                rotulos_pops = {pop_id: rotulo for rotulo, pop_id in dados.opcoes_pops.items()}
+                for resultado in map(registro_com_rotulos, resultados):
+                    col1, col2 = st.columns([5, 1])
+                    with col1:
+                        texto = (f"**🛣️ {resultado['nome_rota']}** - Cidade: {resultado['nome_cidade'] or 'N/A'} - "
+                                 f"POP: {resultado['nome_pop'] or 'N/A'}  \n"
+                                 f"Lançamento: {resultado['status_lancamento']} | Fusão: {resultado['status_fusao']}")
+                        if resultado['status_alimentacao']:
+                            texto += f" | Alimentação: {resultado['status_alimentacao']}"
+                        st.markdown(texto)
+                        st.caption(resultado['trecho'])
+                    with col2:
+                        rotulo_pop = rotulos_pops.get(resultado['pop_id'])
+                        st.button("✏️ Abrir Rota", key=f"abrir_{resultado['id']}",
+                                  disabled=rotulo_pop is None,
+                                  on_click=abrir_rota,
+                                  args=(int(resultado['id']), int(resultado['pop_id']) if rotulo_pop else None, rotulo_pop))
+    
     elif menu == "Estatísticas":
         st.header("📈 Estatísticas do Sistema")
         
-        pops_df = get_all_pops()
-        cidades_df = get_all_cidades()
+        # Tudo vem das tabelas pequenas de POPs e de contadores (estatisticas_status)
+        pops_df = dados.pops_df
+        total_cidades = contar_cidades()
         df_lancamento, df_fusao = get_estatisticas_status()
+        df_alimentacao = get_estatisticas_alimentacao()
         
         if not pops_df.empty:
             col1, col2, col3, col4 = st.columns(4)
             
             total_pops = len(pops_df)
-            total_cidades = len(cidades_df) if not cidades_df.empty else 0
+            # Rotas ativas, como nas listas; os gráficos de status também contam as arquivadas
             total_rotas = pops_df['quantidade_rotas'].sum()
+            total_arquivadas = pops_df['rotas_arquivadas'].sum()
             
             with col1:
                 st.metric("Total de POPs", total_pops)
@@ -810,7 +1038,8 @@ def main():
                 st.metric("Total de Cidades", total_cidades)
             
             with col3:
-                st.metric("Total de Rotas", total_rotas)
+                st.metric("Rotas Ativas", total_rotas,
+                          help=f"Mais {total_arquivadas} rota(s) arquivada(s), incluídas nos gráficos de status.")
             
             with col4:
                 if total_pops > 0:
@@ -821,8 +1050,9 @@ def main():
             
             # Gráfico de rotas por POP
             st.subheader("Rotas por POP")
-            if total_rotas > 0:
-                chart_data = pops_df[['nome_pop', 'quantidade_rotas']].set_index('nome_pop')
+            if total_rotas + total_arquivadas > 0:
+                chart_data = pops_df.set_index('nome_pop')[['quantidade_rotas', 'rotas_arquivadas']].rename(
+                    columns={'quantidade_rotas': "Ativas", 'rotas_arquivadas': "Arquivadas"})
                 st.bar_chart(chart_data)
             else:
                 st.info("Nenhuma rota cadastrada para exibir gráfico.")
@@ -853,9 +1083,307 @@ def main():
             else:
                 st.info("Nenhuma rota cadastrada para análise de status de fusão.")
             
+            # Status das rotas - Alimentação
+            st.subheader("Status de Alimentação das Rotas")
+            if not df_alimentacao.empty:
+                col1, col2 = st.columns([1, 2])
+                
+                with col1:
+                    st.dataframe(df_alimentacao, use_container_width=True)
+                
+                with col2:
+                    st.bar_chart(df_alimentacao.set_index('status'))
+            else:
+                st.info("Nenhuma rota com status de alimentação informado.")
+            
+            # Evolução ao longo do tempo (histórico rota_eventos)
+            st.subheader("Evolução das Rotas")
+            col1, col2 = st.columns(2)
+            with col1:
+                periodo = st.date_input("Período:", value=(date.today() - timedelta(days=13), date.today()), max_value=date.today())
+            with col2:
+                pops_evolucao = {"Todos os POPs": None}
+                pops_evolucao.update(dados.opcoes_pops)
+                pop_evolucao = pops_evolucao[st.selectbox("POP:", list(pops_evolucao.keys()))]
+            
+            if isinstance(periodo, tuple) and len(periodo) == 2:
+                # Intervalo semiaberto [inicio, fim) em texto, no mesmo formato de rota_eventos.ts
+                inicio = periodo[0].isoformat()
+                fim = (periodo[1] + timedelta(days=1)).isoformat()
+                
+                st.write("**Burndown - rotas com fusão não finalizada ao final do dia**")
+                st.line_chart(get_burndown(inicio, fim, pop_evolucao).set_index('dia'))
+                
+                st.write("**Fusões finalizadas por dia**")
+                vazao_df = get_vazao_diaria(inicio, fim, pop_evolucao)
+                if not vazao_df.empty:
+                    st.bar_chart(vazao_df.pivot_table(index='dia', columns='nome_pop', values='fusoes_finalizadas', aggfunc='sum', fill_value=0))
+                else:
+                    st.info("Nenhuma fusão finalizada no período.")
+                
+                st.write("**Tempo médio em andamento por rota (horas)**")
+                tempo_df = get_tempo_em_andamento(inicio, fim, pop_evolucao)
+                if not tempo_df.empty:
+                    st.dataframe(tempo_df.drop(columns='pop_id').round(1), use_container_width=True, hide_index=True)
+                else:
+                    st.info("Nenhuma mudança de status registrada no período.")
+            
+            if usuario_eh_admin():
+                st.markdown("---")
+                if st.button("🔁 Recalcular Estatísticas"):
+                    reconstruir_estatisticas()
+                    st.success("Estatísticas recalculadas a partir das rotas!")
+                    st.rerun()
+            
         else:
             st.info("Nenhum dado disponível para estatísticas.")
     
+    elif menu == "Mapa":
+        st.header("🗺️ Mapa dos POPs")
+        
+        mapa_df = get_mapa_pops()
+        com_coordenadas = mapa_df.dropna(subset=['latitude', 'longitude']).copy()
+        sem_coordenadas = len(mapa_df) - len(com_coordenadas)
+        
+        if not com_coordenadas.empty:
+            # Tamanho pela quantidade de rotas; cor do vermelho (fusões pendentes) ao verde (todas finalizadas)
+            total = com_coordenadas['total_rotas']
+            com_coordenadas['percentual_fusao'] = (com_coordenadas['fusoes_finalizadas'] / total.where(total > 0) * 100).fillna(0).round(1)
+            com_coordenadas['tamanho'] = 2000 + total * 200
+            com_coordenadas['cor'] = [
+                (int(255 * (100 - percentual) / 100), int(180 * percentual / 100), 60, 180)
+                for percentual in com_coordenadas['percentual_fusao']
+            ]
+            st.map(com_coordenadas, latitude='latitude', longitude='longitude', size='tamanho', color='cor')
+            st.caption("Tamanho: quantidade de rotas (ativas e arquivadas). Cor: do vermelho (fusões pendentes) ao verde (todas finalizadas).")
+            st.dataframe(com_coordenadas[['nome_pop', 'localizacao', 'total_rotas', 'lancamentos_finalizados',
+                                          'fusoes_finalizadas', 'fusoes_em_andamento', 'fusoes_pendentes',
+                                          'rotas_sem_sinal', 'percentual_fusao']],
+                         use_container_width=True, hide_index=True)
+        else:
+            st.info("Nenhum POP com coordenadas cadastradas.")
+        if sem_coordenadas:
+            st.caption(f"{sem_coordenadas} POP(s) sem coordenadas não aparecem no mapa.")
+        
+        st.subheader("POPs Próximos de um Ponto")
+        with st.form("pops_proximos"):
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                latitude = st.number_input("Latitude", min_value=-90.0, max_value=90.0, value=None, format="%.6f")
+            with col2:
+                longitude = st.number_input("Longitude", min_value=-180.0, max_value=180.0, value=None, format="%.6f")
+            with col3:
+                raio_km = st.number_input("Raio (km)", min_value=1, value=GEO_RAIO_PADRAO_KM)
+            buscar = st.form_submit_button("📍 Buscar POPs")
+        if buscar:
+            if latitude is None or longitude is None:
+                st.error("Informe a latitude e a longitude do ponto!")
+            else:
+                proximos = pops_proximos(latitude, longitude, raio_km)
+                if proximos:
+                    st.dataframe(pd.DataFrame(proximos)[['nome_pop', 'localizacao', 'distancia_km']].round({'distancia_km': 1}),
+                                 use_container_width=True, hide_index=True)
+                else:
+                    st.info(f"Nenhum POP a até {raio_km} km do ponto.")
+        
+        if usuario_eh_admin():
+            with st.expander("📌 Coordenadas dos POPs"):
+                st.caption("Preenche os POPs sem coordenadas pela localização: quando ela já é um par "
+                           "\"latitude, longitude\" ou pelo nome, em um gazetteer CSV (colunas nome, latitude, longitude).")
+                arquivo_gazetteer = st.file_uploader("Gazetteer (opcional)", type=['csv'], key='gazetteer')
+                if st.button("📌 Preencher Coordenadas"):
+                    gazetteer = ler_gazetteer(arquivo_gazetteer) if arquivo_gazetteer is not None else None
+                    preenchidos, restantes = geocodificar_pops(gazetteer)
+                    st.success(f"{preenchidos} POP(s) com coordenadas preenchidas; {restantes} continuam sem coordenadas.")
+                
+                st.markdown("---")
+                pop_options = dados.opcoes_pops
+                if pop_options:
+                    selected_pop = st.selectbox("Editar as coordenadas do POP:", list(pop_options.keys()), key='pop_coordenadas')
+                    atual = mapa_df.set_index('id').loc[pop_options[selected_pop]]
+                    col1, col2 = st.columns(2)
+                    with col1:
+                        nova_latitude = st.number_input("Latitude do POP", min_value=-90.0, max_value=90.0, format="%.6f",
+                                                        value=None if pd.isna(atual['latitude']) else float(atual['latitude']),
+                                                        key=f"lat_pop_{pop_options[selected_pop]}")
+                    with col2:
+                        nova_longitude = st.number_input("Longitude do POP", min_value=-180.0, max_value=180.0, format="%.6f",
+                                                         value=None if pd.isna(atual['longitude']) else float(atual['longitude']),
+                                                         key=f"lon_pop_{pop_options[selected_pop]}")
+                    if st.button("💾 Salvar Coordenadas"):
+                        if (nova_latitude is None) != (nova_longitude is None):
+                            st.error("Informe a latitude e a longitude, ou deixe as duas em branco!")
+                        else:
+                            atualizar_coordenadas_pop(pop_options[selected_pop], nova_latitude, nova_longitude)
+                            st.success("Coordenadas atualizadas!")
+                            st.rerun()
+    
+    elif menu == "Relatório Geral" and usuario_eh_admin():
+        st.header("🗂️ Relatório Geral de Todos os POPs")
+        
+        formato = st.selectbox("Formato:", list(FORMATOS_EXPORTACAO.keys()),
+                               format_func=lambda f: FORMATOS_EXPORTACAO[f][0])
+        _, extensao, mime = FORMATOS_EXPORTACAO[formato]
+        
+        st.download_button(
+            "⬇️ Baixar Relatório",
+            data=functools.partial(_arquivo_relatorio, formato),
+            file_name=f"relatorio_rotas_{datetime.now().strftime('%Y%m%d_%H%M')}.{extensao}",
+            mime=mime
+        )
+    
+    elif menu == "Importar Planilha" and usuario_eh_admin():
+        st.header("📥 Importar POPs, Cidades e Rotas")
+        
+        st.write("Envie um arquivo CSV ou XLSX com as colunas abaixo (apenas **nome_pop** é obrigatória; "
+                 "linhas com **nome_rota** precisam de **nome_cidade**):")
+        st.code(", ".join(COLUNAS_IMPORTACAO), language='text')
+        
+        arquivo = st.file_uploader("Arquivo:", type=['csv', 'xlsx'])
+        
+        if arquivo is not None:
+            try:
+                planilha_df = ler_planilha(arquivo, arquivo.name)
+            except ImportError:
+                st.error("Para importar arquivos XLSX instale o pacote 'openpyxl'.")
+                planilha_df = None
+            except Exception as erro:
+                st.error(f"Não foi possível ler o arquivo: {erro}")
+                planilha_df = None
+            
+            if planilha_df is not None:
+                planilha_valida, erros = validar_planilha(planilha_df)
+                
+                if not erros.empty:
+                    st.error(f"A planilha possui {len(erros)} erro(s). Corrija e envie novamente.")
+                    st.dataframe(erros, use_container_width=True, hide_index=True)
+                else:
+                    # Prévia: a importação é executada e desfeita para mostrar o que mudaria. Guardada
+                    # por arquivo e versão do banco, não reabre a transação de escrita a cada rerun
+                    chave_previa = (arquivo.file_id, versao_banco())
+                    previa_salva = st.session_state.get('previa_importacao')
+                    if previa_salva is None or previa_salva[0] != chave_previa:
+                        previa_salva = (chave_previa, importar_planilha(planilha_valida, usuario['username'], simular=True))
+                        st.session_state['previa_importacao'] = previa_salva
+                    previa = previa_salva[1]
+                    
+                    st.subheader("Prévia da Importação")
+                    col1, col2, col3, col4, col5 = st.columns(5)
+                    col1.metric("POPs novos", previa['pops_novos'])
+                    col2.metric("POPs atualizados", previa['pops_atualizados'])
+                    col3.metric("Cidades novas", previa['cidades_novas'])
+                    col4.metric("Rotas novas", previa['rotas_novas'])
+                    col5.metric("Rotas atualizadas", previa['rotas_atualizadas'])
+                    
+                    with st.expander(f"Linhas da planilha ({len(planilha_valida)})"):
+                        st.dataframe(planilha_valida.head(1000), use_container_width=True)
+                    
+                    if not any(previa.values()):
+                        st.info("Nada a importar: todos os registros já existem com os mesmos dados.")
+                    elif st.button("✅ Confirmar Importação"):
+                        resumo = importar_planilha(planilha_valida, usuario['username'])
+                        st.success(f"Importação concluída: {resumo['pops_novos']} POP(s), {resumo['cidades_novas']} cidade(s) "
+                                   f"e {resumo['rotas_novas']} rota(s) novas; {resumo['rotas_atualizadas']} rota(s) atualizada(s).")
+    
+    elif menu == "Desempenho" and usuario_eh_admin():
+        st.header("⏱️ Desempenho")
+        
+        registro = get_registro_desempenho()
+        st.caption(f"Últimas {DESEMPENHO_MAX_REGISTROS} medições deste processo do servidor"
+                   + (f", também gravadas em {registro.arquivo_log}" if registro.arquivo_log else "") + ".")
+        
+        st.subheader("Páginas")
+        paginas_df = resumo_desempenho('pagina')
+        if paginas_df.empty:
+            st.info("Nenhuma execução de página registrada ainda.")
+        else:
+            st.dataframe(paginas_df, use_container_width=True, hide_index=True, column_config={
+                'nome': "Página", 'execucoes': "Execuções",
+                'p50_ms': st.column_config.NumberColumn("p50 (ms)", format="%.1f"),
+                'p95_ms': st.column_config.NumberColumn("p95 (ms)", format="%.1f"),
+                'max_ms': st.column_config.NumberColumn("Máx. (ms)", format="%.1f"),
+                'consultas_p50_ms': st.column_config.NumberColumn("Consultas p50 (ms)", format="%.1f"),
+                'demais_p50_ms': st.column_config.NumberColumn("Pandas/widgets p50 (ms)", format="%.1f"),
+                'consultas_media': st.column_config.NumberColumn("Consultas/execução", format="%.1f"),
+                'widgets_media': st.column_config.NumberColumn("Widgets/execução", format="%.0f"),
+                'carregamentos_media': st.column_config.NumberColumn("Carregamentos/execução", format="%.1f"),
+            })
+        
+        st.subheader("Consultas")
+        consultas_df = resumo_desempenho('consulta')
+        if consultas_df.empty:
+            st.info("Nenhuma consulta registrada ainda.")
+        else:
+            st.dataframe(consultas_df, use_container_width=True, hide_index=True, column_config={
+                'nome': "Função", 'execucoes': "Chamadas",
+                'p50_ms': st.column_config.NumberColumn("p50 (ms)", format="%.2f"),
+                'p95_ms': st.column_config.NumberColumn("p95 (ms)", format="%.2f"),
+                'max_ms': st.column_config.NumberColumn("Máx. (ms)", format="%.2f"),
+                'cache_%': st.column_config.NumberColumn("Do cache (%)", format="%.0f"),
+                'linhas_media': st.column_config.NumberColumn("Linhas (média)", format="%.0f"),
+            })
+        
+        if st.button("🧹 Limpar Medições"):
+            registro.limpar()
+            st.rerun()
+    
+    elif menu == "Backups" and usuario_eh_admin():
+        st.header("💾 Backups")
+        st.caption(f"Cópias verificadas do banco em {BACKUP_DIRETORIO}/, feitas sem interromper o uso do sistema; "
+                   f"são mantidas as {BACKUP_MANTER} mais recentes. Para restaurar, use "
+                   "`python backup_banco.py restaurar <arquivo>` com a aplicação parada.")
+        
+        if st.button("💾 Criar Backup Agora"):
+            with st.spinner("Copiando e verificando o banco..."):
+                try:
+                    caminho = criar_backup()
+                except (OSError, RuntimeError) as erro:
+                    st.error(f"Falha no backup: {erro}")
+                else:
+                    st.success(f"Backup criado: {caminho}")
+        
+        backups = listar_backups()
+        if backups:
+            st.dataframe(pd.DataFrame({
+                'Arquivo': [os.path.basename(caminho) for caminho in backups],
+                'Criado em': [datetime.fromtimestamp(os.path.getmtime(caminho)).strftime('%d/%m/%Y %H:%M') for caminho in backups],
+                'Tamanho (MB)': [round(os.path.getsize(caminho) / 1024 / 1024, 1) for caminho in backups],
+            }), use_container_width=True, hide_index=True)
+        else:
+            st.info("Nenhum backup criado ainda.")
+    
+    elif menu == "Arquivo de Rotas" and usuario_eh_admin():
+        st.header("🗄️ Arquivo de Rotas")
+        st.caption("Rotas com lançamento e fusão finalizados e sem atualização há muito tempo saem das listas, "
+                   "da busca e dos relatórios, mas continuam nas estatísticas e podem ser restauradas. "
+                   "Para arquivar periodicamente, use `python arquivar_rotas.py`.")
+        
+        col1, col2 = st.columns([1, 2])
+        with col1:
+            idade_dias = st.number_input("Arquivar finalizadas sem atualização há mais de (dias):",
+                                         min_value=0, value=ARQUIVO_IDADE_DIAS, step=1)
+        if st.button("🗄️ Arquivar Agora"):
+            with st.spinner("Arquivando rotas..."):
+                arquivadas = arquivar_rotas(int(idade_dias))
+            st.success(f"{arquivadas} rota(s) arquivada(s)!")
+        
+        pop_options = dados.opcoes_pops
+        if pop_options:
+            st.subheader("Rotas Arquivadas")
+            selected_pop = st.selectbox("Selecione o POP:", list(pop_options.keys()), key='pop_arquivo')
+            arquivadas_df = mostrar_rotas_arquivadas(pop_options[selected_pop])
+            if not arquivadas_df.empty:
+                rotulos = dict(zip(arquivadas_df['id'], arquivadas_df['nome_rota'] + " - Cidade: "
+                                   + arquivadas_df['nome_cidade'].fillna('N/A') + " (ID: " + arquivadas_df['id'].astype(str) + ")"))
+                rota_ids = st.multiselect("Rotas para restaurar:", list(rotulos), format_func=rotulos.__getitem__,
+                                          key='rotas_restaurar')
+                if st.button("♻️ Restaurar Rotas Selecionadas", disabled=not rota_ids):
+                    restauradas = restaurar_rotas_arquivadas([int(rota_id) for rota_id in rota_ids], usuario['username'])
+                    st.success(f"{restauradas} rota(s) restaurada(s)!")
+                    st.rerun()
+        else:
+            st.info("Nenhum POP cadastrado no sistema.")
+    
     elif menu == "Gerenciar Usuários" and usuario_eh_admin():
         st.header("👥 Gerenciar Usuários")
         
@@ -896,7 +1424,7 @@ def main():
         with tab2:
             st.subheader("Usuários Cadastrados")
             
-            usuarios_df = get_all_usuarios()
+            usuarios_df = dados.usuarios_df
             
             if not usuarios_df.empty:
                 usuarios_df_display = usuarios_df.copy()
@@ -905,7 +1433,7 @@ def main():
                 st.dataframe(usuarios_df_display, use_container_width=True)
                 
                 st.subheader("Ações")
-                usuario_options = {f"{row['nome_completo']} ({row['username']})": row['id'] for _, row in usuarios_df.iterrows() if row['username'] != 'admin'}
+                usuario_options = dados.opcoes_usuarios
                 
                 if usuario_options:
                     selected_usuario = st.selectbox("Selecione um usuário para excluir:", list(usuario_options.keys()))
@@ -920,6 +1448,10 @@ def main():
             else:
                 st.info("Nenhum usuário cadastrado além do admin.")
 
+    # Quantos conjuntos de dados esta execução carregou (ver ContextoDados)
+    if usuario_eh_admin():
+        st.sidebar.caption(f"🔎 {dados.carregamentos} carregamento(s) de dados nesta execução")
+
 # Rodapé
 if 'logado' in st.session_state and st.session_state['logado']:
     st.sidebar.markdown("---")
@@ -927,6 +1459,26 @@ if 'logado' in st.session_state and st.session_state['logado']:
         "**Sistema de Gerenciamento de POPs e Rotas**\n\n"
     )
 
+def executar_pagina():
+    """Executa main() registrando o tempo total, as consultas, os widgets e os carregamentos de dados da execução"""
+    iniciar_execucao()
+    inicio = time.perf_counter()
+    # Escritas de outros processos (ex.: arquivar_rotas.py, geocodificar_pops.py) descartam o cache de leituras
+    versao_banco()
+    dados = ContextoDados()
+    try:
+        main(dados)
+    finally:
+        # Também registra as execuções interrompidas por st.rerun()
+        consultas, consultas_ms = finalizar_execucao()
+        pagina = st.session_state.get('menu') if st.session_state.get('logado') else "Login"
+        get_registro_desempenho().registrar(
+            tipo='pagina', nome=pagina, duracao_ms=(time.perf_counter() - inicio) * 1000,
+            consultas=consultas, consultas_ms=consultas_ms, widgets=contar_widgets(),
+            carregamentos=dados.carregamentos
+        )
+
 # Executar aplicação
 if __name__ == "__main__":
-    main()
+    executar_pagina()
+
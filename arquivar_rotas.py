@@ -0,0 +1,33 @@
+"""Arquiva as rotas finalizadas antigas pela linha de comando.
+
+Uso:
+    python arquivar_rotas.py                        # finalizadas sem atualização há mais de 90 dias
+    python arquivar_rotas.py --idade-dias 30 --lote 1000
+    python arquivar_rotas.py --banco /dados/pops_rotas.db
+
+Para arquivar periodicamente, use o cron, por exemplo:
+    30 3 * * * cd /opt/statusrota && python arquivar_rotas.py
+"""
+import argparse
+
+import statusrota
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Move as rotas finalizadas antigas para o arquivo.")
+    parser.add_argument('--idade-dias', type=int, default=statusrota.ARQUIVO_IDADE_DIAS,
+                        help=f"dias sem atualização para arquivar uma rota finalizada (padrão: {statusrota.ARQUIVO_IDADE_DIAS})")
+    parser.add_argument('--lote', type=int, default=statusrota.ARQUIVO_TAMANHO_LOTE,
+                        help="quantidade de rotas arquivadas por transação")
+    parser.add_argument('--banco', default=statusrota.DB_PATH,
+                        help=f"arquivo do banco de dados (padrão: {statusrota.DB_PATH})")
+    args = parser.parse_args(argv)
+    if args.idade_dias < 0 or args.lote < 1:
+        parser.error("--idade-dias não pode ser negativo e --lote deve ser pelo menos 1")
+
+    statusrota.configurar(args.banco)
+    print(f"{statusrota.arquivar_rotas(args.idade_dias, args.lote)} rota(s) arquivada(s).")
+
+
+if __name__ == "__main__":
+    main()
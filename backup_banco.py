@@ -0,0 +1,96 @@
+"""Backups do banco do STATUSROTA sem parar a aplicação.
+
+Uso:
+    python backup_banco.py criar                    # backup verificado em backups/, mantendo os 14 mais recentes
+    python backup_banco.py agendar --intervalo-horas 4
+    python backup_banco.py listar
+    python backup_banco.py verificar backups/pops_rotas-20240101-120000.db
+    python backup_banco.py restaurar backups/pops_rotas-20240101-120000.db
+
+Para agendar pelo sistema em vez do comando agendar, use o cron, por exemplo:
+    0 */6 * * * cd /opt/statusrota && python backup_banco.py criar
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+
+import statusrota
+
+
+def _criar(args):
+    caminho = statusrota.criar_backup(args.diretorio, args.manter)
+    print(f"Backup criado: {caminho} ({os.path.getsize(caminho) / 1024 / 1024:.1f} MB)")
+
+
+def _agendar(args):
+    print(f"Backup a cada {args.intervalo_horas} hora(s) em {args.diretorio} (Ctrl+C para encerrar)")
+    while True:
+        try:
+            _criar(args)
+        except Exception as erro:
+            # Uma falha (ex.: disco cheio) não interrompe os próximos backups
+            print(f"{datetime.now():%Y-%m-%d %H:%M:%S} Falha no backup: {erro}", file=sys.stderr)
+        time.sleep(args.intervalo_horas * 3600)
+
+
+def _listar(args):
+    for caminho in statusrota.listar_backups(args.diretorio):
+        print(f"{caminho}\t{os.path.getsize(caminho) / 1024 / 1024:.1f} MB")
+
+
+def _verificar(args):
+    erros = statusrota.verificar_backup(args.arquivo)
+    if erros:
+        print("\n".join(erros), file=sys.stderr)
+        sys.exit(1)
+    print(f"{args.arquivo}: íntegro")
+
+
+def _restaurar(args):
+    if not args.sim:
+        resposta = input(f"Todo o conteúdo de {args.banco} será substituído por {args.arquivo}. Continuar? [s/N] ")
+        if resposta.strip().lower() != 's':
+            sys.exit(1)
+    if not args.sem_backup_atual and os.path.isfile(args.banco):
+        # O estado atual também vira um backup, para a restauração poder ser desfeita; sem rotação
+        # aqui, que poderia apagar justamente o backup a restaurar
+        manter = len(statusrota.listar_backups(args.diretorio)) + 1
+        print(f"Backup do estado atual: {statusrota.criar_backup(args.diretorio, manter)}")
+    statusrota.restaurar_backup(args.arquivo)
+    print(f"Banco {args.banco} restaurado a partir de {args.arquivo}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backups do banco do STATUSROTA.")
+    parser.add_argument('--banco', default=statusrota.DB_PATH,
+                        help=f"arquivo do banco de dados (padrão: {statusrota.DB_PATH})")
+    parser.add_argument('--diretorio', default=statusrota.BACKUP_DIRETORIO,
+                        help=f"diretório dos backups (padrão: {statusrota.BACKUP_DIRETORIO})")
+    parser.add_argument('--manter', type=int, default=statusrota.BACKUP_MANTER,
+                        help=f"quantidade de backups mantidos na rotação (padrão: {statusrota.BACKUP_MANTER})")
+    comandos = parser.add_subparsers(dest='comando', required=True)
+
+    comandos.add_parser('criar', help="cria um backup agora").set_defaults(funcao=_criar)
+    agendar = comandos.add_parser('agendar', help="cria backups periodicamente até ser interrompido")
+    agendar.add_argument('--intervalo-horas', type=float, default=statusrota.BACKUP_INTERVALO_HORAS)
+    agendar.set_defaults(funcao=_agendar)
+    comandos.add_parser('listar', help="lista os backups, do mais recente ao mais antigo").set_defaults(funcao=_listar)
+    verificar = comandos.add_parser('verificar', help="executa o integrity_check em um backup")
+    verificar.add_argument('arquivo')
+    verificar.set_defaults(funcao=_verificar)
+    restaurar = comandos.add_parser('restaurar', help="substitui o conteúdo do banco pelo de um backup")
+    restaurar.add_argument('arquivo')
+    restaurar.add_argument('--sim', action='store_true', help="não pede confirmação")
+    restaurar.add_argument('--sem-backup-atual', action='store_true',
+                           help="não faz um backup do estado atual antes de restaurar")
+    restaurar.set_defaults(funcao=_restaurar)
+    args = parser.parse_args(argv)
+
+    statusrota.configurar(args.banco)
+    args.funcao(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""Mede o desempenho das funções de acesso a dados sobre um banco sintético.
+
+Gera um banco reprodutível (mesma semente, mesmos dados), cronometra cada função
+e emite os resultados em JSON para comparação entre commits.
+
+Uso:
+    python benchmark.py --saida base.json                   # 50 POPs / 2.000 cidades / 100.000 rotas
+    python benchmark.py --rotas 10000 --comparar base.json  # compara com um resultado anterior
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import statusrota
+
+DIRETORIO_REPOSITORIO = os.path.dirname(os.path.abspath(__file__))
+DATA_BASE = datetime(2024, 1, 1)
+PALAVRAS_OBSERVACOES = ['cabo', 'rompido', 'poste', 'caixa', 'emenda', 'fusão', 'aguardando', 'equipe',
+                        'material', 'licença', 'prefeitura', 'chuva', 'acesso', 'cliente', 'backbone']
+PERCENTIS = [50, 90, 95, 99]
+CODIGOS_STATUS = list(statusrota.CODIGOS_STATUS.values())
+CODIGOS_ALIMENTACAO = list(statusrota.CODIGOS_ALIMENTACAO.values())
+
+def _observacao(aleatorio):
+    return ' '.join(aleatorio.choices(PALAVRAS_OBSERVACOES, k=aleatorio.randint(3, 12)))
+
+def gerar_dados(pops, cidades, rotas, semente):
+    """Preenche o banco (vazio) com dados sintéticos; a mesma semente gera sempre os mesmos dados"""
+    aleatorio = random.Random(semente)
+    with statusrota.transacao() as conn:
+        conn.executemany('INSERT INTO pops (id, nome_pop, localizacao, capacidade) VALUES (?, ?, ?, ?)',
+                         [(i, f"POP {i:03d}", f"Região {i % 7}", aleatorio.randint(50, 500)) for i in range(1, pops + 1)])
+        conn.executemany('INSERT INTO cidades (id, nome_cidade, pop_id) VALUES (?, ?, ?)',
+                         [(i, f"Cidade {i:05d}", (i - 1) % pops + 1) for i in range(1, cidades + 1)])
+
+        linhas = []
+        for i in range(1, rotas + 1):
+            cidade_id = aleatorio.randint(1, cidades)
+            status_lancamento = aleatorio.choice(CODIGOS_STATUS)
+            status_fusao = aleatorio.choice(CODIGOS_STATUS)
+            em_andamento = status_fusao == statusrota.STATUS_EM_ANDAMENTO
+            criacao = DATA_BASE + timedelta(seconds=aleatorio.randint(0, 180 * 86400))
+            linhas.append((
+                i, (cidade_id - 1) % pops + 1, cidade_id, f"Rota {i:06d}",
+                status_lancamento, status_fusao,
+                _observacao(aleatorio) if status_lancamento == statusrota.STATUS_EM_ANDAMENTO else None,
+                _observacao(aleatorio) if em_andamento else None,
+                aleatorio.choice(CODIGOS_ALIMENTACAO) if em_andamento else None,
+                criacao.strftime('%Y-%m-%d %H:%M:%S'),
+                (criacao + timedelta(seconds=aleatorio.randint(0, 30 * 86400))).strftime('%Y-%m-%d %H:%M:%S.000'),
+                'benchmark'
+            ))
+        conn.executemany('''
+            INSERT INTO rotas (id, pop_id, cidade_id, nome_rota, status_lancamento, status_fusao,
+                               observacoes_lancamento, observacoes_fusao, status_alimentacao,
+                               data_criacao, data_atualizacao, usuario_atualizacao)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', linhas)
+        conn.execute('ANALYZE')
+
+def resumir(tempos, total):
+    """Percentis, média e vazão de uma série de tempos (em segundos)"""
+    ordenados = sorted(tempos)
+
+    def percentil(p):
+        # Método do posto mais próximo: sempre um valor realmente medido
+        return ordenados[max(0, math.ceil(p / 100 * len(ordenados)) - 1)]
+
+    resumo = {'n': len(ordenados), 'min_ms': ordenados[0] * 1000}
+    resumo.update({f'p{p}_ms': percentil(p) * 1000 for p in PERCENTIS})
+    resumo.update({
+        'max_ms': ordenados[-1] * 1000,
+        'media_ms': sum(ordenados) / len(ordenados) * 1000,
+        'vazao_ops': len(ordenados) / total if total else None,
+    })
+    return resumo
+
+def medir(repeticoes, preparar, executar):
+    """Executa preparar() fora da medição e cronometra executar(valor preparado).
+
+    Uma execução de aquecimento, não cronometrada, vem antes das medidas.
+    """
+    executar(preparar())
+    tempos = []
+    for _ in range(repeticoes):
+        valor = preparar()
+        inicio = time.perf_counter()
+        executar(valor)
+        tempos.append(time.perf_counter() - inicio)
+    return resumir(tempos, sum(tempos))
+
+def casos(args, aleatorio):
+    """Funções medidas: nome -> (preparar, executar)"""
+    pops = list(range(1, args.pops + 1))
+    cache = statusrota.get_cache_leituras()
+
+    def sem_cache(valor_fn):
+        # Leituras frias: o cache de leituras é descartado fora da medição
+        def preparar():
+            cache.invalidar()
+            return valor_fn()
+        return preparar
+
+    def rota_qualquer():
+        return aleatorio.randint(1, args.rotas)
+
+    rotas_pop = statusrota.listar_rotas_by_pop(pops[0])
+
+    def atualizar(rota_id):
+        statusrota.update_status_rota(rota_id, aleatorio.choice(CODIGOS_STATUS), aleatorio.choice(CODIGOS_STATUS),
+                                      _observacao(aleatorio), None, None, 'benchmark')
+
+    # delete_pop é destrutivo: fica por último e cada execução (inclusive o aquecimento) exclui um POP diferente
+    a_excluir = iter(reversed(pops[1:]))
+
+    return {
+        'get_all_pops': (sem_cache(lambda: None), lambda _: statusrota.get_all_pops()),
+        'get_all_pops (cache)': (lambda: None, lambda _: statusrota.get_all_pops()),
+        'get_rotas_by_pop': (sem_cache(lambda: aleatorio.choice(pops)), statusrota.get_rotas_by_pop),
+        'get_pagina_rotas_by_pop': (sem_cache(lambda: aleatorio.choice(pops)), statusrota.get_pagina_rotas_by_pop),
+        'listar_pagina_rotas_by_pop': (sem_cache(lambda: aleatorio.choice(pops)), statusrota.listar_pagina_rotas_by_pop),
+        'listar_rotas_by_pop': (sem_cache(lambda: aleatorio.choice(pops)), statusrota.listar_rotas_by_pop),
+        'get_estatisticas_status': (sem_cache(lambda: None), lambda _: statusrota.get_estatisticas_status()),
+        'buscar_rotas': (sem_cache(lambda: aleatorio.choice(PALAVRAS_OBSERVACOES)), statusrota.buscar_rotas),
+        'gerar_relatorio_copiavel': (lambda: None, lambda _: statusrota.gerar_relatorio_copiavel("POP 001", rotas_pop)),
+        'update_status_rota': (rota_qualquer, atualizar),
+        # Reorganização em lote: 500 rotas para uma cidade sorteada, em uma única instrução
+        'mover_rotas': (lambda: (aleatorio.sample(range(1, args.rotas + 1), min(500, args.rotas)),
+                                 aleatorio.randint(1, args.cidades)),
+                        lambda params: statusrota.mover_rotas(*params, 'benchmark')),
+        'delete_pop': (lambda: next(a_excluir), statusrota.delete_pop),
+    }
+
+def comparar(resultado, base, tolerancia):
+    """Mostra a variação do p50 e do p95 em relação a um resultado anterior; retorna as regressões"""
+    regressoes = []
+    if base['parametros'] != resultado['parametros']:
+        print(f"Atenção: parâmetros diferentes do resultado anterior ({base['parametros']}).", file=sys.stderr)
+    print(f"\n{'função':32s} {'p50 base':>10s} {'p50':>10s} {'p95 base':>10s} {'p95':>10s}", file=sys.stderr)
+    for nome, atual in resultado['funcoes'].items():
+        anterior = base['funcoes'].get(nome)
+        if anterior is None:
+            continue
+        variacao = atual['p50_ms'] / anterior['p50_ms'] - 1 if anterior['p50_ms'] else 0
+        marca = ' <- regressão' if variacao > tolerancia else ''
+        if marca:
+            regressoes.append(nome)
+        print(f"{nome:32s} {anterior['p50_ms']:10.3f} {atual['p50_ms']:10.3f} "
+              f"{anterior['p95_ms']:10.3f} {atual['p95_ms']:10.3f} {variacao:+7.1%}{marca}", file=sys.stderr)
+    return regressoes
+
+def _commit_atual():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=DIRETORIO_REPOSITORIO,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def executar(args):
+    diretorio = os.path.abspath(args.diretorio or tempfile.mkdtemp(prefix='statusrota_benchmark_'))
+    os.makedirs(diretorio, exist_ok=True)
+    banco = os.path.join(diretorio, 'pops_rotas.db')
+    if os.path.exists(banco):
+        raise SystemExit(f"{diretorio} já contém um pops_rotas.db; use um diretório vazio.")
+    statusrota.configurar(banco)
+
+    inicio = time.perf_counter()
+    gerar_dados(args.pops, args.cidades, args.rotas, args.semente)
+    tempo_geracao = time.perf_counter() - inicio
+
+    aleatorio = random.Random(args.semente)
+    funcoes = {}
+    for nome, (preparar, executar_caso) in casos(args, aleatorio).items():
+        # O aquecimento de delete_pop consome um dos POPs que podem ser excluídos
+        repeticoes = min(args.repeticoes, args.pops - 2) if nome == 'delete_pop' else args.repeticoes
+        funcoes[nome] = medir(repeticoes, preparar, executar_caso)
+        print(f"{nome:32s} p50 {funcoes[nome]['p50_ms']:10.3f} ms  p95 {funcoes[nome]['p95_ms']:10.3f} ms  "
+              f"{funcoes[nome]['vazao_ops']:10.1f} ops/s", file=sys.stderr)
+
+    return {
+        'data': datetime.now().isoformat(timespec='seconds'),
+        'commit': _commit_atual(),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'parametros': {'pops': args.pops, 'cidades': args.cidades, 'rotas': args.rotas,
+                       'semente': args.semente, 'repeticoes': args.repeticoes},
+        'geracao_s': tempo_geracao,
+        'banco': banco,
+        'funcoes': funcoes,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark das funções de acesso a dados do STATUSROTA.")
+    parser.add_argument('--pops', type=int, default=50)
+    parser.add_argument('--cidades', type=int, default=2000)
+    parser.add_argument('--rotas', type=int, default=100000)
+    parser.add_argument('--semente', type=int, default=42, help="semente dos dados sintéticos e das escolhas aleatórias")
+    parser.add_argument('--repeticoes', type=int, default=20, help="execuções medidas por função")
+    parser.add_argument('--diretorio', help="onde criar o banco sintético (padrão: diretório temporário novo)")
+    parser.add_argument('--saida', default='-', help="arquivo JSON de resultados; '-' escreve na saída padrão (padrão)")
+    parser.add_argument('--comparar', help="JSON de um benchmark anterior para comparação")
+    parser.add_argument('--tolerancia', type=float, default=0.2,
+                        help="aumento relativo do p50 considerado regressão (padrão: 0.2 = 20%%)")
+    args = parser.parse_args(argv)
+    if args.pops < 3 or args.cidades < 1 or args.rotas < 1:
+        parser.error("são necessários pelo menos 3 POPs, 1 cidade e 1 rota")
+
+    saida = args.saida
+    base = None
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as arquivo:
+            base = json.load(arquivo)
+
+    resultado = executar(args)
+
+    if saida == '-':
+        json.dump(resultado, sys.stdout, indent=2, ensure_ascii=False)
+        print()
+    else:
+        with open(saida, 'w', encoding='utf-8') as arquivo:
+            json.dump(resultado, arquivo, indent=2, ensure_ascii=False)
+
+    if base is not None and comparar(resultado, base, args.tolerancia):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""Exporta o relatório de rotas de todos os POPs pela linha de comando.
+
+Uso:
+    python exportar_relatorio.py --formato csv --saida rotas.csv
+    python exportar_relatorio.py                # relatório em texto na saída padrão
+    python exportar_relatorio.py --banco /dados/pops_rotas.db --formato jsonl --saida rotas.jsonl
+"""
+import argparse
+import sys
+
+import statusrota
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exporta as rotas de todos os POPs.")
+    parser.add_argument('--formato', choices=list(statusrota.FORMATOS_EXPORTACAO.keys()), default='texto',
+                        help="formato de saída (padrão: texto)")
+    parser.add_argument('--saida', default='-',
+                        help="arquivo de destino; '-' escreve na saída padrão (padrão)")
+    parser.add_argument('--lote', type=int, default=statusrota.EXPORTACAO_TAMANHO_LOTE,
+                        help="quantidade de rotas lidas do banco por vez")
+    parser.add_argument('--banco', default=statusrota.DB_PATH,
+                        help=f"arquivo do banco de dados (padrão: {statusrota.DB_PATH})")
+    args = parser.parse_args(argv)
+
+    statusrota.configurar(args.banco)
+
+    if args.saida == '-':
+        sys.stdout.reconfigure(encoding='utf-8')
+        statusrota.exportar_rotas_para_arquivo(sys.stdout, args.formato, args.lote)
+    else:
+        with open(args.saida, 'w', encoding='utf-8', newline='') as arquivo:
+            statusrota.exportar_rotas_para_arquivo(arquivo, args.formato, args.lote)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+"""Preenche as coordenadas dos POPs pela linha de comando.
+
+Uso:
+    python geocodificar_pops.py                              # só localizações que já são "latitude, longitude"
+    python geocodificar_pops.py --gazetteer municipios.csv   # e as que são nomes de lugares do gazetteer
+    python geocodificar_pops.py --banco /dados/pops_rotas.db --gazetteer municipios.csv
+
+O gazetteer é um CSV (separado por vírgula ou ponto e vírgula) com as colunas
+nome, latitude e longitude. POPs que já têm coordenadas não são alterados.
+"""
+import argparse
+
+import statusrota
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Preenche as coordenadas dos POPs sem coordenadas.")
+    parser.add_argument('--gazetteer', help="CSV offline com as colunas nome, latitude e longitude")
+    parser.add_argument('--banco', default=statusrota.DB_PATH,
+                        help=f"arquivo do banco de dados (padrão: {statusrota.DB_PATH})")
+    args = parser.parse_args(argv)
+
+    gazetteer = statusrota.ler_gazetteer(args.gazetteer) if args.gazetteer else None
+    statusrota.configurar(args.banco)
+    preenchidos, restantes = statusrota.geocodificar_pops(gazetteer)
+    print(f"{preenchidos} POP(s) com coordenadas preenchidas; {restantes} continuam sem coordenadas.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""Serve a API JSON somente leitura do STATUSROTA (POPs, cidades, rotas e estatísticas).
+
+Uso:
+    python servidor_api.py                      # http://127.0.0.1:8502/api/pops
+    python servidor_api.py --banco /dados/pops_rotas.db --porta 8080
+    curl -H 'If-None-Match: "<etag>"' --compressed 'http://127.0.0.1:8502/api/rotas?pop_id=1&limite=100'
+
+Os recursos estão descritos em statusrota/api.py. Não há autenticação: mantenha o
+servidor escutando só na máquina local ou atrás de um proxy que a faça.
+"""
+import argparse
+
+import statusrota
+from statusrota.api import criar_servidor
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a API JSON somente leitura do STATUSROTA.")
+    parser.add_argument('--host', default=statusrota.API_HOST,
+                        help=f"endereço de escuta (padrão: {statusrota.API_HOST})")
+    parser.add_argument('--porta', type=int, default=statusrota.API_PORTA,
+                        help=f"porta de escuta (padrão: {statusrota.API_PORTA})")
+    parser.add_argument('--banco', default=statusrota.DB_PATH,
+                        help=f"arquivo do banco de dados (padrão: {statusrota.DB_PATH})")
+    args = parser.parse_args(argv)
+
+    statusrota.configurar(args.banco)
+    # Cria/atualiza o esquema antes de aceitar conexões
+    statusrota.get_pool()
+
+    servidor = criar_servidor(args.host, args.porta)
+    print(f"API em http://{args.host}:{args.porta}/api/pops (Ctrl+C para encerrar)")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Camada de dados do sistema de POPs e rotas, sem dependência do Streamlit.
+
+O esquema do banco é criado/atualizado uma única vez por processo, no primeiro
+acesso; para usar outro arquivo, chame configurar(caminho) antes disso.
+O pandas só é importado quando uma função que devolve DataFrames é chamada; as
+funções listar_* e a busca devolvem registros sqlite3.Row, para laços linha a linha.
+Os status das rotas são códigos inteiros (ver codigos.py); os DataFrames de rotas
+já os trazem como categóricos com os rótulos.
+A API HTTP somente leitura fica em api.py (servida por servidor_api.py).
+As consultas de rotas veem só as rotas ativas; as finalizadas antigas vão para o
+arquivo (ver arquivo.py) e são lidas sob demanda. As buscas espaciais de POPs
+(por área, raio e vizinhos mais próximos) usam o índice R*Tree de geo.py.
+"""
+from .config import (
+    API_GZIP_MIN_BYTES, API_HOST, API_MAX_LIMITE, API_PORTA, ARQUIVO_IDADE_DIAS, ARQUIVO_TAMANHO_LOTE,
+    BACKUP_DIRETORIO, BACKUP_INTERVALO_HORAS, BACKUP_MANTER, BUSCA_MAX_RESULTADOS, COLUNAS_IMPORTACAO,
+    COLUNAS_STATUS_ROTA, DB_PATH, DESEMPENHO_MAX_REGISTROS, EXPORTACAO_TAMANHO_LOTE, FORMATOS_EXPORTACAO,
+    GEO_RAIO_INICIAL_KM, GEO_RAIO_PADRAO_KM, OPCOES_ALIMENTACAO, OPCOES_STATUS, ROTAS_POR_PAGINA,
+)
+from .codigos import (
+    CODIGOS_ALIMENTACAO, CODIGOS_STATUS, COLUNAS_CODIFICADAS, STATUS_EM_ANDAMENTO, STATUS_FINALIZADA,
+    STATUS_PENDENTE, categorizar_status, codificar_status, codigo_status, registro_com_rotulos, rotulo_status,
+)
+from .banco import (
+    CacheLeituras, MonitorAlteracoes, PoolConexoes, RegistroDesempenho, conexao, configurar,
+    consultar_registros, finalizar_execucao, get_cache_leituras, get_cache_relatorios, get_cache_sessoes,
+    get_caminho_banco, get_monitor_alteracoes, get_pool, get_registro_desempenho, iniciar_execucao, instrumentada,
+    leitura_cacheada, registrar_consulta, resumo_desempenho, transacao, versao_banco,
+)
+from .esquema import (
+    MIGRACOES, TIPOS_ESTATISTICA, get_versao_esquema, reconstruir_busca, reconstruir_estatisticas,
+    reconstruir_indice_geo,
+)
+from .usuarios import (
+    criar_sessao, criar_usuario, encerrar_sessao, excluir_usuario, generate_session_token, get_all_usuarios,
+    hash_password, hash_token, validar_sessao, verificar_login,
+)
+from .cadastros import (
+    add_cidade, add_pop, add_rota, buscar_rotas, consulta_busca, contar_rotas_by_pop, delete_cidade,
+    delete_pop, delete_rota, excluir_cidades, excluir_pops, excluir_rotas, get_all_cidades, get_all_pops,
+    get_assinatura_rotas_pop, get_cidades_by_pop, get_pagina_rotas_by_pop, get_posicao_rota, get_rota,
+    get_rotas_by_cidade, get_rotas_by_pop, listar_cidades, listar_cidades_by_pop, listar_pagina_rotas_by_pop,
+    listar_pops, listar_pops_detalhados, listar_rotas_by_pop, mover_cidades, mover_rotas, update_status_rota,
+    update_status_rotas_em_lote,
+)
+from .arquivo import (
+    COLUNAS_ROTA, arquivar_rotas, contar_rotas_arquivadas_by_pop, get_rotas_arquivadas_by_pop,
+    listar_rotas_arquivadas_by_pop, restaurar_rotas_arquivadas,
+)
+from .estatisticas import (
+    contar_cidades, get_burndown, get_estatisticas_alimentacao, get_estatisticas_status,
+    get_tempo_em_andamento, get_vazao_diaria, listar_estatisticas,
+)
+from .relatorios import (
+    CABECALHO_RELATORIO, exportar_rotas, exportar_rotas_para_arquivo, gerar_relatorio_copiavel,
+    gerar_relatorio_pop, iterar_lotes_rotas, linha_relatorio, linhas_relatorio,
+)
+from .importacao import importar_planilha, ler_planilha, validar_planilha
+from .geo import (
+    DISTANCIA_MAXIMA_KM, RAIO_TERRA_KM, atualizar_coordenadas_pop, distancia_km, extrair_coordenadas,
+    geocodificar_pops, get_mapa_pops, ler_gazetteer, pops_mais_proximos, pops_na_area, pops_proximos,
+)
+from .backups import (
+    copiar_banco, criar_backup, listar_backups, restaurar_backup, rotacionar_backups, verificar_backup,
+)
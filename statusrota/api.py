@@ -0,0 +1,244 @@
+"""API HTTP somente leitura (JSON) sobre a camada de dados, sem dependência do Streamlit.
+
+Recursos:
+    GET /api/pops
+    GET /api/pops/proximos?latitude=&longitude=[&raio_km=]   (POPs a até raio_km do ponto, do mais próximo)
+    GET /api/cidades[?pop_id=]
+    GET /api/rotas?pop_id=[&limite=][&cursor=]   (paginada; 'proxima' traz a URL da página seguinte)
+    GET /api/rotas/<id>
+    GET /api/estatisticas[?pop_id=]
+
+Toda resposta leva um ETag derivado da versão do banco (versao_banco): um
+If-None-Match com o ETag atual é respondido com 304 sem consultar nenhum dado.
+Com Accept-Encoding: gzip, corpos a partir de API_GZIP_MIN_BYTES vão comprimidos.
+Os status das rotas saem com os rótulos, como nas exportações.
+"""
+import base64
+import gzip
+import json
+import re
+import secrets
+import traceback
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+from .banco import get_cache_leituras, versao_banco
+from .cadastros import contar_rotas_by_pop, get_rota, listar_cidades, listar_pagina_rotas_by_pop, listar_pops_detalhados
+from .codigos import registro_com_rotulos, rotulo_status
+from .config import API_GZIP_MIN_BYTES, API_HOST, API_MAX_LIMITE, API_PORTA, GEO_RAIO_PADRAO_KM, ROTAS_POR_PAGINA
+from .esquema import TIPOS_ESTATISTICA
+from .estatisticas import listar_estatisticas
+from .geo import DISTANCIA_MAXIMA_KM, pops_proximos
+
+class _ErroApi(Exception):
+    def __init__(self, status, mensagem):
+        super().__init__(mensagem)
+        self.status = status
+
+# Parâmetros da URL
+def _inteiro(params, nome, padrao=None, minimo=None, maximo=None):
+    valor = params.get(nome, [None])[-1]
+    if valor is None or valor == '':
+        if padrao is None:
+            raise _ErroApi(HTTPStatus.BAD_REQUEST, f"Parâmetro '{nome}' é obrigatório.")
+        return padrao
+    try:
+        valor = int(valor)
+    except ValueError:
+        raise _ErroApi(HTTPStatus.BAD_REQUEST, f"Parâmetro '{nome}' deve ser um número inteiro.") from None
+    if (minimo is not None and valor < minimo) or (maximo is not None and valor > maximo):
+        raise _ErroApi(HTTPStatus.BAD_REQUEST, f"Parâmetro '{nome}' deve estar entre {minimo} e {maximo}.")
+    return valor
+
+def _decimal(params, nome, minimo, maximo, padrao=None):
+    valor = params.get(nome, [''])[-1]
+    if valor == '':
+        if padrao is None:
+            raise _ErroApi(HTTPStatus.BAD_REQUEST, f"Parâmetro '{nome}' é obrigatório.")
+        return padrao
+    try:
+        valor = float(valor)
+    except ValueError:
+        raise _ErroApi(HTTPStatus.BAD_REQUEST, f"Parâmetro '{nome}' deve ser um número.") from None
+    if not minimo <= valor <= maximo:
+        raise _ErroApi(HTTPStatus.BAD_REQUEST, f"Parâmetro '{nome}' deve estar entre {minimo} e {maximo}.")
+    return valor
+
+def _inteiro_opcional(params, nome):
+    return _inteiro(params, nome) if params.get(nome, [''])[-1] != '' else None
+
+# Cursor opaco da paginação: o mesmo (data_criacao, id) usado pela listagem da interface
+def _codificar_cursor(rota):
+    texto = json.dumps([rota['data_criacao'], rota['id']], separators=(',', ':'))
+    return base64.urlsafe_b64encode(texto.encode('utf-8')).decode('ascii').rstrip('=')
+
+def _decodificar_cursor(cursor):
+    try:
+        data_criacao, rota_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return str(data_criacao), int(rota_id)
+    except (ValueError, TypeError):
+        raise _ErroApi(HTTPStatus.BAD_REQUEST, "Parâmetro 'cursor' inválido.") from None
+
+# Recursos: cada um recebe os parâmetros da URL (e o id do caminho) e devolve o objeto JSON
+def _pops(params):
+    return [dict(pop) for pop in listar_pops_detalhados()]
+
+def _pops_proximos(params):
+    return pops_proximos(
+        _decimal(params, 'latitude', -90, 90),
+        _decimal(params, 'longitude', -180, 180),
+        _decimal(params, 'raio_km', 0, DISTANCIA_MAXIMA_KM, GEO_RAIO_PADRAO_KM),
+    )
+
+def _cidades(params):
+    pop_id = _inteiro_opcional(params, 'pop_id')
+    return [dict(cidade) for cidade in listar_cidades() if pop_id is None or cidade['pop_id'] == pop_id]
+
+def _rotas(params):
+    pop_id = _inteiro(params, 'pop_id')
+    limite = _inteiro(params, 'limite', ROTAS_POR_PAGINA, 1, API_MAX_LIMITE)
+    cursor = params.get('cursor', [''])[-1]
+    apos = _decodificar_cursor(cursor) if cursor else None
+
+    # Uma rota a mais só para saber se existe a página seguinte
+    rotas = listar_pagina_rotas_by_pop(pop_id, limite + 1, apos)
+    proxima = None
+    if len(rotas) > limite:
+        rotas = rotas[:limite]
+        proxima = '/api/rotas?' + urlencode({'pop_id': pop_id, 'limite': limite, 'cursor': _codificar_cursor(rotas[-1])})
+    return {
+        'total': contar_rotas_by_pop(pop_id),
+        'rotas': [registro_com_rotulos(rota) for rota in rotas],
+        'proxima': proxima,
+    }
+
+def _rota(params, rota_id):
+    rota = get_rota(rota_id)
+    if rota is None:
+        raise _ErroApi(HTTPStatus.NOT_FOUND, f"Rota {rota_id} não encontrada.")
+    return registro_com_rotulos(rota)
+
+def _estatisticas(params):
+    estatisticas = {tipo: [] for tipo in TIPOS_ESTATISTICA}
+    for linha in listar_estatisticas(_inteiro_opcional(params, 'pop_id')):
+        # status -1 = não informado
+        status = rotulo_status(TIPOS_ESTATISTICA[linha['tipo']], linha['status'] if linha['status'] >= 0 else None)
+        estatisticas[linha['tipo']].append({'status': status, 'quantidade': linha['quantidade']})
+    return estatisticas
+
+RECURSOS = [
+    (re.compile(r'/api/pops'), _pops),
+    (re.compile(r'/api/pops/proximos'), _pops_proximos),
+    (re.compile(r'/api/cidades'), _cidades),
+    (re.compile(r'/api/rotas'), _rotas),
+    (re.compile(r'/api/rotas/(\d+)'), _rota),
+    (re.compile(r'/api/estatisticas'), _estatisticas),
+]
+
+def _resolver(caminho):
+    """(função, argumentos do caminho) do recurso; não consulta o banco"""
+    caminho = caminho.rstrip('/') or '/'
+    for padrao, funcao in RECURSOS:
+        encontrado = padrao.fullmatch(caminho)
+        if encontrado:
+            return funcao, [int(grupo) for grupo in encontrado.groups()]
+    raise _ErroApi(HTTPStatus.NOT_FOUND, f"Recurso {caminho} não encontrado.")
+
+# Cabeçalhos condicionais e de codificação
+def _etag_confere(if_none_match, etag):
+    """Comparação fraca do If-None-Match com o ETag atual (RFC 9110)"""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in tags or any(tag.removeprefix('W/') == etag for tag in tags)
+
+def _aceita_gzip(accept_encoding):
+    # Pesos (q) por codificação; uma entrada gzip explícita tem prioridade sobre o curinga *
+    pesos = {}
+    for item in (accept_encoding or '').split(','):
+        nome, *parametros = (parte.strip().lower() for parte in item.split(';'))
+        peso = 1.0
+        for parametro in parametros:
+            if parametro.startswith('q='):
+                try:
+                    peso = float(parametro[2:])
+                except ValueError:
+                    peso = 0.0
+        pesos.setdefault(nome, peso)
+    return pesos.get('gzip', pesos.get('*', 0.0)) > 0
+
+def _corpo_json(objeto):
+    return json.dumps(objeto, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+class ManipuladorApi(BaseHTTPRequestHandler):
+    """Atende GET/HEAD dos recursos da API; o servidor deve ter o atributo instancia"""
+
+    server_version = 'STATUSROTA-API'
+    # Conexões persistentes: quem consulta periodicamente não reabre o TCP a cada pedido
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self._responder(enviar_corpo=True)
+
+    def do_HEAD(self):
+        self._responder(enviar_corpo=False)
+
+    def _responder(self, enviar_corpo):
+        url = urlsplit(self.path)
+        try:
+            funcao, argumentos = _resolver(url.path)
+
+            # A versão é lida antes dos dados: se algo mudar no meio, a próxima consulta
+            # recebe outro ETag e nunca um 304 para dados antigos.
+            # A instância distingue os ETags de execuções diferentes do servidor.
+            comprimir = _aceita_gzip(self.headers.get('Accept-Encoding'))
+            etag = f'"{self.server.instancia}-{versao_banco()}{"-gz" if comprimir else ""}"'
+            if _etag_confere(self.headers.get('If-None-Match'), etag):
+                self._enviar(HTTPStatus.NOT_MODIFIED, b'', etag=etag)
+                return
+
+            def gerar():
+                corpo = _corpo_json(funcao(parse_qs(url.query), *argumentos))
+                if comprimir and len(corpo) >= API_GZIP_MIN_BYTES:
+                    return gzip.compress(corpo, mtime=0), True
+                return corpo, False
+
+            # Cache de leituras: descartado a cada nova versão do banco (ver versao_banco)
+            corpo, comprimido = get_cache_leituras().obter(('api', self.path, comprimir), gerar)
+        except _ErroApi as erro:
+            self._enviar(erro.status, _corpo_json({'erro': str(erro)}), enviar_corpo=enviar_corpo)
+            return
+        except Exception as erro:
+            # Ex.: banco bloqueado ou erro em um recurso; o cliente recebe uma resposta em vez
+            # da conexão derrubada, e o detalhe fica só no log do servidor
+            self.log_error('Erro ao atender %s: %r', self.path, erro)
+            traceback.print_exc()
+            self._enviar(HTTPStatus.INTERNAL_SERVER_ERROR, _corpo_json({'erro': "Erro interno do servidor."}),
+                         enviar_corpo=enviar_corpo)
+            return
+        self._enviar(HTTPStatus.OK, corpo, etag=etag, comprimido=comprimido, enviar_corpo=enviar_corpo)
+
+    def _enviar(self, status, corpo, etag=None, comprimido=False, enviar_corpo=True):
+        self.send_response(status)
+        if etag is not None:
+            self.send_header('ETag', etag)
+            # Pode guardar, mas deve revalidar sempre (If-None-Match) antes de reutilizar
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('Vary', 'Accept-Encoding')
+        else:
+            self.send_header('Cache-Control', 'no-store')
+        if status != HTTPStatus.NOT_MODIFIED:
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(corpo)))
+        if comprimido:
+            self.send_header('Content-Encoding', 'gzip')
+        self.end_headers()
+        if enviar_corpo and corpo:
+            self.wfile.write(corpo)
+
+def criar_servidor(host=API_HOST, porta=API_PORTA):
+    """Servidor da API (uma thread por conexão); inicie com serve_forever()"""
+    servidor = ThreadingHTTPServer((host, porta), ManipuladorApi)
+    servidor.instancia = secrets.token_hex(4)
+    return servidor
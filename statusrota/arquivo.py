@@ -0,0 +1,96 @@
+"""Arquivo de rotas: rotas finalizadas há muito tempo saem de rotas para rotas_arquivo.
+
+As listagens, a busca, os relatórios e a API consultam só as rotas ativas; as
+arquivadas são lidas sob demanda pelas funções deste módulo e continuam contadas
+nas estatísticas (ver esquema.criar_triggers_estatisticas). Uma rota arquivada
+mantém o id e pode ser restaurada.
+"""
+from .banco import conexao, consultar_registros, instrumentada, leitura_cacheada, transacao
+from .codigos import STATUS_FINALIZADA, categorizar_status
+from .config import ARQUIVO_IDADE_DIAS, ARQUIVO_TAMANHO_LOTE
+
+# Colunas comuns a rotas e rotas_arquivo
+COLUNAS_ROTA = ['id', 'pop_id', 'cidade_id', 'nome_rota', 'status_lancamento', 'status_fusao',
+                'observacoes_lancamento', 'observacoes_fusao', 'status_alimentacao',
+                'data_criacao', 'data_atualizacao', 'usuario_atualizacao', 'versao']
+
+@instrumentada
+def arquivar_rotas(idade_dias=ARQUIVO_IDADE_DIAS, lote=ARQUIVO_TAMANHO_LOTE):
+    """Arquiva as rotas com lançamento e fusão finalizados e sem atualização há mais de idade_dias.
+
+    Cada lote é uma transação própria, então as gravações da aplicação não esperam o
+    arquivamento inteiro. Retorna a quantidade de rotas arquivadas.
+    """
+    if lote < 1:
+        raise ValueError(f"O tamanho do lote deve ser pelo menos 1 (recebido: {lote}).")
+    colunas = ', '.join(COLUNAS_ROTA)
+    total = 0
+    while True:
+        with transacao() as conn:
+            # A condição literal permite usar o índice parcial idx_rotas_finalizadas_atualizacao
+            ids = [rota_id for (rota_id,) in conn.execute(f'''
+                SELECT id FROM rotas 
+                WHERE status_lancamento = {STATUS_FINALIZADA} AND status_fusao = {STATUS_FINALIZADA} 
+                  AND data_atualizacao < strftime('%Y-%m-%d %H:%M:%f', 'now', ?) 
+                ORDER BY data_atualizacao 
+                LIMIT ?
+            ''', (f'-{idade_dias} days', lote))]
+            if ids:
+                marcadores = ",".join("?" * len(ids))
+                # Primeiro a cópia, depois a exclusão: os triggers de rotas reconhecem o
+                # arquivamento pela linha já presente em rotas_arquivo
+                conn.execute(f'INSERT INTO rotas_arquivo ({colunas}) SELECT {colunas} FROM rotas WHERE id IN ({marcadores})', ids)
+                conn.execute(f'DELETE FROM rotas WHERE id IN ({marcadores})', ids)
+        total += len(ids)
+        if len(ids) < lote:
+            return total
+
+def _restaurar_rotas(conn, rota_ids, usuario):
+    # Mesma ordem do arquivamento ao contrário: a linha ainda em rotas_arquivo durante o
+    # INSERT faz os triggers de rotas registrarem uma restauração, não uma criação
+    colunas = ', '.join(COLUNAS_ROTA)
+    valores = ', '.join({
+        'data_atualizacao': "strftime('%Y-%m-%d %H:%M:%f', 'now')",
+        'usuario_atualizacao': '?',
+        'versao': 'versao + 1',
+    }.get(coluna, coluna) for coluna in COLUNAS_ROTA)
+    marcadores = ",".join("?" * len(rota_ids))
+    conn.execute(f'INSERT INTO rotas ({colunas}) SELECT {valores} FROM rotas_arquivo WHERE id IN ({marcadores})',
+                 [usuario, *rota_ids])
+    return conn.execute(f'DELETE FROM rotas_arquivo WHERE id IN ({marcadores})', rota_ids).rowcount
+
+@instrumentada
+def restaurar_rotas_arquivadas(rota_ids, usuario=None):
+    """Devolve rotas arquivadas para rotas; retorna a quantidade restaurada.
+
+    A data de atualização passa a ser a da restauração, para que a rota não volte
+    ao arquivo no próximo arquivamento.
+    """
+    with transacao() as conn:
+        return _restaurar_rotas(conn, rota_ids, usuario)
+
+SQL_ROTAS_ARQUIVADAS_POP = '''
+    SELECT r.*, c.nome_cidade, p.nome_pop 
+    FROM rotas_arquivo r 
+    LEFT JOIN cidades c ON r.cidade_id = c.id 
+    LEFT JOIN pops p ON r.pop_id = p.id 
+    WHERE r.pop_id = ? 
+    ORDER BY r.data_criacao ASC, r.id ASC
+'''
+
+@leitura_cacheada
+def get_rotas_arquivadas_by_pop(pop_id):
+    import pandas as pd
+
+    with conexao() as conn:
+        return categorizar_status(pd.read_sql(SQL_ROTAS_ARQUIVADAS_POP, conn, params=(pop_id,)))
+
+@leitura_cacheada
+def listar_rotas_arquivadas_by_pop(pop_id):
+    """Rotas arquivadas do POP como registros sqlite3.Row, na ordem da listagem"""
+    return consultar_registros(SQL_ROTAS_ARQUIVADAS_POP, (pop_id,))
+
+@leitura_cacheada
+def contar_rotas_arquivadas_by_pop(pop_id):
+    with conexao() as conn:
+        return conn.execute('SELECT COUNT(*) FROM rotas_arquivo WHERE pop_id = ?', (pop_id,)).fetchone()[0]
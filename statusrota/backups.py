@@ -0,0 +1,138 @@
+"""Backups do banco em funcionamento pela API de backup do SQLite: cópia, verificação, rotação e restauração"""
+import os
+import sqlite3
+import time
+from datetime import datetime
+
+from .banco import get_cache_leituras, get_cache_relatorios, get_cache_sessoes, get_caminho_banco, instrumentada
+from .config import (
+    BACKUP_DIRETORIO, BACKUP_MANTER, BACKUP_PAGINAS_POR_PASSO, BACKUP_PAUSA_SEGUNDOS, BUSY_TIMEOUT_MS,
+)
+from .esquema import MIGRACOES, get_versao_esquema, init_db
+
+def _prefixo_backup():
+    # pops_rotas.db -> pops_rotas-AAAAMMDD-HHMMSS-ffffff.db (microssegundos: backups no mesmo segundo não colidem)
+    return os.path.splitext(os.path.basename(get_caminho_banco()))[0]
+
+def listar_backups(diretorio=BACKUP_DIRETORIO):
+    """Caminhos dos backups do banco no diretório, do mais recente para o mais antigo"""
+    if not os.path.isdir(diretorio):
+        return []
+    prefixo = _prefixo_backup() + '-'
+    nomes = sorted((nome for nome in os.listdir(diretorio) if nome.startswith(prefixo) and nome.endswith('.db')),
+                   reverse=True)
+    return [os.path.join(diretorio, nome) for nome in nomes]
+
+def verificar_backup(caminho):
+    """Mensagens do PRAGMA integrity_check do arquivo; lista vazia se ele está íntegro"""
+    if not os.path.isfile(caminho):
+        raise FileNotFoundError(caminho)
+    conn = sqlite3.connect(caminho)
+    try:
+        mensagens = [mensagem for (mensagem,) in conn.execute('PRAGMA integrity_check')]
+    except sqlite3.DatabaseError as erro:
+        # Ex.: "file is not a database"
+        mensagens = [str(erro)]
+    finally:
+        conn.close()
+    return [] if mensagens == ['ok'] else mensagens
+
+def copiar_banco(destino, paginas=BACKUP_PAGINAS_POR_PASSO, pausa=BACKUP_PAUSA_SEGUNDOS):
+    """Copia o banco em funcionamento para o arquivo destino, em passos com pausas entre eles.
+
+    A origem mantém uma transação de leitura aberta do início ao fim: a cópia é um
+    retrato de um único momento e não recomeça a cada gravação feita por outra conexão
+    (sem isso, com gravações frequentes, ela nunca terminaria). Em WAL, essa leitura
+    não bloqueia quem grava.
+    """
+    caminho = get_caminho_banco()
+    if not os.path.isfile(caminho):
+        raise FileNotFoundError(caminho)
+    origem = sqlite3.connect(caminho, isolation_level=None, timeout=BUSY_TIMEOUT_MS / 1000)
+    copia = sqlite3.connect(destino)
+    try:
+        origem.execute('BEGIN')
+        origem.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()
+        origem.backup(copia, pages=paginas, progress=lambda status, restantes, total: time.sleep(pausa))
+        origem.rollback()
+        # O arquivo de backup é autossuficiente: sem -wal/-shm ao ser aberto
+        copia.execute('PRAGMA journal_mode = DELETE')
+    finally:
+        copia.close()
+        origem.close()
+
+def rotacionar_backups(diretorio=BACKUP_DIRETORIO, manter=BACKUP_MANTER):
+    """Apaga os backups mais antigos, mantendo os `manter` mais recentes; retorna os apagados"""
+    antigos = listar_backups(diretorio)[manter:]
+    for caminho in antigos:
+        os.remove(caminho)
+    return antigos
+
+@instrumentada
+def criar_backup(diretorio=BACKUP_DIRETORIO, manter=BACKUP_MANTER,
+                 paginas=BACKUP_PAGINAS_POR_PASSO, pausa=BACKUP_PAUSA_SEGUNDOS):
+    """Cria um backup verificado no diretório e aplica a rotação; retorna o caminho do backup.
+
+    A cópia é feita em um arquivo .parcial e só recebe o nome definitivo depois de
+    passar no integrity_check: um backup listado é sempre um backup íntegro. Um backup
+    existente nunca é substituído (FileExistsError).
+    """
+    os.makedirs(diretorio, exist_ok=True)
+    destino = os.path.join(diretorio, f"{_prefixo_backup()}-{datetime.now():%Y%m%d-%H%M%S-%f}.db")
+    if os.path.exists(destino):
+        raise FileExistsError(f"O backup {destino} já existe.")
+    # Parcial próprio deste processo: outra cópia simultânea nunca escreve no mesmo arquivo
+    parcial = f"{destino}.{os.getpid()}.parcial"
+    try:
+        copiar_banco(parcial, paginas, pausa)
+        erros = verificar_backup(parcial)
+        if erros:
+            raise RuntimeError(f"O backup não passou na verificação de integridade: {erros[0]}")
+        # Ao contrário de os.replace, os.link falha se o destino já existir
+        try:
+            os.link(parcial, destino)
+        except FileExistsError:
+            raise FileExistsError(f"O backup {destino} já existe.") from None
+    finally:
+        if os.path.exists(parcial):
+            os.remove(parcial)
+    rotacionar_backups(diretorio, manter)
+    return destino
+
+def restaurar_backup(caminho):
+    """Substitui todo o conteúdo do banco pelo do backup e o atualiza para o esquema atual.
+
+    O backup é verificado antes; a cópia é feita em um único passo, então quem estiver
+    usando o banco vê o conteúdo anterior ou o restaurado, nunca uma mistura. De
+    preferência, pare a aplicação antes: sessões e edições em andamento se perdem.
+    """
+    erros = verificar_backup(caminho)
+    if erros:
+        raise RuntimeError(f"O backup {caminho} não passou na verificação de integridade: {erros[0]}")
+
+    origem = sqlite3.connect(caminho)
+    try:
+        versao = get_versao_esquema(origem)
+        if versao > len(MIGRACOES):
+            raise RuntimeError(f"Backup na versão {versao}, mais nova que a suportada por esta aplicação ({len(MIGRACOES)}).")
+
+        destino = sqlite3.connect(get_caminho_banco(), isolation_level=None, timeout=BUSY_TIMEOUT_MS / 1000)
+        try:
+            origem.backup(destino)
+            destino.execute('PRAGMA journal_mode = WAL')
+            destino.execute('PRAGMA foreign_keys = ON')
+            # Backups de versões anteriores recebem as migrações que faltam
+            destino.execute('BEGIN IMMEDIATE')
+            try:
+                init_db(destino)
+            except BaseException:
+                destino.rollback()
+                raise
+            destino.commit()
+        finally:
+            destino.close()
+    finally:
+        origem.close()
+
+    for cache in (get_cache_leituras(), get_cache_relatorios(), get_cache_sessoes()):
+        cache.invalidar()
@@ -0,0 +1,330 @@
+"""Conexões, transações, caches de leitura e instrumentação da camada de dados"""
+import functools
+import json
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from datetime import datetime
+
+from .config import (
+    BUSY_TIMEOUT_MS, CACHE_LEITURAS_MAX_ITENS, CACHE_PAGINAS_KB, CACHE_RELATORIOS_MAX_ITENS,
+    CACHE_SESSOES_MAX_ITENS, DB_PATH, DESEMPENHO_ARQUIVO_LOG, DESEMPENHO_MAX_REGISTROS, POOL_TAMANHO,
+)
+
+class PoolConexoes:
+    """Pool de conexões SQLite já configuradas, compartilhado pelo processo"""
+
+    def __init__(self, caminho, tamanho=POOL_TAMANHO):
+        self.caminho = caminho
+        self._livres = queue.LifoQueue(maxsize=tamanho)
+
+    def _nova_conexao(self):
+        # isolation_level=None: as transações são abertas explicitamente em transacao()
+        conn = sqlite3.connect(self.caminho, check_same_thread=False,
+                               isolation_level=None, timeout=BUSY_TIMEOUT_MS / 1000)
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = NORMAL')
+        conn.execute('PRAGMA foreign_keys = ON')
+        conn.execute(f'PRAGMA cache_size = -{CACHE_PAGINAS_KB}')
+        conn.execute(f'PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}')
+        conn.execute('PRAGMA temp_store = MEMORY')
+        return conn
+
+    @contextmanager
+    def conexao(self):
+        try:
+            conn = self._livres.get_nowait()
+        except queue.Empty:
+            conn = self._nova_conexao()
+        try:
+            yield conn
+        finally:
+            # Nunca devolver ao pool uma conexão com transação pendente
+            if conn.in_transaction:
+                conn.rollback()
+            try:
+                self._livres.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+# Pool único do processo, criado no primeiro acesso ao banco
+_caminho_banco = DB_PATH
+_pool = None
+_monitor = None
+_lock_pool = threading.Lock()
+
+def configurar(caminho):
+    """Define o arquivo do banco; deve ser chamada antes do primeiro acesso"""
+    global _caminho_banco
+    with _lock_pool:
+        if _pool is not None and caminho != _caminho_banco:
+            raise RuntimeError(f"O banco {_caminho_banco} já está em uso por este processo.")
+        _caminho_banco = caminho
+
+def get_caminho_banco():
+    return _caminho_banco
+
+def get_pool():
+    """Pool único por processo; o primeiro acesso cria/atualiza o esquema do banco"""
+    global _pool, _monitor
+    if _pool is None:
+        with _lock_pool:
+            if _pool is None:
+                from .esquema import init_db
+
+                pool = PoolConexoes(_caminho_banco)
+                with pool.conexao() as conn, _escrita(conn):
+                    init_db(conn)
+                # Criado junto com o pool, antes de qualquer leitura ir para o cache, para
+                # que nenhuma escrita de outro processo passe despercebida
+                _monitor = MonitorAlteracoes(_caminho_banco)
+                _pool = pool
+    return _pool
+
+@contextmanager
+def conexao():
+    """Empresta uma conexão do pool para leituras"""
+    with get_pool().conexao() as conn:
+        yield conn
+
+def consultar_registros(sql, params=()):
+    """Executa uma leitura e retorna as linhas como sqlite3.Row (acesso por nome, sem pandas)"""
+    with conexao() as conn:
+        # A fábrica de linhas vale só para este cursor; as demais leituras da conexão continuam com tuplas
+        cursor = conn.cursor()
+        cursor.row_factory = sqlite3.Row
+        return cursor.execute(sql, params).fetchall()
+
+@contextmanager
+def _escrita(conn):
+    # BEGIN IMMEDIATE reserva a escrita logo no início e evita "database is locked" no meio do bloco
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+
+@contextmanager
+def transacao(invalidar_cache=True):
+    """Executa um bloco de escrita em uma única transação"""
+    with conexao() as conn, _escrita(conn):
+        yield conn
+    # Toda escrita confirmada invalida as leituras em cache (exceto as que não
+    # afetam dados exibidos, como as sessões de login)
+    if invalidar_cache:
+        get_cache_leituras().invalidar()
+
+# Cache de leituras
+class CacheLeituras:
+    """Cache LRU de consultas, invalidado a cada escrita por um contador de geração"""
+
+    def __init__(self, max_itens=CACHE_LEITURAS_MAX_ITENS):
+        self.max_itens = max_itens
+        self.geracao = 0
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obter(self, chave, carregar):
+        # A geração faz parte da chave: uma leitura iniciada antes de uma escrita
+        # é guardada sob a geração antiga e nunca é servida depois dela
+        chave = (self.geracao,) + chave
+        with self._lock:
+            if chave in self._itens:
+                self._itens.move_to_end(chave)
+                return self._itens[chave]
+
+        valor = carregar()
+
+        with self._lock:
+            self._itens[chave] = valor
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+        return valor
+
+    def invalidar(self):
+        with self._lock:
+            self.geracao += 1
+            self._itens.clear()
+
+    def descartar(self, chave):
+        with self._lock:
+            self._itens.pop((self.geracao,) + chave, None)
+
+_cache_leituras = CacheLeituras()
+# Nunca invalidado por geração: a chave já contém a assinatura das rotas do POP
+_cache_relatorios = CacheLeituras(CACHE_RELATORIOS_MAX_ITENS)
+# Validação de tokens sem ida ao banco a cada rerun
+_cache_sessoes = CacheLeituras(CACHE_SESSOES_MAX_ITENS)
+
+def get_cache_leituras():
+    return _cache_leituras
+
+def get_cache_relatorios():
+    return _cache_relatorios
+
+def get_cache_sessoes():
+    return _cache_sessoes
+
+# Instrumentação de desempenho
+class RegistroDesempenho:
+    """Buffer circular com as últimas medições de consultas e de execuções das páginas"""
+
+    def __init__(self, max_registros=DESEMPENHO_MAX_REGISTROS, arquivo_log=DESEMPENHO_ARQUIVO_LOG):
+        self.arquivo_log = arquivo_log
+        self._registros = deque(maxlen=max_registros)
+        self._lock = threading.Lock()
+
+    def registrar(self, **registro):
+        registro['ts'] = datetime.now().isoformat(timespec='milliseconds')
+        with self._lock:
+            self._registros.append(registro)
+            if self.arquivo_log:
+                with open(self.arquivo_log, 'a', encoding='utf-8') as arquivo:
+                    arquivo.write(json.dumps(registro, ensure_ascii=False) + '\n')
+
+    def registros(self, tipo):
+        with self._lock:
+            return [registro for registro in self._registros if registro['tipo'] == tipo]
+
+    def limpar(self):
+        with self._lock:
+            self._registros.clear()
+
+_registro_desempenho = RegistroDesempenho()
+
+def get_registro_desempenho():
+    return _registro_desempenho
+
+# Totais da execução em andamento (cada sessão executa o script em sua própria thread)
+_execucao_atual = threading.local()
+
+def iniciar_execucao():
+    """Passa a somar as consultas feitas por esta thread"""
+    _execucao_atual.consultas, _execucao_atual.consultas_ms = 0, 0.0
+
+def finalizar_execucao():
+    """Retorna (consultas, tempo total em ms) desde iniciar_execucao()"""
+    totais = (_execucao_atual.consultas, _execucao_atual.consultas_ms)
+    del _execucao_atual.consultas, _execucao_atual.consultas_ms
+    return totais
+
+def _contar_linhas(resultado):
+    # Se o pandas não foi carregado, o resultado não é um DataFrame
+    pd = sys.modules.get('pandas')
+    if pd is None:
+        return len(resultado) if isinstance(resultado, list) else None
+    if isinstance(resultado, pd.DataFrame):
+        return len(resultado)
+    if isinstance(resultado, tuple) and resultado and all(isinstance(df, pd.DataFrame) for df in resultado):
+        return sum(len(df) for df in resultado)
+    if isinstance(resultado, list):
+        return len(resultado)
+    return None
+
+def registrar_consulta(nome, inicio, resultado, cache=False):
+    duracao_ms = (time.perf_counter() - inicio) * 1000
+    get_registro_desempenho().registrar(tipo='consulta', nome=nome, duracao_ms=duracao_ms,
+                                        linhas=_contar_linhas(resultado), cache=cache)
+    if hasattr(_execucao_atual, 'consultas'):
+        _execucao_atual.consultas += 1
+        _execucao_atual.consultas_ms += duracao_ms
+
+def instrumentada(func):
+    """Decorador para funções de acesso a dados: registra a duração e as linhas de cada chamada"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        inicio = time.perf_counter()
+        resultado = func(*args, **kwargs)
+        registrar_consulta(func.__name__, inicio, resultado)
+        return resultado
+    return wrapper
+
+def resumo_desempenho(tipo):
+    """p50/p95 por consulta ('consulta') ou por página ('pagina') das medições em memória"""
+    import pandas as pd
+
+    df = pd.DataFrame(get_registro_desempenho().registros(tipo))
+    if df.empty:
+        return df
+
+    grupos = df.groupby('nome')
+    resumo = pd.DataFrame({
+        'execucoes': grupos.size(),
+        'p50_ms': grupos['duracao_ms'].quantile(0.5),
+        'p95_ms': grupos['duracao_ms'].quantile(0.95),
+        'max_ms': grupos['duracao_ms'].max(),
+    })
+    if tipo == 'consulta':
+        resumo['cache_%'] = grupos['cache'].mean() * 100
+        resumo['linhas_media'] = pd.to_numeric(df['linhas']).groupby(df['nome']).mean()
+    else:
+        # O que não foi consulta ao banco é pandas e montagem dos widgets
+        resumo['consultas_p50_ms'] = grupos['consultas_ms'].quantile(0.5)
+        resumo['demais_p50_ms'] = (df['duracao_ms'] - df['consultas_ms']).groupby(df['nome']).quantile(0.5)
+        resumo['consultas_media'] = grupos['consultas'].mean()
+        resumo['widgets_media'] = pd.to_numeric(df['widgets']).groupby(df['nome']).mean()
+        # Conjuntos de dados carregados por execução (ver ContextoDados em STATUSROTA.py)
+        resumo['carregamentos_media'] = pd.to_numeric(df['carregamentos']).groupby(df['nome']).mean()
+    return resumo.sort_values('p95_ms', ascending=False).reset_index()
+
+def leitura_cacheada(func):
+    """Decorador para funções de leitura; o resultado não deve ser alterado pelo chamador"""
+    @functools.wraps(func)
+    def wrapper(*args):
+        inicio = time.perf_counter()
+        em_cache = True
+
+        def carregar():
+            nonlocal em_cache
+            em_cache = False
+            return func(*args)
+
+        resultado = get_cache_leituras().obter((func.__name__,) + args, carregar)
+        registrar_consulta(func.__name__, inicio, resultado, cache=em_cache)
+        return resultado
+    return wrapper
+
+# Detecção de alterações
+class MonitorAlteracoes:
+    """Acompanha PRAGMA data_version em uma conexão dedicada que nunca escreve.
+
+    O valor muda a cada commit feito por qualquer outra conexão (do pool ou de
+    outro processo) e a consulta não lê nenhuma página do banco.
+    """
+
+    def __init__(self, caminho):
+        self._conn = sqlite3.connect(caminho, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        # Referência lida já na criação: um commit anterior à primeira consulta também conta como mudança
+        self._ultima = self._conn.execute('PRAGMA data_version').fetchone()[0]
+
+    def versao(self):
+        """Retorna (versão atual, se mudou desde a consulta anterior)"""
+        with self._lock:
+            versao = self._conn.execute('PRAGMA data_version').fetchone()[0]
+            mudou = versao != self._ultima
+            self._ultima = versao
+        return versao, mudou
+
+def get_monitor_alteracoes():
+    # Criado por get_pool(), depois que o banco já existe e está no esquema atual
+    get_pool()
+    return _monitor
+
+def versao_banco():
+    """Valor que muda sempre que algum dado do banco é alterado.
+
+    Também invalida o cache de leituras quando houve commit desde a consulta anterior; quem
+    mantém leituras em cache por muito tempo (interface, API) deve chamá-la a cada execução.
+    """
+    versao, mudou = get_monitor_alteracoes().versao()
+    if mudou:
+        # A escrita pode ter vindo de outro processo, sem passar por transacao()
+        get_cache_leituras().invalidar()
+    return versao
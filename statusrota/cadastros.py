@@ -0,0 +1,384 @@
+"""POPs, cidades e rotas: cadastro, consultas e busca de texto completo"""
+import re
+import sqlite3
+
+from .banco import conexao, consultar_registros, instrumentada, leitura_cacheada, transacao
+from .codigos import categorizar_status
+from .config import BUSCA_MAX_RESULTADOS, ROTAS_POR_PAGINA
+
+# Funções para operações no banco de dados - POPs
+@instrumentada
+def add_pop(nome_pop, localizacao, capacidade, latitude=None, longitude=None):
+    with transacao() as conn:
+        conn.execute('INSERT INTO pops (nome_pop, localizacao, capacidade, latitude, longitude) VALUES (?, ?, ?, ?, ?)',
+                     (nome_pop, localizacao, capacidade, latitude, longitude))
+
+# quantidade_rotas conta só as rotas ativas, como as listas de rotas e contar_rotas_by_pop:
+# o total dos contadores (que inclui as arquivadas) menos as arquivadas
+SQL_POPS = '''
+    SELECT p.*, COALESCE(e.quantidade_total, 0) - COALESCE(a.quantidade, 0) as quantidade_rotas, 
+           COALESCE(a.quantidade, 0) as rotas_arquivadas 
+    FROM pops p 
+    LEFT JOIN (
+        SELECT pop_id, SUM(quantidade) as quantidade_total 
+        FROM estatisticas_status 
+        WHERE tipo = 'lancamento' 
+        GROUP BY pop_id
+    ) e ON p.id = e.pop_id
+    LEFT JOIN estatisticas_arquivo a ON p.id = a.pop_id
+'''
+
+@leitura_cacheada
+def get_all_pops():
+    import pandas as pd
+
+    with conexao() as conn:
+        return pd.read_sql(SQL_POPS, conn)
+
+@leitura_cacheada
+def listar_pops_detalhados():
+    """Mesmas colunas de get_all_pops (com quantidade_rotas e rotas_arquivadas), como registros"""
+    return consultar_registros(SQL_POPS + 'ORDER BY p.id')
+
+@leitura_cacheada
+def listar_pops():
+    """Id e nome de cada POP, como registros (para listas de opções)"""
+    return consultar_registros('SELECT id, nome_pop FROM pops ORDER BY id')
+
+@instrumentada
+def delete_pop(pop_id):
+    # As cidades e rotas do POP são excluídas em cascata (ON DELETE CASCADE)
+    with transacao() as conn:
+        conn.execute('DELETE FROM pops WHERE id = ?', (pop_id,))
+
+@instrumentada
+def excluir_pops(pop_ids):
+    """Exclui vários POPs, com suas cidades e rotas, em uma única instrução; retorna quantos foram excluídos"""
+    with transacao() as conn:
+        return conn.execute(f'DELETE FROM pops WHERE id IN ({",".join("?" * len(pop_ids))})', pop_ids).rowcount
+
+# Funções para operações no banco de dados - Cidades
+@instrumentada
+def add_cidade(nome_cidade, pop_id):
+    with transacao() as conn:
+        conn.execute('INSERT INTO cidades (nome_cidade, pop_id) VALUES (?, ?)',
+                     (nome_cidade, pop_id))
+
+@leitura_cacheada
+def get_cidades_by_pop(pop_id):
+    import pandas as pd
+
+    with conexao() as conn:
+        return pd.read_sql('SELECT * FROM cidades WHERE pop_id = ? ORDER BY nome_cidade', conn, params=(pop_id,))
+
+@leitura_cacheada
+def listar_cidades_by_pop(pop_id):
+    """Id e nome das cidades do POP, como registros"""
+    return consultar_registros('SELECT id, nome_cidade FROM cidades WHERE pop_id = ? ORDER BY nome_cidade', (pop_id,))
+
+@leitura_cacheada
+def get_all_cidades():
+    import pandas as pd
+
+    with conexao() as conn:
+        return pd.read_sql('''
+            SELECT c.*, p.nome_pop 
+            FROM cidades c 
+            LEFT JOIN pops p ON c.pop_id = p.id 
+            ORDER BY p.nome_pop, c.nome_cidade
+        ''', conn)
+
+@leitura_cacheada
+def listar_cidades():
+    """Id e nome de cada cidade com o id e o nome do seu POP, como registros"""
+    return consultar_registros('''
+        SELECT c.id, c.nome_cidade, c.pop_id, p.nome_pop 
+        FROM cidades c 
+        LEFT JOIN pops p ON c.pop_id = p.id 
+        ORDER BY p.nome_pop, c.nome_cidade
+    ''')
+
+def _excluir_cidades(conn, cidade_ids):
+    marcadores = ",".join("?" * len(cidade_ids))
+    try:
+        conn.execute(f'DELETE FROM cidades WHERE id IN ({marcadores})', cidade_ids)
+    except sqlite3.IntegrityError:
+        # A chave estrangeira de rotas.cidade_id (ou de rotas_arquivo) impede a exclusão; nada foi excluído
+        count_rotas = conn.execute(f'''
+            SELECT (SELECT COUNT(*) FROM rotas WHERE cidade_id IN ({marcadores}))
+                 + (SELECT COUNT(*) FROM rotas_arquivo WHERE cidade_id IN ({marcadores}))
+        ''', cidade_ids * 2).fetchone()[0]
+        return False, count_rotas
+    return True, 0
+
+@instrumentada
+def delete_cidade(cidade_id):
+    with transacao() as conn:
+        sucesso, count_rotas = _excluir_cidades(conn, [cidade_id])
+    if not sucesso:
+        return False, f"Não é possível excluir a cidade pois existem {count_rotas} rota(s) vinculada(s) a ela."
+    return True, "Cidade excluída com sucesso!"
+
+@instrumentada
+def excluir_cidades(cidade_ids):
+    """Exclui várias cidades de uma vez; se alguma tiver rotas, nenhuma é excluída"""
+    with transacao() as conn:
+        sucesso, count_rotas = _excluir_cidades(conn, cidade_ids)
+    if not sucesso:
+        return False, f"Não é possível excluir as cidades pois existem {count_rotas} rota(s) vinculada(s) a elas."
+    return True, f"{len(cidade_ids)} cidade(s) excluída(s) com sucesso!"
+
+@instrumentada
+def mover_cidades(cidade_ids, pop_id, usuario=None):
+    """Transfere várias cidades, com todas as suas rotas, para outro POP.
+
+    Retorna (cidades movidas, rotas movidas).
+    """
+    marcadores = ",".join("?" * len(cidade_ids))
+    with transacao() as conn:
+        cidades = conn.execute(f'UPDATE cidades SET pop_id = ? WHERE id IN ({marcadores})',
+                               [pop_id, *cidade_ids]).rowcount
+        # As estatísticas e o histórico acompanham a troca de POP pelos triggers de rotas
+        rotas = conn.execute(f'''
+            UPDATE rotas 
+            SET pop_id = ?, data_atualizacao = strftime('%Y-%m-%d %H:%M:%f', 'now'), 
+                usuario_atualizacao = ?, versao = versao + 1
+            WHERE cidade_id IN ({marcadores}) AND pop_id IS NOT ?
+        ''', [pop_id, usuario, *cidade_ids, pop_id]).rowcount
+        # As rotas arquivadas dessas cidades acompanham a cidade (e seus contadores nas estatísticas)
+        conn.execute(f'UPDATE rotas_arquivo SET pop_id = ? WHERE cidade_id IN ({marcadores}) AND pop_id IS NOT ?',
+                     [pop_id, *cidade_ids, pop_id])
+    return cidades, rotas
+
+# Funções para operações no banco de dados - Rotas
+@instrumentada
+def add_rota(pop_id, cidade_id, nome_rota):
+    with transacao() as conn:
+        conn.execute('INSERT INTO rotas (pop_id, cidade_id, nome_rota) VALUES (?, ?, ?)',
+                     (pop_id, cidade_id, nome_rota))
+
+SQL_ROTAS_POP = '''
+    SELECT r.*, c.nome_cidade, p.nome_pop 
+    FROM rotas r 
+    LEFT JOIN cidades c ON r.cidade_id = c.id 
+    LEFT JOIN pops p ON r.pop_id = p.id 
+    WHERE r.pop_id = ? 
+'''
+
+@leitura_cacheada
+def get_rotas_by_pop(pop_id):
+    import pandas as pd
+
+    with conexao() as conn:
+        return categorizar_status(pd.read_sql(SQL_ROTAS_POP + 'ORDER BY r.data_criacao ASC, r.id ASC', conn, params=(pop_id,)))
+
+@leitura_cacheada
+def listar_rotas_by_pop(pop_id):
+    """Todas as rotas do POP como registros sqlite3.Row, na ordem da listagem"""
+    return consultar_registros(SQL_ROTAS_POP + 'ORDER BY r.data_criacao ASC, r.id ASC', (pop_id,))
+
+@leitura_cacheada
+def contar_rotas_by_pop(pop_id):
+    with conexao() as conn:
+        return conn.execute('SELECT COUNT(*) FROM rotas WHERE pop_id = ?', (pop_id,)).fetchone()[0]
+
+@leitura_cacheada
+def get_assinatura_rotas_pop(pop_id):
+    """Última atualização e quantidade de rotas do POP; mudam sempre que as rotas mudam"""
+    with conexao() as conn:
+        return conn.execute('SELECT MAX(data_atualizacao), COUNT(*) FROM rotas WHERE pop_id = ?', (pop_id,)).fetchone()
+
+def _consulta_pagina_rotas(pop_id, limite, apos, antes):
+    sql = SQL_ROTAS_POP
+    params = [pop_id]
+    if antes is not None:
+        # Voltando: percorre o índice em ordem inversa e desinverte o resultado
+        sql += 'AND (r.data_criacao, r.id) < (?, ?) ORDER BY r.data_criacao DESC, r.id DESC LIMIT ?'
+        params += [*antes, limite]
+    else:
+        if apos is not None:
+            sql += 'AND (r.data_criacao, r.id) > (?, ?) '
+            params += list(apos)
+        sql += 'ORDER BY r.data_criacao ASC, r.id ASC LIMIT ?'
+        params.append(limite)
+    return sql, params
+
+@leitura_cacheada
+def get_pagina_rotas_by_pop(pop_id, limite=ROTAS_POR_PAGINA, apos=None, antes=None):
+    """Busca uma página de rotas do POP por keyset em (data_criacao, id).
+
+    apos/antes são o cursor (data_criacao, id) da última rota da página anterior
+    ou da primeira rota da página seguinte; sem cursor retorna a primeira página.
+    """
+    import pandas as pd
+
+    sql, params = _consulta_pagina_rotas(pop_id, limite, apos, antes)
+    with conexao() as conn:
+        df = pd.read_sql(sql, conn, params=params)
+    if antes is not None:
+        df = df.iloc[::-1].reset_index(drop=True)
+    return categorizar_status(df)
+
+@leitura_cacheada
+def listar_pagina_rotas_by_pop(pop_id, limite=ROTAS_POR_PAGINA, apos=None, antes=None):
+    """Mesma página de get_pagina_rotas_by_pop, como lista de registros sqlite3.Row"""
+    registros = consultar_registros(*_consulta_pagina_rotas(pop_id, limite, apos, antes))
+    return registros[::-1] if antes is not None else registros
+
+@instrumentada
+def get_posicao_rota(rota_id):
+    """Quantas rotas vêm antes desta na listagem do seu POP e o cursor da imediatamente anterior"""
+    with conexao() as conn:
+        anterior = conn.execute('''
+            SELECT a.data_criacao, a.id 
+            FROM rotas r 
+            JOIN rotas a ON a.pop_id = r.pop_id AND (a.data_criacao, a.id) < (r.data_criacao, r.id) 
+            WHERE r.id = ? 
+            ORDER BY a.data_criacao DESC, a.id DESC 
+            LIMIT 1
+        ''', (rota_id,)).fetchone()
+        if anterior is None:
+            return 0, None
+        quantidade = conn.execute('''
+            SELECT COUNT(*) 
+            FROM rotas r 
+            JOIN rotas a ON a.pop_id = r.pop_id AND (a.data_criacao, a.id) < (r.data_criacao, r.id) 
+            WHERE r.id = ?
+        ''', (rota_id,)).fetchone()[0]
+    return quantidade, tuple(anterior)
+
+@leitura_cacheada
+def get_rotas_by_cidade(cidade_id):
+    import pandas as pd
+
+    with conexao() as conn:
+        return categorizar_status(pd.read_sql('''
+            SELECT r.*, c.nome_cidade, p.nome_pop 
+            FROM rotas r 
+            LEFT JOIN cidades c ON r.cidade_id = c.id 
+            LEFT JOIN pops p ON r.pop_id = p.id 
+            WHERE r.cidade_id = ? 
+            ORDER BY r.data_criacao ASC, r.id ASC
+        ''', conn, params=(cidade_id,)))
+
+@instrumentada
+def get_rota(rota_id):
+    """Lê a rota diretamente do banco (sem cache), ou None se não existir mais"""
+    with conexao() as conn:
+        cursor = conn.execute('''
+            SELECT r.*, c.nome_cidade, p.nome_pop 
+            FROM rotas r 
+            LEFT JOIN cidades c ON r.cidade_id = c.id 
+            LEFT JOIN pops p ON r.pop_id = p.id 
+            WHERE r.id = ?
+        ''', (rota_id,))
+        linha = cursor.fetchone()
+    if linha is None:
+        return None
+    return dict(zip([descricao[0] for descricao in cursor.description], linha))
+
+@instrumentada
+def update_status_rota(rota_id, status_lancamento, status_fusao, observacoes_lancamento=None, observacoes_fusao=None, status_alimentacao=None, usuario=None, versao=None):
+    """Atualiza o status da rota (status como códigos, ver codigos.py).
+
+    Com versao informada a gravação é condicional (compare-and-swap): só acontece se
+    ninguém alterou a rota desde que ela foi lida. Retorna False em caso de conflito.
+    """
+    sql = '''
+        UPDATE rotas 
+        SET status_lancamento = ?, status_fusao = ?, observacoes_lancamento = ?, 
+            observacoes_fusao = ?, status_alimentacao = ?, 
+            data_atualizacao = strftime('%Y-%m-%d %H:%M:%f', 'now'), usuario_atualizacao = ?, 
+            versao = versao + 1
+        WHERE id = ?
+    '''
+    params = [status_lancamento, status_fusao, observacoes_lancamento, observacoes_fusao, status_alimentacao, usuario, rota_id]
+    if versao is not None:
+        sql += 'AND versao = ?'
+        params.append(versao)
+    with transacao() as conn:
+        return conn.execute(sql, params).rowcount > 0
+
+@instrumentada
+def update_status_rotas_em_lote(alteracoes, usuario=None):
+    """Aplica várias atualizações de status em uma única transação.
+
+    alteracoes: lista de dicts com 'id', 'versao' lida e os campos de status (códigos)/observações.
+    Rotas alteradas por outra pessoa desde a leitura não são gravadas.
+    Retorna (quantidade atualizada, lista de ids em conflito).
+    """
+    with transacao() as conn:
+        # Com o lock de escrita já obtido (BEGIN IMMEDIATE), as versões lidas aqui
+        # não mudam até o fim da transação
+        ids = [a['id'] for a in alteracoes]
+        versoes = dict(conn.execute(
+            f'SELECT id, versao FROM rotas WHERE id IN ({",".join("?" * len(ids))})', ids
+        ).fetchall())
+        aplicaveis = [a for a in alteracoes if versoes.get(a['id']) == a['versao']]
+        conflitos = [a['id'] for a in alteracoes if versoes.get(a['id']) != a['versao']]
+
+        conn.executemany('''
+            UPDATE rotas 
+            SET status_lancamento = ?, status_fusao = ?, observacoes_lancamento = ?, 
+                observacoes_fusao = ?, status_alimentacao = ?, 
+                data_atualizacao = strftime('%Y-%m-%d %H:%M:%f', 'now'), usuario_atualizacao = ?, 
+                versao = versao + 1
+            WHERE id = ? AND versao = ?
+        ''', [(a['status_lancamento'], a['status_fusao'], a['observacoes_lancamento'],
+               a['observacoes_fusao'], a['status_alimentacao'], usuario, a['id'], a['versao'])
+              for a in aplicaveis])
+    return len(aplicaveis), conflitos
+
+@instrumentada
+def delete_rota(rota_id):
+    with transacao() as conn:
+        conn.execute('DELETE FROM rotas WHERE id = ?', (rota_id,))
+
+@instrumentada
+def excluir_rotas(rota_ids):
+    """Exclui várias rotas em uma única instrução; retorna quantas foram excluídas"""
+    with transacao() as conn:
+        return conn.execute(f'DELETE FROM rotas WHERE id IN ({",".join("?" * len(rota_ids))})', rota_ids).rowcount
+
+@instrumentada
+def mover_rotas(rota_ids, cidade_id, usuario=None):
+    """Transfere várias rotas para outra cidade (e para o POP dela); retorna quantas foram movidas"""
+    with transacao() as conn:
+        cidade = conn.execute('SELECT pop_id FROM cidades WHERE id = ?', (cidade_id,)).fetchone()
+        if cidade is None:
+            raise ValueError(f"A cidade de destino não existe (id: {cidade_id}).")
+        return conn.execute(f'''
+            UPDATE rotas 
+            SET cidade_id = ?, pop_id = ?, 
+                data_atualizacao = strftime('%Y-%m-%d %H:%M:%f', 'now'), usuario_atualizacao = ?, 
+                versao = versao + 1
+            WHERE id IN ({",".join("?" * len(rota_ids))}) AND cidade_id IS NOT ?
+        ''', [cidade_id, cidade[0], usuario, *rota_ids, cidade_id]).rowcount
+
+# Busca de texto completo (índice busca_rotas)
+# Pesos do bm25 por coluna: acertos no nome da rota valem mais que nas observações
+PESOS_BUSCA = [10.0, 5.0, 1.0, 1.0]
+
+def consulta_busca(termo):
+    """Converte o texto digitado em uma consulta FTS5 (todas as palavras, por prefixo)"""
+    # Cada palavra vai entre aspas: o texto do usuário nunca é interpretado como sintaxe FTS5
+    return ' '.join(f'"{palavra}"*' for palavra in re.findall(r'\w+', termo))
+
+@leitura_cacheada
+def buscar_rotas(termo, limite=BUSCA_MAX_RESULTADOS):
+    """Rotas de todos os POPs que contêm o termo, das mais relevantes para as menos (registros sqlite3.Row)"""
+    consulta = consulta_busca(termo)
+    if not consulta:
+        return []
+    return consultar_registros(f'''
+        SELECT r.id, r.pop_id, r.nome_rota, c.nome_cidade, p.nome_pop, 
+               r.status_lancamento, r.status_fusao, r.status_alimentacao, 
+               snippet(busca_rotas, -1, '**', '**', '…', 12) as trecho 
+        FROM busca_rotas b 
+        JOIN rotas r ON r.id = b.rowid 
+        LEFT JOIN cidades c ON r.cidade_id = c.id 
+        LEFT JOIN pops p ON r.pop_id = p.id 
+        WHERE busca_rotas MATCH ? 
+        ORDER BY bm25(busca_rotas, {', '.join(map(str, PESOS_BUSCA))}) 
+        LIMIT ?
+    ''', (consulta, limite))
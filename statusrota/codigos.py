@@ -0,0 +1,58 @@
+"""Códigos dos status das rotas: o banco guarda inteiros, a interface mostra os rótulos.
+
+O código de cada status é a sua posição em OPCOES_STATUS / OPCOES_ALIMENTACAO
+(tabelas opcoes_status e opcoes_alimentacao no banco).
+"""
+from .config import OPCOES_ALIMENTACAO, OPCOES_STATUS
+
+CODIGOS_STATUS = {rotulo: codigo for codigo, rotulo in enumerate(OPCOES_STATUS)}
+CODIGOS_ALIMENTACAO = {rotulo: codigo for codigo, rotulo in enumerate(OPCOES_ALIMENTACAO)}
+
+# Usados nas consultas SQL sobre os status
+STATUS_PENDENTE = CODIGOS_STATUS["PENDENTE"]
+STATUS_EM_ANDAMENTO = CODIGOS_STATUS["EM ANDAMENTO"]
+STATUS_FINALIZADA = CODIGOS_STATUS["FINALIZADA"]
+
+# Coluna de rotas -> rótulos, na ordem dos códigos
+COLUNAS_CODIFICADAS = {
+    'status_lancamento': OPCOES_STATUS,
+    'status_fusao': OPCOES_STATUS,
+    'status_alimentacao': OPCOES_ALIMENTACAO,
+}
+
+def rotulo_status(coluna, codigo):
+    """Rótulo do código de uma coluna de status (None continua None)"""
+    return None if codigo is None else COLUNAS_CODIFICADAS[coluna][codigo]
+
+def codigo_status(coluna, valor):
+    """Código do rótulo de uma coluna de status; ValueError para rótulos desconhecidos"""
+    if valor is None or valor == '':
+        return None
+    try:
+        return COLUNAS_CODIFICADAS[coluna].index(valor)
+    except ValueError:
+        raise ValueError(f"{coluna} inválido: {valor!r}") from None
+
+def registro_com_rotulos(rota):
+    """Cópia da rota (registro ou dict) em dict, com os rótulos no lugar dos códigos"""
+    rota = dict(rota)
+    for coluna in COLUNAS_CODIFICADAS.keys() & rota.keys():
+        rota[coluna] = rotulo_status(coluna, rota[coluna])
+    return rota
+
+def categorizar_status(df):
+    """Troca os códigos das colunas de status do DataFrame por categóricos com os rótulos"""
+    import pandas as pd
+
+    for coluna in COLUNAS_CODIFICADAS.keys() & set(df.columns):
+        codigos = pd.to_numeric(df[coluna]).fillna(-1).astype(int)
+        df[coluna] = pd.Categorical.from_codes(codigos, categories=COLUNAS_CODIFICADAS[coluna])
+    return df
+
+def codificar_status(df):
+    """Operação inversa de categorizar_status: rótulos (texto ou categóricos) -> códigos ou None"""
+    for coluna in COLUNAS_CODIFICADAS.keys() & set(df.columns):
+        mapa = {rotulo: codigo for codigo, rotulo in enumerate(COLUNAS_CODIFICADAS[coluna])}
+        codigos = df[coluna].astype(object).map(mapa)
+        df[coluna] = codigos.astype('Int64').astype(object).where(codigos.notna(), None)
+    return df
@@ -0,0 +1,61 @@
+"""Constantes de configuração da camada de dados"""
+
+# Banco de dados (caminho padrão; ver banco.configurar)
+DB_PATH = 'pops_rotas.db'
+POOL_TAMANHO = 10
+BUSY_TIMEOUT_MS = 5000
+CACHE_PAGINAS_KB = 20000
+CACHE_LEITURAS_MAX_ITENS = 256
+CACHE_RELATORIOS_MAX_ITENS = 64
+CACHE_SESSOES_MAX_ITENS = 1024
+SESSAO_DURACAO_HORAS = 12
+BUSCA_MAX_RESULTADOS = 50
+DESEMPENHO_MAX_REGISTROS = 5000
+DESEMPENHO_ARQUIVO_LOG = None  # ex.: 'desempenho.jsonl' para gravar também cada medição em JSON Lines
+
+# Opções de status das rotas; o banco guarda a posição de cada opção (ver codigos.py),
+# então a ordem não pode mudar e novas opções exigem uma migração
+OPCOES_STATUS = ["PENDENTE", "EM ANDAMENTO", "FINALIZADA"]
+OPCOES_ALIMENTACAO = ["ALIMENTADA", "EM PRODUÇÃO", "SEM SINAL PARCIAL", "SEM SINAL TOTAL"]
+
+# Exportação de relatórios
+EXPORTACAO_TAMANHO_LOTE = 1000
+FORMATOS_EXPORTACAO = {
+    # formato: (descrição, extensão, tipo MIME)
+    'texto': ("Texto (relatório copiável)", 'txt', 'text/plain'),
+    'csv': ("CSV", 'csv', 'text/csv'),
+    'jsonl': ("JSON Lines", 'jsonl', 'application/x-ndjson'),
+}
+
+# Importação em lote
+COLUNAS_IMPORTACAO = ['nome_pop', 'localizacao', 'capacidade', 'nome_cidade', 'nome_rota',
+                      'status_lancamento', 'status_fusao', 'status_alimentacao',
+                      'observacoes_lancamento', 'observacoes_fusao']
+COLUNAS_STATUS_ROTA = ['status_lancamento', 'status_fusao', 'status_alimentacao',
+                       'observacoes_lancamento', 'observacoes_fusao']
+
+# Paginação das listas de rotas
+ROTAS_POR_PAGINA = 25
+
+# API HTTP somente leitura (ver api.py)
+API_HOST = '127.0.0.1'
+API_PORTA = 8502
+API_MAX_LIMITE = 500
+API_GZIP_MIN_BYTES = 1024
+
+# Backups (ver backups.py)
+BACKUP_DIRETORIO = 'backups'
+BACKUP_MANTER = 14
+BACKUP_INTERVALO_HORAS = 6
+# Cópia em passos de N páginas com uma pausa entre eles, para não disputar disco com a aplicação
+BACKUP_PAGINAS_POR_PASSO = 256
+BACKUP_PAUSA_SEGUNDOS = 0.02
+
+# Arquivamento de rotas finalizadas (ver arquivo.py)
+ARQUIVO_IDADE_DIAS = 90
+ARQUIVO_TAMANHO_LOTE = 500
+
+# Coordenadas e buscas espaciais dos POPs (ver geo.py)
+GEO_RAIO_PADRAO_KM = 30
+# Raio da primeira busca de pops_mais_proximos; dobra até encontrar a quantidade pedida
+GEO_RAIO_INICIAL_KM = 10
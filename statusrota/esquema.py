@@ -0,0 +1,669 @@
+"""Esquema do banco: tabelas, migrações e triggers das tabelas derivadas"""
+from .banco import transacao
+from .codigos import COLUNAS_CODIFICADAS, STATUS_FINALIZADA, STATUS_PENDENTE
+from .config import OPCOES_ALIMENTACAO, OPCOES_STATUS
+from .geo import extrair_coordenadas
+from .usuarios import hash_password
+
+# Inicialização do banco de dados
+def init_db(c):
+    """Cria as tabelas que faltarem e aplica as migrações pendentes (idempotente).
+
+    Chamada uma única vez por processo, dentro da transação aberta por banco.get_pool().
+    """
+    # Tabela de Usuários
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS usuarios (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            nome_completo TEXT NOT NULL,
+            matricula TEXT UNIQUE NOT NULL,
+            permissao TEXT DEFAULT 'USER',
+            data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            ativo INTEGER DEFAULT 1
+        )
+    ''')
+    
+    # Tabela de POPs
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS pops (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nome_pop TEXT NOT NULL,
+            localizacao TEXT,
+            capacidade INTEGER,
+            data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    # Tabela de Cidades
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS cidades (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nome_cidade TEXT NOT NULL,
+            pop_id INTEGER,
+            data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (pop_id) REFERENCES pops (id)
+        )
+    ''')
+    
+    # Tabela de Rotas
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS rotas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            pop_id INTEGER,
+            cidade_id INTEGER,
+            nome_rota TEXT NOT NULL,
+            status_lancamento TEXT DEFAULT 'PENDENTE',
+            status_fusao TEXT DEFAULT 'PENDENTE',
+            observacoes_lancamento TEXT,
+            observacoes_fusao TEXT,
+            status_alimentacao TEXT,
+            data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            data_atualizacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            usuario_atualizacao TEXT,
+            FOREIGN KEY (pop_id) REFERENCES pops (id),
+            FOREIGN KEY (cidade_id) REFERENCES cidades (id)
+        )
+    ''')
+    
+    # Criar usuário admin padrão se não existir
+    c.execute('''
+        INSERT OR IGNORE INTO usuarios (username, password_hash, nome_completo, matricula, permissao)
+        VALUES (?, ?, ?, ?, ?)
+    ''', ('admin', hash_password('admin123'), 'Administrador do Sistema', '000000', 'ADMIN'))
+
+    aplicar_migracoes(c)
+
+# Migrações de esquema
+# Cada migração recebe a conexão (já dentro da transação de init_db) e é aplicada
+# uma única vez; a versão aplicada fica gravada em PRAGMA user_version.
+# Novas migrações devem ser sempre adicionadas ao FINAL da lista MIGRACOES.
+def _migracao_indices_chaves(c):
+    # Listagem ordenada de rotas por POP/cidade e contagens do LEFT JOIN de get_all_pops
+    c.execute('CREATE INDEX IF NOT EXISTS idx_rotas_pop_criacao ON rotas (pop_id, data_criacao, id)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_rotas_cidade_criacao ON rotas (cidade_id, data_criacao, id)')
+    # get_cidades_by_pop filtra por POP e ordena por nome
+    c.execute('CREATE INDEX IF NOT EXISTS idx_cidades_pop_nome ON cidades (pop_id, nome_cidade)')
+    c.execute('ANALYZE')
+
+def _migracao_indice_atualizacao(c):
+    # MAX(data_atualizacao) por POP (assinatura do relatório) sem varrer as rotas
+    c.execute('CREATE INDEX IF NOT EXISTS idx_rotas_pop_atualizacao ON rotas (pop_id, data_atualizacao)')
+
+def _migracao_estatisticas_status(c):
+    # Contadores por POP, tipo de status e status, mantidos por triggers em rotas.
+    # status NULL é guardado como '' para poder fazer parte da chave primária.
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS estatisticas_status (
+            pop_id INTEGER NOT NULL,
+            tipo TEXT NOT NULL,
+            status TEXT NOT NULL,
+            quantidade INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (pop_id, tipo, status)
+        ) WITHOUT ROWID
+    ''')
+    criar_triggers_estatisticas(c)
+    reconstruir_estatisticas(c)
+
+def _migracao_rota_eventos(c):
+    # Histórico append-only das rotas: criação, mudanças de status e exclusão.
+    # Cada evento guarda o status novo e o anterior (NULL na criação/exclusão).
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS rota_eventos (
+            id INTEGER PRIMARY KEY,
+            rota_id INTEGER NOT NULL,
+            pop_id INTEGER,
+            ts TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now')),
+            tipo TEXT NOT NULL,
+            usuario TEXT,
+            status_lancamento TEXT,
+            status_fusao TEXT,
+            status_alimentacao TEXT,
+            status_lancamento_anterior TEXT,
+            status_fusao_anterior TEXT,
+            status_alimentacao_anterior TEXT
+        )
+    ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_rota_eventos_rota_ts ON rota_eventos (rota_id, ts)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_rota_eventos_ts ON rota_eventos (ts)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_rota_eventos_pop_ts ON rota_eventos (pop_id, ts)')
+    criar_triggers_eventos(c)
+
+def _migracao_sessoes(c):
+    # Sessões de login persistidas: só o hash do token é gravado
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS sessoes (
+            token_hash TEXT PRIMARY KEY,
+            usuario_id INTEGER NOT NULL REFERENCES usuarios (id),
+            data_criacao TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now')),
+            expira_em TEXT NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_sessoes_expira_em ON sessoes (expira_em)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_sessoes_usuario ON sessoes (usuario_id)')
+
+def _migracao_versao_rotas(c):
+    # Versão da linha para controle de concorrência otimista nas atualizações de rotas
+    c.execute('ALTER TABLE rotas ADD COLUMN versao INTEGER NOT NULL DEFAULT 0')
+
+def _migracao_busca_rotas(c):
+    # Índice de texto completo das rotas (rowid = rotas.id). O nome da cidade é
+    # copiado para o índice e mantido pelos triggers de rotas e cidades.
+    c.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS busca_rotas USING fts5 (
+            nome_rota, nome_cidade, observacoes_lancamento, observacoes_fusao,
+            tokenize = 'unicode61 remove_diacritics 2'
+        )
+    ''')
+    criar_triggers_busca(c)
+    reconstruir_busca(c)
+
+def _copiar_tabela(c, tabela, criar_sql, select_sql):
+    """Primeira metade de _recriar_tabela: cria {tabela}_nova com as linhas da atual.
+
+    Retorna o que _substituir_tabela precisa restaurar depois da troca.
+    """
+    indices = [sql for (sql,) in c.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL", (tabela,)
+    )]
+    sequencia = None
+    if c.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_sequence'").fetchone():
+        sequencia = c.execute('SELECT seq FROM sqlite_sequence WHERE name = ?', (tabela,)).fetchone()
+
+    c.execute(criar_sql.format(tabela=f'{tabela}_nova'))
+    c.execute(f'INSERT INTO {tabela}_nova {select_sql}')
+    return indices, sequencia
+
+def _substituir_tabela(c, tabela, copia):
+    """Segunda metade de _recriar_tabela: troca a tabela pela cópia e restaura índices e sequência"""
+    indices, sequencia = copia
+    c.execute(f'DROP TABLE {tabela}')
+    c.execute(f'ALTER TABLE {tabela}_nova RENAME TO {tabela}')
+
+    for sql in indices:
+        c.execute(sql)
+    if sequencia is not None:
+        # AUTOINCREMENT: ids de linhas já excluídas continuam sem ser reutilizados
+        c.execute('UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = ?', (sequencia[0], tabela))
+
+def _recriar_tabela(c, tabela, criar_sql, select_sql):
+    """Recria a tabela com outra definição copiando as linhas (o SQLite não altera
+    o tipo nem as restrições de uma coluna existente).
+
+    criar_sql: CREATE TABLE com {tabela} no lugar do nome; select_sql: SELECT sobre a
+    tabela antiga com as colunas da nova, na mesma ordem. Os índices são recriados
+    aqui; os triggers que envolvem a tabela ficam a cargo de quem chama.
+    Só serve para tabelas que não são referenciadas por chaves estrangeiras.
+    """
+    _substituir_tabela(c, tabela, _copiar_tabela(c, tabela, criar_sql, select_sql))
+
+def _sql_codigo(coluna):
+    # Texto livre antigo -> código; valores fora das opções ficam NULL
+    tabela = 'opcoes_alimentacao' if 'status_alimentacao' in coluna else 'opcoes_status'
+    return f"(SELECT codigo FROM {tabela} WHERE nome = UPPER(TRIM({coluna})))"
+
+def _restricao_codigo(coluna, opcoes):
+    # O CHECK vale até em conexões sem PRAGMA foreign_keys (ex.: o cliente sqlite3)
+    return f"CHECK ({coluna} BETWEEN 0 AND {len(opcoes) - 1})"
+
+def _migracao_status_codificado(c):
+    # Status das rotas, do histórico e das estatísticas como códigos inteiros,
+    # tendo as tabelas de opções como referência (código = posição em OPCOES_*)
+    for tabela, opcoes in (('opcoes_status', OPCOES_STATUS), ('opcoes_alimentacao', OPCOES_ALIMENTACAO)):
+        c.execute(f'''
+            CREATE TABLE IF NOT EXISTS {tabela} (
+                codigo INTEGER PRIMARY KEY,
+                nome TEXT NOT NULL UNIQUE
+            )
+        ''')
+        c.executemany(f'INSERT OR IGNORE INTO {tabela} (codigo, nome) VALUES (?, ?)', list(enumerate(opcoes)))
+
+    # Este trigger de cidades referencia rotas e impediria a troca das tabelas; é recriado no final
+    c.execute('DROP TRIGGER IF EXISTS trg_cidades_busca_update')
+    _recriar_tabela(c, 'rotas', f'''
+        CREATE TABLE {{tabela}} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            pop_id INTEGER,
+            cidade_id INTEGER,
+            nome_rota TEXT NOT NULL,
+            status_lancamento INTEGER NOT NULL DEFAULT {STATUS_PENDENTE} REFERENCES opcoes_status (codigo),
+            status_fusao INTEGER NOT NULL DEFAULT {STATUS_PENDENTE} REFERENCES opcoes_status (codigo),
+            observacoes_lancamento TEXT,
+            observacoes_fusao TEXT,
+            status_alimentacao INTEGER REFERENCES opcoes_alimentacao (codigo),
+            data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            data_atualizacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            usuario_atualizacao TEXT,
+            versao INTEGER NOT NULL DEFAULT 0,
+            FOREIGN KEY (pop_id) REFERENCES pops (id),
+            FOREIGN KEY (cidade_id) REFERENCES cidades (id),
+            {_restricao_codigo('status_lancamento', OPCOES_STATUS)},
+            {_restricao_codigo('status_fusao', OPCOES_STATUS)},
+            {_restricao_codigo('status_alimentacao', OPCOES_ALIMENTACAO)}
+        )
+    ''', f'''
+        SELECT r.id,
+               -- Referências órfãs (de antes de PRAGMA foreign_keys = ON) não podem impedir a migração
+               (SELECT id FROM pops WHERE id = r.pop_id),
+               (SELECT id FROM cidades WHERE id = r.cidade_id),
+               r.nome_rota,
+               COALESCE({_sql_codigo('r.status_lancamento')}, {STATUS_PENDENTE}),
+               COALESCE({_sql_codigo('r.status_fusao')}, {STATUS_PENDENTE}),
+               r.observacoes_lancamento, r.observacoes_fusao,
+               {_sql_codigo('r.status_alimentacao')},
+               r.data_criacao, r.data_atualizacao, r.usuario_atualizacao, r.versao
+        FROM rotas r
+    ''')
+
+    colunas_eventos = [f'{coluna}{sufixo}' for sufixo in ('', '_anterior') for coluna in COLUNAS_CODIFICADAS]
+    _recriar_tabela(c, 'rota_eventos', f'''
+        CREATE TABLE {{tabela}} (
+            id INTEGER PRIMARY KEY,
+            rota_id INTEGER NOT NULL,
+            pop_id INTEGER,
+            ts TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now')),
+            tipo TEXT NOT NULL,
+            usuario TEXT,
+            {', '.join(f'{coluna} INTEGER' for coluna in colunas_eventos)}
+        )
+    ''', f'''
+        SELECT id, rota_id, pop_id, ts, tipo, usuario, {', '.join(map(_sql_codigo, colunas_eventos))}
+        FROM rota_eventos
+    ''')
+
+    # status -1 = não informado (NULL não pode fazer parte da chave primária)
+    c.execute('DROP TABLE IF EXISTS estatisticas_status')
+    c.execute('''
+        CREATE TABLE estatisticas_status (
+            pop_id INTEGER NOT NULL,
+            tipo TEXT NOT NULL,
+            status INTEGER NOT NULL,
+            quantidade INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (pop_id, tipo, status)
+        ) WITHOUT ROWID
+    ''')
+
+    criar_triggers_estatisticas(c)
+    criar_triggers_eventos(c)
+    criar_triggers_busca(c)
+    reconstruir_estatisticas(c)
+
+def _migracao_exclusao_em_cascata(c):
+    # Excluir um POP exclui suas cidades e rotas; uma cidade com rotas não pode ser excluída.
+    # rotas.cidade_id usa NO ACTION (verificada ao final do comando) e não RESTRICT (verificada
+    # na hora): na cascata de um POP a ordem em que cidades e rotas são apagadas não é garantida.
+    #
+    # cidades é referenciada por rotas, então as duas são trocadas juntas: a nova rotas aponta
+    # para cidades_nova (o RENAME atualiza a referência) e a antiga rotas sai antes da antiga cidades.
+    c.execute('DROP TRIGGER IF EXISTS trg_cidades_busca_update')
+    copia_cidades = _copiar_tabela(c, 'cidades', '''
+        CREATE TABLE {tabela} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nome_cidade TEXT NOT NULL,
+            pop_id INTEGER,
+            data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (pop_id) REFERENCES pops (id) ON DELETE CASCADE
+        )
+    ''', '''
+        SELECT ci.id, ci.nome_cidade, (SELECT id FROM pops WHERE id = ci.pop_id), ci.data_criacao
+        FROM cidades ci
+    ''')
+    copia_rotas = _copiar_tabela(c, 'rotas', f'''
+        CREATE TABLE {{tabela}} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            pop_id INTEGER,
+            cidade_id INTEGER,
+            nome_rota TEXT NOT NULL,
+            status_lancamento INTEGER NOT NULL DEFAULT {STATUS_PENDENTE} REFERENCES opcoes_status (codigo),
+            status_fusao INTEGER NOT NULL DEFAULT {STATUS_PENDENTE} REFERENCES opcoes_status (codigo),
+            observacoes_lancamento TEXT,
+            observacoes_fusao TEXT,
+            status_alimentacao INTEGER REFERENCES opcoes_alimentacao (codigo),
+            data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            data_atualizacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            usuario_atualizacao TEXT,
+            versao INTEGER NOT NULL DEFAULT 0,
+            FOREIGN KEY (pop_id) REFERENCES pops (id) ON DELETE CASCADE,
+            FOREIGN KEY (cidade_id) REFERENCES cidades_nova (id) ON DELETE NO ACTION,
+            {_restricao_codigo('status_lancamento', OPCOES_STATUS)},
+            {_restricao_codigo('status_fusao', OPCOES_STATUS)},
+            {_restricao_codigo('status_alimentacao', OPCOES_ALIMENTACAO)}
+        )
+    ''', 'SELECT * FROM rotas')
+    _substituir_tabela(c, 'rotas', copia_rotas)
+    _substituir_tabela(c, 'cidades', copia_cidades)
+
+    # Os triggers de rotas foram apagados com a tabela antiga
+    criar_triggers_estatisticas(c)
+    criar_triggers_eventos(c)
+    criar_triggers_busca(c)
+
+def _migracao_arquivo_rotas(c):
+    # Rotas finalizadas antigas saem de rotas para rotas_arquivo com o mesmo id (ver arquivo.py).
+    # Continuam contadas em estatisticas_status; a busca e as listagens veem só as rotas ativas.
+    # cidade_id usa NO ACTION pelo mesmo motivo de rotas (ver _migracao_exclusao_em_cascata).
+    c.execute(f'''
+        CREATE TABLE IF NOT EXISTS rotas_arquivo (
+            id INTEGER PRIMARY KEY,
+            pop_id INTEGER,
+            cidade_id INTEGER,
+            nome_rota TEXT NOT NULL,
+            status_lancamento INTEGER NOT NULL REFERENCES opcoes_status (codigo),
+            status_fusao INTEGER NOT NULL REFERENCES opcoes_status (codigo),
+            observacoes_lancamento TEXT,
+            observacoes_fusao TEXT,
+            status_alimentacao INTEGER REFERENCES opcoes_alimentacao (codigo),
+            data_criacao TIMESTAMP,
+            data_atualizacao TIMESTAMP,
+            usuario_atualizacao TEXT,
+            versao INTEGER NOT NULL DEFAULT 0,
+            data_arquivamento TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now')),
+            FOREIGN KEY (pop_id) REFERENCES pops (id) ON DELETE CASCADE,
+            FOREIGN KEY (cidade_id) REFERENCES cidades (id) ON DELETE NO ACTION,
+            {_restricao_codigo('status_lancamento', OPCOES_STATUS)},
+            {_restricao_codigo('status_fusao', OPCOES_STATUS)},
+            {_restricao_codigo('status_alimentacao', OPCOES_ALIMENTACAO)}
+        )
+    ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_rotas_arquivo_pop_criacao ON rotas_arquivo (pop_id, data_criacao, id)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_rotas_arquivo_cidade ON rotas_arquivo (cidade_id)')
+    # Candidatas ao arquivamento: só as rotas finalizadas entram no índice
+    c.execute(f'''
+        CREATE INDEX IF NOT EXISTS idx_rotas_finalizadas_atualizacao ON rotas (data_atualizacao)
+        WHERE status_lancamento = {STATUS_FINALIZADA} AND status_fusao = {STATUS_FINALIZADA}
+    ''')
+    criar_triggers_estatisticas(c)
+    criar_triggers_eventos(c)
+
+def _migracao_coordenadas_pops(c):
+    # Coordenadas dos POPs (graus decimais) e o índice espacial R*Tree pops_geo (id = pops.id),
+    # mantido por triggers. POPs cuja localização já traz as coordenadas no texto
+    # (ex.: "-23.5505, -46.6333") saem preenchidos.
+    c.execute('ALTER TABLE pops ADD COLUMN latitude REAL CHECK (latitude BETWEEN -90 AND 90)')
+    c.execute('ALTER TABLE pops ADD COLUMN longitude REAL CHECK (longitude BETWEEN -180 AND 180)')
+    c.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS pops_geo USING rtree (
+            id, latitude_min, latitude_max, longitude_min, longitude_max
+        )
+    ''')
+    criar_triggers_geo(c)
+    for pop_id, localizacao in c.execute('SELECT id, localizacao FROM pops').fetchall():
+        coordenadas = extrair_coordenadas(localizacao)
+        if coordenadas:
+            c.execute('UPDATE pops SET latitude = ?, longitude = ? WHERE id = ?', (*coordenadas, pop_id))
+
+def _migracao_estatisticas_arquivo(c):
+    # Rotas arquivadas por POP, mantidas pelos triggers de rotas_arquivo: as listagens mostram
+    # as rotas ativas (total de estatisticas_status menos as arquivadas) sem contar as rotas
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS estatisticas_arquivo (
+            pop_id INTEGER PRIMARY KEY,
+            quantidade INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    criar_triggers_estatisticas(c)
+    reconstruir_estatisticas(c)
+
+MIGRACOES = [
+    _migracao_indices_chaves,  # 1
+    _migracao_indice_atualizacao,  # 2
+    _migracao_estatisticas_status,  # 3
+    _migracao_rota_eventos,  # 4
+    _migracao_sessoes,  # 5
+    _migracao_versao_rotas,  # 6
+    _migracao_busca_rotas,  # 7
+    _migracao_status_codificado,  # 8
+    _migracao_exclusao_em_cascata,  # 9
+    _migracao_arquivo_rotas,  # 10
+    _migracao_coordenadas_pops,  # 11
+    _migracao_estatisticas_arquivo,  # 12
+]
+
+def _existe_tabela(c, nome):
+    return c.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (nome,)).fetchone() is not None
+
+def get_versao_esquema(c):
+    return c.execute('PRAGMA user_version').fetchone()[0]
+
+def aplicar_migracoes(c):
+    """Atualiza o esquema do banco até a última versão conhecida"""
+    versao = get_versao_esquema(c)
+    if versao > len(MIGRACOES):
+        raise RuntimeError(f"Banco de dados na versão {versao}, mais nova que a suportada por esta aplicação ({len(MIGRACOES)}).")
+
+    for numero, migracao in enumerate(MIGRACOES[versao:], start=versao + 1):
+        migracao(c)
+        c.execute(f'PRAGMA user_version = {numero}')
+
+# Estatísticas materializadas (tabela estatisticas_status)
+TIPOS_ESTATISTICA = {
+    'lancamento': 'status_lancamento',
+    'fusao': 'status_fusao',
+    'alimentacao': 'status_alimentacao',
+}
+
+def _sql_contadores(linha, delta):
+    # Um upsert por tipo de status para a linha NEW/OLD da trigger
+    return "".join(f'''
+            INSERT INTO estatisticas_status (pop_id, tipo, status, quantidade)
+            VALUES (COALESCE({linha}.pop_id, 0), '{tipo}', COALESCE({linha}.{coluna}, -1), {delta})
+            ON CONFLICT (pop_id, tipo, status) DO UPDATE SET quantidade = quantidade + ({delta});'''
+        for tipo, coluna in TIPOS_ESTATISTICA.items())
+
+def _sql_arquivadas(linha, delta):
+    return f'''
+            INSERT INTO estatisticas_arquivo (pop_id, quantidade)
+            VALUES (COALESCE({linha}.pop_id, 0), {delta})
+            ON CONFLICT (pop_id) DO UPDATE SET quantidade = quantidade + ({delta});'''
+
+def _tabelas_rotas(c):
+    # rotas_arquivo só existe a partir da migração 10; as anteriores também passam por aqui
+    return ['rotas'] + (['rotas_arquivo'] if _existe_tabela(c, 'rotas_arquivo') else [])
+
+def criar_triggers_estatisticas(c):
+    # As rotas arquivadas continuam contadas: mover uma rota entre rotas e rotas_arquivo
+    # subtrai de um lado e soma do outro, sem alterar os contadores. As de rotas_arquivo
+    # também mantêm estatisticas_arquivo (a partir da migração 12)
+    colunas = ', '.join(['pop_id'] + list(TIPOS_ESTATISTICA.values()))
+    por_arquivo = _existe_tabela(c, 'estatisticas_arquivo')
+    for tabela in _tabelas_rotas(c):
+        arquivadas = por_arquivo and tabela == 'rotas_arquivo'
+        c.execute(f'DROP TRIGGER IF EXISTS trg_{tabela}_estatisticas_insert')
+        c.execute(f'DROP TRIGGER IF EXISTS trg_{tabela}_estatisticas_delete')
+        c.execute(f'DROP TRIGGER IF EXISTS trg_{tabela}_estatisticas_update')
+        c.execute(f'''
+            CREATE TRIGGER trg_{tabela}_estatisticas_insert AFTER INSERT ON {tabela}
+            BEGIN{_sql_contadores('NEW', 1)}{_sql_arquivadas('NEW', 1) if arquivadas else ''}
+            END
+        ''')
+        c.execute(f'''
+            CREATE TRIGGER trg_{tabela}_estatisticas_delete AFTER DELETE ON {tabela}
+            BEGIN{_sql_contadores('OLD', -1)}{_sql_arquivadas('OLD', -1) if arquivadas else ''}
+            END
+        ''')
+        c.execute(f'''
+            CREATE TRIGGER trg_{tabela}_estatisticas_update AFTER UPDATE OF {colunas} ON {tabela}
+            BEGIN{_sql_contadores('OLD', -1)}{_sql_contadores('NEW', 1)}{
+                _sql_arquivadas('OLD', -1) + _sql_arquivadas('NEW', 1) if arquivadas else ''}
+            END
+        ''')
+
+def reconstruir_estatisticas(c=None):
+    """Recalcula estatisticas_status (rotas ativas e arquivadas) e estatisticas_arquivo do zero"""
+    if c is None:
+        with transacao() as conn:
+            return reconstruir_estatisticas(conn)
+
+    c.execute('DELETE FROM estatisticas_status')
+    for tipo, coluna in TIPOS_ESTATISTICA.items():
+        origem = ' UNION ALL '.join(f'SELECT pop_id, {coluna} FROM {tabela}' for tabela in _tabelas_rotas(c))
+        c.execute(f'''
+            INSERT INTO estatisticas_status (pop_id, tipo, status, quantidade)
+            SELECT COALESCE(pop_id, 0), ?, COALESCE({coluna}, -1), COUNT(*)
+            FROM ({origem})
+            GROUP BY 1, 3
+        ''', (tipo,))
+    if _existe_tabela(c, 'estatisticas_arquivo'):
+        c.execute('DELETE FROM estatisticas_arquivo')
+        c.execute('''
+            INSERT INTO estatisticas_arquivo (pop_id, quantidade)
+            SELECT COALESCE(pop_id, 0), COUNT(*) FROM rotas_arquivo GROUP BY 1
+        ''')
+
+# Histórico de status das rotas (tabela rota_eventos)
+def _sql_evento(tipo, novo, anterior, usuario, pop_id=None):
+    colunas = list(TIPOS_ESTATISTICA.values())
+    valores_novos = ', '.join(f'{novo}.{coluna}' if novo else 'NULL' for coluna in colunas)
+    valores_anteriores = ', '.join(f'{anterior}.{coluna}' if anterior else 'NULL' for coluna in colunas)
+    linha = novo or anterior
+    return f'''
+            INSERT INTO rota_eventos (rota_id, pop_id, tipo, usuario, {', '.join(colunas)}, {', '.join(c + '_anterior' for c in colunas)})
+            VALUES ({linha}.id, {pop_id or f'{linha}.pop_id'}, '{tipo}', {usuario}, {valores_novos}, {valores_anteriores});'''
+
+def criar_triggers_eventos(c):
+    mudou_status = ' OR '.join(f'OLD.{coluna} IS NOT NEW.{coluna}' for coluna in TIPOS_ESTATISTICA.values())
+    c.execute('DROP TRIGGER IF EXISTS trg_rotas_eventos_insert')
+    c.execute('DROP TRIGGER IF EXISTS trg_rotas_eventos_update')
+    c.execute('DROP TRIGGER IF EXISTS trg_rotas_eventos_delete')
+    c.execute('DROP TRIGGER IF EXISTS trg_rotas_eventos_pop')
+    c.execute('DROP TRIGGER IF EXISTS trg_rotas_eventos_restauracao')
+    c.execute('DROP TRIGGER IF EXISTS trg_rotas_eventos_arquivamento')
+    # Arquivar grava a rota em rotas_arquivo antes de excluí-la de rotas, e restaurar a grava
+    # em rotas antes de excluí-la de rotas_arquivo: a linha no arquivo distingue os dois casos
+    # de uma criação/exclusão comum
+    arquivo = _existe_tabela(c, 'rotas_arquivo')
+    no_arquivo = 'EXISTS (SELECT 1 FROM rotas_arquivo WHERE id = {}.id)'
+    c.execute(f'''
+        CREATE TRIGGER trg_rotas_eventos_insert AFTER INSERT ON rotas
+        {f"WHEN NOT {no_arquivo.format('NEW')}" if arquivo else ''}
+        BEGIN{_sql_evento('criacao', 'NEW', None, 'NEW.usuario_atualizacao')}
+        END
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER trg_rotas_eventos_update AFTER UPDATE ON rotas
+        WHEN {mudou_status}
+        BEGIN{_sql_evento('status', 'NEW', 'OLD', 'NEW.usuario_atualizacao')}
+        END
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER trg_rotas_eventos_delete AFTER DELETE ON rotas
+        {f"WHEN NOT {no_arquivo.format('OLD')}" if arquivo else ''}
+        BEGIN{_sql_evento('exclusao', None, 'OLD', 'NULL')}
+        END
+    ''')
+    if arquivo:
+        c.execute(f'''
+            CREATE TRIGGER trg_rotas_eventos_arquivamento AFTER DELETE ON rotas
+            WHEN {no_arquivo.format('OLD')}
+            BEGIN{_sql_evento('arquivamento', None, 'OLD', 'NULL')}
+            END
+        ''')
+        c.execute(f'''
+            CREATE TRIGGER trg_rotas_eventos_restauracao AFTER INSERT ON rotas
+            WHEN {no_arquivo.format('NEW')}
+            BEGIN{_sql_evento('restauracao', 'NEW', None, 'NEW.usuario_atualizacao')}
+            END
+        ''')
+    # Troca de POP: a rota sai do POP antigo e entra no novo com os status que tinha
+    # (uma mudança de status no mesmo UPDATE continua registrada pelo trigger acima)
+    c.execute(f'''
+        CREATE TRIGGER trg_rotas_eventos_pop AFTER UPDATE OF pop_id ON rotas
+        WHEN OLD.pop_id IS NOT NEW.pop_id
+        BEGIN{_sql_evento('saida', None, 'OLD', 'NEW.usuario_atualizacao')}{_sql_evento('entrada', 'OLD', None, 'NEW.usuario_atualizacao', 'NEW.pop_id')}
+        END
+    ''')
+
+# Busca de texto completo (tabela FTS5 busca_rotas)
+_SQL_INDEXAR_ROTA = '''
+            INSERT INTO busca_rotas (rowid, nome_rota, nome_cidade, observacoes_lancamento, observacoes_fusao)
+            SELECT NEW.id, NEW.nome_rota, c.nome_cidade, NEW.observacoes_lancamento, NEW.observacoes_fusao
+            FROM (SELECT 1) LEFT JOIN cidades c ON c.id = NEW.cidade_id;'''
+
+def criar_triggers_busca(c):
+    c.execute('DROP TRIGGER IF EXISTS trg_rotas_busca_insert')
+    c.execute('DROP TRIGGER IF EXISTS trg_rotas_busca_update')
+    c.execute('DROP TRIGGER IF EXISTS trg_rotas_busca_delete')
+    c.execute('DROP TRIGGER IF EXISTS trg_cidades_busca_update')
+    c.execute(f'''
+        CREATE TRIGGER trg_rotas_busca_insert AFTER INSERT ON rotas
+        BEGIN{_SQL_INDEXAR_ROTA}
+        END
+    ''')
+    # Só as colunas indexadas: mudanças de status não tocam no índice
+    c.execute(f'''
+        CREATE TRIGGER trg_rotas_busca_update
+        AFTER UPDATE OF nome_rota, cidade_id, observacoes_lancamento, observacoes_fusao ON rotas
+        BEGIN
+            DELETE FROM busca_rotas WHERE rowid = OLD.id;{_SQL_INDEXAR_ROTA}
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER trg_rotas_busca_delete AFTER DELETE ON rotas
+        BEGIN
+            DELETE FROM busca_rotas WHERE rowid = OLD.id;
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER trg_cidades_busca_update AFTER UPDATE OF nome_cidade ON cidades
+        BEGIN
+            UPDATE busca_rotas SET nome_cidade = NEW.nome_cidade
+            WHERE rowid IN (SELECT id FROM rotas WHERE cidade_id = NEW.id);
+        END
+    ''')
+
+def reconstruir_busca(c=None):
+    """Recria o índice busca_rotas do zero a partir das tabelas rotas e cidades"""
+    if c is None:
+        with transacao() as conn:
+            return reconstruir_busca(conn)
+
+    c.execute('DELETE FROM busca_rotas')
+    c.execute('''
+        INSERT INTO busca_rotas (rowid, nome_rota, nome_cidade, observacoes_lancamento, observacoes_fusao)
+        SELECT r.id, r.nome_rota, c.nome_cidade, r.observacoes_lancamento, r.observacoes_fusao
+        FROM rotas r 
+        LEFT JOIN cidades c ON r.cidade_id = c.id
+    ''')
+
+# Índice espacial dos POPs (tabela R*Tree pops_geo)
+# Cada POP é um ponto (mínimo = máximo); POPs sem coordenadas ficam fora do índice
+_SQL_INDEXAR_POP = '''
+            INSERT INTO pops_geo (id, latitude_min, latitude_max, longitude_min, longitude_max)
+            SELECT NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude
+            WHERE NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL;'''
+
+def criar_triggers_geo(c):
+    c.execute('DROP TRIGGER IF EXISTS trg_pops_geo_insert')
+    c.execute('DROP TRIGGER IF EXISTS trg_pops_geo_update')
+    c.execute('DROP TRIGGER IF EXISTS trg_pops_geo_delete')
+    c.execute(f'''
+        CREATE TRIGGER trg_pops_geo_insert AFTER INSERT ON pops
+        BEGIN{_SQL_INDEXAR_POP}
+        END
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER trg_pops_geo_update AFTER UPDATE OF latitude, longitude ON pops
+        BEGIN
+            DELETE FROM pops_geo WHERE id = OLD.id;{_SQL_INDEXAR_POP}
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER trg_pops_geo_delete AFTER DELETE ON pops
+        BEGIN
+            DELETE FROM pops_geo WHERE id = OLD.id;
+        END
+    ''')
+
+def reconstruir_indice_geo(c=None):
+    """Recria o índice pops_geo do zero a partir das coordenadas da tabela pops"""
+    if c is None:
+        with transacao() as conn:
+            return reconstruir_indice_geo(conn)
+
+    c.execute('DELETE FROM pops_geo')
+    c.execute('''
+        INSERT INTO pops_geo (id, latitude_min, latitude_max, longitude_min, longitude_max)
+        SELECT id, latitude, latitude, longitude, longitude FROM pops
+        WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+    ''')
@@ -0,0 +1,139 @@
+"""Estatísticas por status e consultas sobre o histórico das rotas"""
+from .banco import conexao, consultar_registros, leitura_cacheada
+from .codigos import COLUNAS_CODIFICADAS, STATUS_EM_ANDAMENTO, STATUS_FINALIZADA
+from .esquema import TIPOS_ESTATISTICA
+
+def _ler_estatisticas(conn, tipo):
+    import pandas as pd
+
+    df = pd.read_sql('''
+        SELECT NULLIF(status, -1) as status, SUM(quantidade) as count 
+        FROM estatisticas_status 
+        WHERE tipo = ? AND quantidade > 0 
+        GROUP BY status 
+        ORDER BY status
+    ''', conn, params=(tipo,))
+    # Códigos -> categórico com os rótulos do tipo de status, na ordem das opções
+    opcoes = COLUNAS_CODIFICADAS[TIPOS_ESTATISTICA[tipo]]
+    df['status'] = pd.Categorical.from_codes(df['status'].fillna(-1).astype(int), categories=opcoes)
+    return df
+
+@leitura_cacheada
+def get_estatisticas_status():
+    with conexao() as conn:
+        df_lancamento = _ler_estatisticas(conn, 'lancamento')
+        df_fusao = _ler_estatisticas(conn, 'fusao')
+    return df_lancamento, df_fusao
+
+@leitura_cacheada
+def get_estatisticas_alimentacao():
+    with conexao() as conn:
+        df = _ler_estatisticas(conn, 'alimentacao')
+    return df[df['status'].notna()].reset_index(drop=True)
+
+@leitura_cacheada
+def listar_estatisticas(pop_id=None):
+    """Quantidade de rotas por tipo e código de status (-1 = não informado), no total
+    ou de um POP, como registros"""
+    filtro, params = ('AND pop_id = ?', (pop_id,)) if pop_id is not None else ('', ())
+    return consultar_registros(f'''
+        SELECT tipo, status, SUM(quantidade) as quantidade 
+        FROM estatisticas_status 
+        WHERE quantidade > 0 {filtro} 
+        GROUP BY tipo, status 
+        ORDER BY tipo, status
+    ''', params)
+
+@leitura_cacheada
+def contar_cidades():
+    with conexao() as conn:
+        return conn.execute('SELECT COUNT(*) FROM cidades').fetchone()[0]
+
+# Consultas sobre o histórico (sempre por intervalo de ts, usando os índices de rota_eventos)
+def _filtro_pop_eventos(pop_id):
+    return ('AND e.pop_id = ?', [pop_id]) if pop_id is not None else ('', [])
+
+@leitura_cacheada
+def get_vazao_diaria(inicio, fim, pop_id=None):
+    """Lançamentos e fusões finalizados por dia e POP no intervalo [inicio, fim)"""
+    import pandas as pd
+
+    filtro, params = _filtro_pop_eventos(pop_id)
+    with conexao() as conn:
+        return pd.read_sql(f'''
+            SELECT date(e.ts) as dia, e.pop_id, p.nome_pop,
+                   SUM(e.status_lancamento = {STATUS_FINALIZADA} AND e.status_lancamento_anterior IS NOT {STATUS_FINALIZADA}) as lancamentos_finalizados,
+                   SUM(e.status_fusao = {STATUS_FINALIZADA} AND e.status_fusao_anterior IS NOT {STATUS_FINALIZADA}) as fusoes_finalizadas
+            FROM rota_eventos e 
+            LEFT JOIN pops p ON e.pop_id = p.id 
+            WHERE e.ts >= ? AND e.ts < ? AND e.tipo = 'status' {filtro}
+            GROUP BY dia, e.pop_id
+            ORDER BY dia, p.nome_pop
+        ''', conn, params=[inicio, fim] + params)
+
+@leitura_cacheada
+def get_tempo_em_andamento(inicio, fim, pop_id=None):
+    """Horas médias por rota em "EM ANDAMENTO" (lançamento e fusão), por POP.
+
+    Considera os períodos iniciados em [inicio, fim); cada período dura até o
+    próximo evento da mesma rota (ou até agora, se ainda estiver aberto).
+    """
+    import pandas as pd
+
+    filtro, params = _filtro_pop_eventos(pop_id)
+    with conexao() as conn:
+        return pd.read_sql(f'''
+            WITH periodos AS (
+                SELECT e.pop_id, e.rota_id, e.status_lancamento, e.status_fusao,
+                       (julianday(COALESCE(
+                           (SELECT MIN(proximo.ts) FROM rota_eventos proximo 
+                            WHERE proximo.rota_id = e.rota_id AND proximo.ts > e.ts),
+                           strftime('%Y-%m-%d %H:%M:%f', 'now')
+                       )) - julianday(e.ts)) * 24 as horas
+                FROM rota_eventos e 
+                WHERE e.ts >= ? AND e.ts < ? AND e.tipo <> 'exclusao' {filtro}
+            )
+            SELECT pr.pop_id, p.nome_pop,
+                   SUM(CASE WHEN pr.status_lancamento = {STATUS_EM_ANDAMENTO} THEN pr.horas END)
+                       / COUNT(DISTINCT CASE WHEN pr.status_lancamento = {STATUS_EM_ANDAMENTO} THEN pr.rota_id END) as horas_lancamento,
+                   SUM(CASE WHEN pr.status_fusao = {STATUS_EM_ANDAMENTO} THEN pr.horas END)
+                       / COUNT(DISTINCT CASE WHEN pr.status_fusao = {STATUS_EM_ANDAMENTO} THEN pr.rota_id END) as horas_fusao
+            FROM periodos pr 
+            LEFT JOIN pops p ON pr.pop_id = p.id 
+            GROUP BY pr.pop_id
+            ORDER BY p.nome_pop
+        ''', conn, params=[inicio, fim] + params)
+
+@leitura_cacheada
+def get_burndown(inicio, fim, pop_id=None):
+    """Rotas com fusão não finalizada ao final de cada dia de [inicio, fim)
+
+    Parte do total atual (estatisticas_status) e desfaz, dia a dia, a variação
+    registrada nos eventos desde inicio; não depende do histórico anterior.
+    """
+    import pandas as pd
+
+    filtro, params = _filtro_pop_eventos(pop_id)
+    filtro_atual = 'AND pop_id = ?' if pop_id is not None else ''
+    with conexao() as conn:
+        conn.execute('BEGIN')
+        pendentes_agora = conn.execute(f'''
+            SELECT COALESCE(SUM(quantidade), 0) FROM estatisticas_status 
+            WHERE tipo = 'fusao' AND status <> {STATUS_FINALIZADA} {filtro_atual}
+        ''', params).fetchone()[0]
+        variacoes = pd.read_sql(f'''
+            SELECT date(e.ts) as dia,
+                   SUM((e.status_fusao IS NOT NULL AND e.status_fusao <> {STATUS_FINALIZADA})
+                       - (e.status_fusao_anterior IS NOT NULL AND e.status_fusao_anterior <> {STATUS_FINALIZADA})) as variacao
+            FROM rota_eventos e 
+            WHERE e.ts >= ? {filtro}
+            GROUP BY dia
+        ''', conn, params=[inicio] + params)
+        conn.rollback()
+
+    dias = pd.date_range(inicio, fim, freq='D', inclusive='left').strftime('%Y-%m-%d')
+    variacao = variacoes.set_index('dia')['variacao']
+    variacao = variacao.reindex(variacao.index.union(dias), fill_value=0).sort_index()
+    # Pendentes ao final do dia d = pendentes agora - variação de todos os dias posteriores a d
+    posteriores = variacao[::-1].cumsum()[::-1] - variacao
+    return pd.DataFrame({'dia': dias, 'rotas_pendentes': (pendentes_agora - posteriores.reindex(dias)).to_numpy()})
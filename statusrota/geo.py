@@ -0,0 +1,199 @@
+"""Coordenadas dos POPs e buscas espaciais pelo índice R*Tree pops_geo.
+
+As coordenadas (graus decimais) vêm do próprio texto da localização, quando ele
+já as traz, ou de um gazetteer offline: um CSV com as colunas nome, latitude e
+longitude (ex.: a lista de municípios do IBGE). As buscas por área e por raio
+consultam só os POPs da caixa no índice e calculam a distância exata apenas deles.
+"""
+import csv
+import io
+import math
+import re
+import unicodedata
+
+from .banco import conexao, consultar_registros, instrumentada, leitura_cacheada, transacao
+from .codigos import CODIGOS_ALIMENTACAO, STATUS_EM_ANDAMENTO, STATUS_FINALIZADA, STATUS_PENDENTE
+from .config import GEO_RAIO_INICIAL_KM
+
+RAIO_TERRA_KM = 6371.0088
+# Metade da circunferência: nenhum ponto da Terra fica mais longe do que isso
+DISTANCIA_MAXIMA_KM = math.pi * RAIO_TERRA_KM
+
+# "-23.5505, -46.6333", "-23.5505 -46.6333" ou, com vírgula decimal, "-23,5505; -46,6333"
+_NUMERO = r'[-+]?\d+(?:\.\d+)?'
+_NUMERO_VIRGULA = r'[-+]?\d+(?:,\d+)?'
+_PADROES_COORDENADAS = [
+    re.compile(rf'\s*({_NUMERO})\s*(?:[,;]\s*|\s+)({_NUMERO})\s*'),
+    re.compile(rf'\s*({_NUMERO_VIRGULA})\s*;\s*({_NUMERO_VIRGULA})\s*'),
+]
+
+def extrair_coordenadas(texto):
+    """(latitude, longitude) escritas no texto, ou None se ele não for um par de coordenadas válido"""
+    for padrao in _PADROES_COORDENADAS:
+        encontrado = padrao.fullmatch(texto or '')
+        if encontrado:
+            latitude, longitude = (float(valor.replace(',', '.')) for valor in encontrado.groups())
+            if -90 <= latitude <= 90 and -180 <= longitude <= 180:
+                return latitude, longitude
+    return None
+
+def _normalizar(nome):
+    # Comparação sem acentos, maiúsculas/minúsculas ou espaços repetidos
+    sem_acentos = unicodedata.normalize('NFKD', nome).encode('ascii', 'ignore').decode('ascii')
+    return ' '.join(sem_acentos.lower().split())
+
+def ler_gazetteer(arquivo):
+    """Lê o CSV do gazetteer (caminho ou arquivo aberto) em um dict nome normalizado -> (latitude, longitude).
+
+    O separador (vírgula ou ponto e vírgula) é detectado; linhas com coordenadas inválidas são ignoradas.
+    """
+    if isinstance(arquivo, str):
+        with open(arquivo, encoding='utf-8-sig', newline='') as aberto:
+            return ler_gazetteer(aberto)
+    conteudo = arquivo.read()
+    if isinstance(conteudo, bytes):
+        # Arquivos enviados pela interface chegam em bytes
+        conteudo = conteudo.decode('utf-8-sig')
+
+    primeira_linha = conteudo.partition('\n')[0]
+    separador = ';' if primeira_linha.count(';') > primeira_linha.count(',') else ','
+    leitor = csv.DictReader(io.StringIO(conteudo), delimiter=separador)
+    # Cabeçalhos como "Nome" ou "LATITUDE" também servem
+    leitor.fieldnames = [_normalizar(coluna) for coluna in leitor.fieldnames or []]
+    gazetteer = {}
+    for linha in leitor:
+        try:
+            latitude, longitude = float(linha['latitude'].replace(',', '.')), float(linha['longitude'].replace(',', '.'))
+        except (AttributeError, KeyError, ValueError):
+            continue
+        if linha.get('nome') and -90 <= latitude <= 90 and -180 <= longitude <= 180:
+            gazetteer.setdefault(_normalizar(linha['nome']), (latitude, longitude))
+    return gazetteer
+
+def _procurar_gazetteer(gazetteer, localizacao):
+    # "Campinas", "Campinas - SP", "Campinas/SP", "Campinas, SP": tenta o texto inteiro e depois o nome antes do separador
+    for candidato in (localizacao, re.split(r'\s*[-/,(]\s*', localizacao)[0]):
+        coordenadas = gazetteer.get(_normalizar(candidato))
+        if coordenadas:
+            return coordenadas
+    return None
+
+@instrumentada
+def geocodificar_pops(gazetteer=None):
+    """Preenche as coordenadas dos POPs que ainda não as têm, pela localização de cada um.
+
+    gazetteer: dict de ler_gazetteer (opcional); sem ele, só as localizações que já são
+    coordenadas são aproveitadas. Retorna (POPs preenchidos, POPs que continuam sem coordenadas).
+    """
+    with transacao() as conn:
+        pendentes = conn.execute('SELECT id, localizacao FROM pops WHERE latitude IS NULL OR longitude IS NULL').fetchall()
+        preenchidos = []
+        for pop_id, localizacao in pendentes:
+            coordenadas = extrair_coordenadas(localizacao)
+            if coordenadas is None and gazetteer and localizacao:
+                coordenadas = _procurar_gazetteer(gazetteer, localizacao)
+            if coordenadas:
+                preenchidos.append((*coordenadas, pop_id))
+        conn.executemany('UPDATE pops SET latitude = ?, longitude = ? WHERE id = ?', preenchidos)
+    return len(preenchidos), len(pendentes) - len(preenchidos)
+
+@instrumentada
+def atualizar_coordenadas_pop(pop_id, latitude, longitude):
+    """Grava (ou, com None, apaga) as coordenadas do POP; o índice pops_geo acompanha pelos triggers"""
+    with transacao() as conn:
+        conn.execute('UPDATE pops SET latitude = ?, longitude = ? WHERE id = ?', (latitude, longitude, pop_id))
+
+# Buscas espaciais
+def distancia_km(latitude1, longitude1, latitude2, longitude2):
+    """Distância em km pela superfície da Terra (fórmula de haversine)"""
+    phi1, phi2 = math.radians(latitude1), math.radians(latitude2)
+    delta_phi = phi2 - phi1
+    delta_lambda = math.radians(longitude2 - longitude1)
+    a = math.sin(delta_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(delta_lambda / 2) ** 2
+    return 2 * RAIO_TERRA_KM * math.asin(min(1.0, math.sqrt(a)))
+
+def _caixa(latitude, longitude, raio_km):
+    """Caixa (lat_min, lat_max, lon_min, lon_max) que contém o círculo de raio_km em volta do ponto.
+
+    Não trata círculos que cruzam o antimeridiano (longitude ±180), fora da área de atuação.
+    """
+    delta_latitude = math.degrees(raio_km / RAIO_TERRA_KM)
+    latitude_min, latitude_max = max(-90.0, latitude - delta_latitude), min(90.0, latitude + delta_latitude)
+    # Perto dos polos (ou com raio muito grande) a caixa abrange todas as longitudes
+    cosseno = math.cos(math.radians(max(abs(latitude_min), abs(latitude_max))))
+    if latitude_min == -90.0 or latitude_max == 90.0 or cosseno <= 0 or delta_latitude / cosseno >= 180:
+        return latitude_min, latitude_max, -180.0, 180.0
+    delta_longitude = delta_latitude / cosseno
+    return latitude_min, latitude_max, max(-180.0, longitude - delta_longitude), min(180.0, longitude + delta_longitude)
+
+SQL_POPS_NA_CAIXA = '''
+    SELECT p.id, p.nome_pop, p.localizacao, p.latitude, p.longitude
+    FROM pops_geo g
+    JOIN pops p ON p.id = g.id
+    WHERE g.latitude_max >= ? AND g.latitude_min <= ? AND g.longitude_max >= ? AND g.longitude_min <= ?
+'''
+
+def _pops_na_caixa(latitude_min, latitude_max, longitude_min, longitude_max):
+    # O R*Tree guarda as coordenadas em precisão simples, arredondadas para fora:
+    # a caixa do índice pode trazer pontos vizinhos, descartados pelas coordenadas exatas
+    return consultar_registros(
+        SQL_POPS_NA_CAIXA + 'AND p.latitude BETWEEN ? AND ? AND p.longitude BETWEEN ? AND ?',
+        (latitude_min, latitude_max, longitude_min, longitude_max) * 2,
+    )
+
+@instrumentada
+def pops_na_area(latitude_min, latitude_max, longitude_min, longitude_max):
+    """POPs dentro do retângulo, como registros sqlite3.Row"""
+    return _pops_na_caixa(latitude_min, latitude_max, longitude_min, longitude_max)
+
+@instrumentada
+def pops_proximos(latitude, longitude, raio_km):
+    """POPs a até raio_km do ponto, do mais próximo ao mais distante.
+
+    Retorna dicts com as colunas do POP e distancia_km.
+    """
+    proximos = []
+    for pop in _pops_na_caixa(*_caixa(latitude, longitude, raio_km)):
+        distancia = distancia_km(latitude, longitude, pop['latitude'], pop['longitude'])
+        if distancia <= raio_km:
+            proximos.append(dict(pop, distancia_km=distancia))
+    return sorted(proximos, key=lambda pop: pop['distancia_km'])
+
+@instrumentada
+def pops_mais_proximos(latitude, longitude, quantidade=5):
+    """Os `quantidade` POPs mais próximos do ponto, como em pops_proximos.
+
+    Busca em raios crescentes: quando o raio já contém a quantidade pedida, nenhum POP
+    fora dele pode estar mais perto do que eles.
+    """
+    raio_km = GEO_RAIO_INICIAL_KM
+    while True:
+        proximos = pops_proximos(latitude, longitude, raio_km)
+        if len(proximos) >= quantidade or raio_km >= DISTANCIA_MAXIMA_KM:
+            return proximos[:quantidade]
+        raio_km = min(raio_km * 2, DISTANCIA_MAXIMA_KM)
+
+# Mapa
+@leitura_cacheada
+def get_mapa_pops():
+    """Coordenadas e situação das rotas de cada POP (ativas e arquivadas), em uma única consulta.
+
+    Os totais vêm de estatisticas_status; POPs sem coordenadas vêm com latitude/longitude nulas.
+    """
+    import pandas as pd
+
+    sem_sinal = f"{CODIGOS_ALIMENTACAO['SEM SINAL PARCIAL']}, {CODIGOS_ALIMENTACAO['SEM SINAL TOTAL']}"
+    with conexao() as conn:
+        return pd.read_sql(f'''
+            SELECT p.id, p.nome_pop, p.localizacao, p.latitude, p.longitude,
+                   COALESCE(SUM(CASE WHEN e.tipo = 'lancamento' THEN e.quantidade END), 0) as total_rotas,
+                   COALESCE(SUM(CASE WHEN e.tipo = 'lancamento' AND e.status = {STATUS_FINALIZADA} THEN e.quantidade END), 0) as lancamentos_finalizados,
+                   COALESCE(SUM(CASE WHEN e.tipo = 'fusao' AND e.status = {STATUS_FINALIZADA} THEN e.quantidade END), 0) as fusoes_finalizadas,
+                   COALESCE(SUM(CASE WHEN e.tipo = 'fusao' AND e.status = {STATUS_EM_ANDAMENTO} THEN e.quantidade END), 0) as fusoes_em_andamento,
+                   COALESCE(SUM(CASE WHEN e.tipo = 'fusao' AND e.status = {STATUS_PENDENTE} THEN e.quantidade END), 0) as fusoes_pendentes,
+                   COALESCE(SUM(CASE WHEN e.tipo = 'alimentacao' AND e.status IN ({sem_sinal}) THEN e.quantidade END), 0) as rotas_sem_sinal
+            FROM pops p
+            LEFT JOIN estatisticas_status e ON e.pop_id = p.id
+            GROUP BY p.id
+            ORDER BY p.nome_pop
+        ''', conn)
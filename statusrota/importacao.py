@@ -0,0 +1,187 @@
+"""Importação em lote de POPs, cidades e rotas a partir de planilhas"""
+from .arquivo import _restaurar_rotas
+from .banco import conexao, get_cache_leituras, instrumentada
+from .codigos import STATUS_PENDENTE, codificar_status
+from .config import COLUNAS_IMPORTACAO, COLUNAS_STATUS_ROTA, OPCOES_ALIMENTACAO, OPCOES_STATUS
+from .geo import extrair_coordenadas
+
+# Importação em lote de POPs, cidades e rotas
+def ler_planilha(arquivo, nome_arquivo):
+    """Lê um CSV ou XLSX mantendo todas as colunas como texto"""
+    import pandas as pd
+
+    if nome_arquivo.lower().endswith('.xlsx'):
+        return pd.read_excel(arquivo, dtype=str)
+    return pd.read_csv(arquivo, dtype=str, sep=None, engine='python', encoding='utf-8-sig')
+
+def _sem_vazios(df):
+    return df.astype(object).where(df.notna(), None)
+
+def validar_planilha(planilha_df):
+    """Normaliza e valida a planilha inteira coluna a coluna; retorna (dados, erros)"""
+    import pandas as pd
+
+    dados = planilha_df.rename(columns=lambda coluna: str(coluna).strip().lower())
+    if 'nome_pop' not in dados.columns:
+        return None, pd.DataFrame([{'linha': None, 'erro': "Coluna obrigatória 'nome_pop' não encontrada."}])
+
+    dados = dados.reindex(columns=COLUNAS_IMPORTACAO)
+    texto = [coluna for coluna in COLUNAS_IMPORTACAO if coluna != 'capacidade']
+    dados[texto] = dados[texto].astype(object).apply(lambda coluna: coluna.str.strip()).replace('', None)
+    status = ['status_lancamento', 'status_fusao', 'status_alimentacao']
+    dados[status] = dados[status].apply(lambda coluna: coluna.str.upper())
+
+    capacidade = dados['capacidade'].astype(object).str.strip().replace('', None)
+    dados['capacidade'] = pd.to_numeric(capacidade, errors='coerce')
+
+    regras = [
+        (dados['nome_pop'].isna(), "nome_pop não informado"),
+        (dados['nome_rota'].notna() & dados['nome_cidade'].isna(), "rota sem nome_cidade"),
+        (capacidade.notna() & dados['capacidade'].isna(), "capacidade não numérica"),
+        (dados['status_lancamento'].notna() & ~dados['status_lancamento'].isin(OPCOES_STATUS), "status_lancamento inválido"),
+        (dados['status_fusao'].notna() & ~dados['status_fusao'].isin(OPCOES_STATUS), "status_fusao inválido"),
+        (dados['status_alimentacao'].notna() & ~dados['status_alimentacao'].isin(OPCOES_ALIMENTACAO), "status_alimentacao inválido"),
+    ]
+    # Linha como no arquivo: +1 pelo cabeçalho e +1 por começar em 1
+    erros = pd.concat(
+        [pd.DataFrame({'linha': dados.index[mascara] + 2, 'erro': mensagem}) for mascara, mensagem in regras],
+        ignore_index=True
+    ).sort_values('linha', kind='stable', ignore_index=True)
+    return dados, erros
+
+def _aplicar_importacao(conn, dados, usuario):
+    import pandas as pd
+
+    resumo = dict.fromkeys(['pops_novos', 'pops_atualizados', 'cidades_novas', 'rotas_novas', 'rotas_atualizadas'], 0)
+    # Status já validados: rótulos -> códigos gravados no banco
+    dados = codificar_status(dados.copy())
+
+    # POPs: um registro por nome; os últimos valores informados na planilha prevalecem
+    pops_planilha = dados.groupby('nome_pop', sort=False)[['localizacao', 'capacidade']].last().reset_index()
+    pops_atuais = pd.read_sql('SELECT id, nome_pop, localizacao, capacidade FROM pops ORDER BY id', conn)
+    pops_atuais = pops_atuais.drop_duplicates('nome_pop')
+    pops = pops_planilha.merge(pops_atuais, on='nome_pop', how='left', suffixes=('', '_atual'))
+
+    # Como em add_pop: uma localização "latitude, longitude" também preenche as coordenadas
+    novos = pops[pops['id'].isna()]
+    insert_params = [(nome_pop, localizacao, capacidade, *(extrair_coordenadas(localizacao) or (None, None)))
+                     for nome_pop, localizacao, capacidade
+                     in _sem_vazios(novos[['nome_pop', 'localizacao', 'capacidade']]).itertuples(index=False, name=None)]
+    conn.executemany('INSERT INTO pops (nome_pop, localizacao, capacidade, latitude, longitude) VALUES (?, ?, ?, ?, ?)',
+                     insert_params)
+    resumo['pops_novos'] = len(novos)
+
+    existentes = pops[pops['id'].notna()].copy()
+    existentes['localizacao'] = existentes['localizacao'].fillna(existentes['localizacao_atual'])
+    existentes['capacidade'] = existentes['capacidade'].fillna(existentes['capacidade_atual'])
+    mudou_localizacao = existentes['localizacao'].fillna('') != existentes['localizacao_atual'].fillna('')
+    mudou = mudou_localizacao | (existentes['capacidade'].fillna(-1) != existentes['capacidade_atual'].fillna(-1))
+    update_params = []
+    for (localizacao, capacidade, pop_id), nova_localizacao in zip(
+            _sem_vazios(existentes.loc[mudou, ['localizacao', 'capacidade', 'id']]).itertuples(index=False, name=None),
+            mudou_localizacao[mudou]):
+        coordenadas = extrair_coordenadas(localizacao) if nova_localizacao else None
+        update_params.append((localizacao, capacidade, *(coordenadas or (None, None)), int(pop_id)))
+    # Só uma nova localização com coordenadas as substitui; as preenchidas de outra forma
+    # (gazetteer, edição na interface) continuam valendo
+    conn.executemany('''
+        UPDATE pops 
+        SET localizacao = ?, capacidade = ?, latitude = COALESCE(?, latitude), longitude = COALESCE(?, longitude) 
+        WHERE id = ?
+    ''', update_params)
+    resumo['pops_atualizados'] = int(mudou.sum())
+
+    mapa_pops = dict(conn.execute('SELECT nome_pop, MIN(id) FROM pops GROUP BY nome_pop').fetchall())
+
+    # Cidades: identificadas por (POP, nome)
+    cidades = dados.loc[dados['nome_cidade'].notna(), ['nome_pop', 'nome_cidade']].drop_duplicates()
+    cidades['pop_id'] = cidades['nome_pop'].map(mapa_pops).astype(int)
+    pop_ids = cidades['pop_id'].unique().tolist()
+
+    def mapa_cidades():
+        marcadores = ','.join('?' * len(pop_ids))
+        return {(pop_id, nome): cidade_id for pop_id, nome, cidade_id in conn.execute(
+            f'SELECT pop_id, nome_cidade, MIN(id) FROM cidades WHERE pop_id IN ({marcadores}) GROUP BY pop_id, nome_cidade',
+            pop_ids
+        )}
+
+    chaves_cidades = list(zip(cidades['pop_id'], cidades['nome_cidade']))
+    cidades_atuais = mapa_cidades()
+    novas = [(nome, pop_id) for pop_id, nome in chaves_cidades if (pop_id, nome) not in cidades_atuais]
+    conn.executemany('INSERT INTO cidades (nome_cidade, pop_id) VALUES (?, ?)', novas)
+    resumo['cidades_novas'] = len(novas)
+
+    # Rotas: identificadas por (cidade, nome); linhas repetidas na planilha valem pela última
+    rotas = dados.loc[dados['nome_rota'].notna()].drop_duplicates(['nome_pop', 'nome_cidade', 'nome_rota'], keep='last').copy()
+    if rotas.empty:
+        return resumo
+
+    cidades_atuais = mapa_cidades()
+    rotas['pop_id'] = rotas['nome_pop'].map(mapa_pops).astype(int)
+    rotas['cidade_id'] = [cidades_atuais[chave] for chave in zip(rotas['pop_id'], rotas['nome_cidade'])]
+
+    # As rotas arquivadas também contam como existentes: reimportar a planilha não as duplica
+    marcadores = ','.join('?' * len(pop_ids))
+    colunas = f'id, cidade_id, nome_rota, {", ".join(COLUNAS_STATUS_ROTA)}'
+    rotas_atuais = pd.read_sql(f'''
+        SELECT {colunas}, 0 as arquivada FROM rotas WHERE pop_id IN ({marcadores})
+        UNION ALL
+        SELECT {colunas}, 1 as arquivada FROM rotas_arquivo WHERE pop_id IN ({marcadores})
+        ORDER BY arquivada, id
+    ''', conn, params=pop_ids * 2).drop_duplicates(['cidade_id', 'nome_rota'])
+    rotas = rotas.merge(rotas_atuais, on=['cidade_id', 'nome_rota'], how='left', suffixes=('', '_atual'))
+
+    novas = rotas[rotas['id'].isna()].copy()
+    novas['status_lancamento'] = novas['status_lancamento'].fillna(STATUS_PENDENTE)
+    novas['status_fusao'] = novas['status_fusao'].fillna(STATUS_PENDENTE)
+    conn.executemany(f'''
+        INSERT INTO rotas (pop_id, cidade_id, nome_rota, {", ".join(COLUNAS_STATUS_ROTA)}, usuario_atualizacao)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', _sem_vazios(novas[['pop_id', 'cidade_id', 'nome_rota'] + COLUNAS_STATUS_ROTA].assign(usuario=usuario)).itertuples(index=False, name=None))
+    resumo['rotas_novas'] = len(novas)
+
+    # Rotas existentes: campos vazios na planilha mantêm o valor atual
+    existentes = rotas[rotas['id'].notna()].copy()
+    mudou = pd.Series(False, index=existentes.index)
+    for coluna in COLUNAS_STATUS_ROTA:
+        existentes[coluna] = existentes[coluna].fillna(existentes[f'{coluna}_atual'])
+        mudou |= existentes[coluna].fillna('') != existentes[f'{coluna}_atual'].fillna('')
+    # Arquivadas sem alteração ficam no arquivo; as alteradas voltam para rotas antes do
+    # UPDATE (o arquivo só guarda rotas finalizadas e sem mudanças recentes)
+    restaurar = existentes.loc[mudou & (existentes['arquivada'] == 1), 'id'].astype(int).tolist()
+    if restaurar:
+        _restaurar_rotas(conn, restaurar, usuario)
+    alteradas = existentes.loc[mudou, COLUNAS_STATUS_ROTA + ['id']].assign(id=lambda df: df['id'].astype(int))
+    update_params = [(*valores[:-1], usuario, valores[-1]) for valores in _sem_vazios(alteradas).itertuples(index=False, name=None)]
+    conn.executemany('''
+        UPDATE rotas 
+        SET status_lancamento = ?, status_fusao = ?, status_alimentacao = ?, 
+            observacoes_lancamento = ?, observacoes_fusao = ?, 
+            data_atualizacao = strftime('%Y-%m-%d %H:%M:%f', 'now'), usuario_atualizacao = ?, 
+            versao = versao + 1
+        WHERE id = ?
+    ''', update_params)
+    resumo['rotas_atualizadas'] = len(update_params)
+    return resumo
+
+@instrumentada
+def importar_planilha(dados, usuario=None, simular=False):
+    """Importa POPs, cidades e rotas já validados em uma única transação.
+
+    A importação é idempotente: registros já existentes (pelo nome) são reaproveitados
+    e só recebem os campos que mudaram. Com simular=True tudo é desfeito ao final,
+    servindo de prévia com as mesmas contagens da importação real.
+    """
+    with conexao() as conn:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            resumo = _aplicar_importacao(conn, dados, usuario)
+        except BaseException:
+            conn.rollback()
+            raise
+        if simular:
+            conn.rollback()
+            return resumo
+        conn.commit()
+    get_cache_leituras().invalidar()
+    return resumo
@@ -0,0 +1,121 @@
+"""Relatório copiável dos POPs e exportação das rotas de todos os POPs"""
+import csv
+import io
+import json
+import sqlite3
+
+from .banco import conexao, get_cache_relatorios, instrumentada
+from .cadastros import SQL_ROTAS_POP, get_assinatura_rotas_pop, listar_rotas_by_pop
+from .codigos import STATUS_EM_ANDAMENTO, registro_com_rotulos
+from .config import EXPORTACAO_TAMANHO_LOTE, FORMATOS_EXPORTACAO, OPCOES_ALIMENTACAO, OPCOES_STATUS
+
+# Relatório copiável
+EMOJIS_LANCAMENTO = {
+    "PENDENTE": "☑️",
+    "EM ANDAMENTO": "⚙️",
+    "FINALIZADA": "✅"
+}
+
+EMOJIS_FUSAO = {
+    "PENDENTE": "☑️",
+    "EM ANDAMENTO": "⚙️",
+    "FINALIZADA": "✳️"
+}
+
+EMOJIS_ALIMENTACAO = {
+    "ALIMENTADA": "✴️",
+    "EM PRODUÇÃO": "⚙️",
+    "SEM SINAL PARCIAL": "⚠️",
+    "SEM SINAL TOTAL": "🚫"
+}
+
+# Os status chegam como códigos: emoji de cada código, na ordem das opções
+_EMOJIS_LANCAMENTO_POR_CODIGO = [EMOJIS_LANCAMENTO[rotulo] for rotulo in OPCOES_STATUS]
+_EMOJIS_FUSAO_POR_CODIGO = [EMOJIS_FUSAO[rotulo] for rotulo in OPCOES_STATUS]
+_EMOJIS_ALIMENTACAO_POR_CODIGO = [EMOJIS_ALIMENTACAO[rotulo] for rotulo in OPCOES_ALIMENTACAO]
+
+CABECALHO_RELATORIO = (
+    "LEGENDA: (LANÇAMENTO: PENDENTE ☑️ / EM ANDAMENTO ⚙️ / FINALIZADA ✅)\n"
+    "(FUSÃO: PENDENTE ☑️ / EM ANDAMENTO: ALIMENTADA ✴️, SEM SINAL PARCIAL ⚠️ / SEM SINAL TOTAL 🚫/ FINALIZADA ✳️)\n\n"
+)
+
+def linha_relatorio(rota):
+    """Linha do relatório de uma rota (registro com acesso aos campos por nome)"""
+    emoji_lancamento = _EMOJIS_LANCAMENTO_POR_CODIGO[rota['status_lancamento']]
+    # Em andamento com alimentação informada, a fusão mostra o emoji da alimentação
+    if rota['status_fusao'] == STATUS_EM_ANDAMENTO and rota['status_alimentacao'] is not None:
+        emoji_fusao = _EMOJIS_ALIMENTACAO_POR_CODIGO[rota['status_alimentacao']]
+    else:
+        emoji_fusao = _EMOJIS_FUSAO_POR_CODIGO[rota['status_fusao']]
+    return (f"{rota['nome_rota']} - {emoji_lancamento}{emoji_fusao} "
+            f"{rota['nome_cidade'] or ''} ({rota['usuario_atualizacao'] or 'N/A'})")
+
+def linhas_relatorio(rotas):
+    return [linha_relatorio(rota) for rota in rotas]
+
+def gerar_relatorio_copiavel(pop_nome, rotas):
+    """Gera um relatório formatado para cópia a partir dos registros das rotas"""
+    return f"POP {pop_nome}\n" + CABECALHO_RELATORIO + "".join(linha + "\n" for linha in linhas_relatorio(rotas))
+
+@instrumentada
+def gerar_relatorio_pop(pop_id, pop_nome):
+    """Relatório copiável do POP, memorizado até que as rotas do POP mudem"""
+    ultima_atualizacao, quantidade = get_assinatura_rotas_pop(pop_id)
+    return get_cache_relatorios().obter(
+        (pop_id, pop_nome, ultima_atualizacao, quantidade),
+        lambda: gerar_relatorio_copiavel(pop_nome, listar_rotas_by_pop(pop_id))
+    )
+
+# Exportação de relatórios de todos os POPs
+def iterar_lotes_rotas(tamanho_lote=EXPORTACAO_TAMANHO_LOTE):
+    """Percorre as rotas de todos os POPs em lotes, um POP de cada vez.
+
+    Gera tuplas (pop_id, nome_pop, lote), com o lote em registros sqlite3.Row
+    (status como códigos); só um lote fica em memória por vez.
+    """
+    with conexao() as conn:
+        # Uma única transação de leitura garante um retrato consistente de todos os POPs
+        conn.execute('BEGIN')
+        pops = conn.execute('SELECT id, nome_pop FROM pops ORDER BY nome_pop, id').fetchall()
+        cursor = conn.cursor()
+        cursor.row_factory = sqlite3.Row
+        for pop_id, nome_pop in pops:
+            cursor.execute(SQL_ROTAS_POP + 'ORDER BY r.data_criacao ASC, r.id ASC', (pop_id,))
+            while True:
+                lote = cursor.fetchmany(tamanho_lote)
+                if not lote:
+                    break
+                yield pop_id, nome_pop, lote
+
+def _lote_csv(lote, cabecalho):
+    saida = io.StringIO()
+    escritor = csv.writer(saida, lineterminator='\n')
+    if cabecalho:
+        escritor.writerow(lote[0].keys())
+    escritor.writerows(registro_com_rotulos(rota).values() for rota in lote)
+    return saida.getvalue()
+
+def exportar_rotas(formato='texto', tamanho_lote=EXPORTACAO_TAMANHO_LOTE):
+    """Gera o relatório de todos os POPs em pedaços de texto no formato pedido"""
+    if formato not in FORMATOS_EXPORTACAO:
+        raise ValueError(f"Formato de exportação inválido: {formato}")
+
+    pop_atual = None
+    cabecalho_csv = True
+    for pop_id, nome_pop, lote in iterar_lotes_rotas(tamanho_lote):
+        if formato == 'texto':
+            if pop_id != pop_atual:
+                # Mesmo cabeçalho de gerar_relatorio_copiavel, separando os POPs por uma linha
+                yield ("\n" if pop_atual is not None else "") + f"POP {nome_pop}\n" + CABECALHO_RELATORIO
+                pop_atual = pop_id
+            yield "".join(linha + "\n" for linha in linhas_relatorio(lote))
+        elif formato == 'csv':
+            yield _lote_csv(lote, cabecalho_csv)
+            cabecalho_csv = False
+        else:
+            yield "".join(json.dumps(registro_com_rotulos(rota), ensure_ascii=False, separators=(',', ':')) + "\n" for rota in lote)
+
+def exportar_rotas_para_arquivo(arquivo, formato='texto', tamanho_lote=EXPORTACAO_TAMANHO_LOTE):
+    """Escreve a exportação em um arquivo de texto já aberto"""
+    for pedaco in exportar_rotas(formato, tamanho_lote):
+        arquivo.write(pedaco)
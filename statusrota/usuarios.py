@@ -0,0 +1,118 @@
+"""Usuários e sessões de login"""
+import hashlib
+import secrets
+import sqlite3
+from datetime import datetime, timezone
+
+from .banco import conexao, get_cache_sessoes, instrumentada, transacao
+from .config import SESSAO_DURACAO_HORAS
+
+# Funções de segurança
+def hash_password(password):
+    """Gera hash da senha"""
+    return hashlib.sha256(password.encode()).hexdigest()
+
+def generate_session_token():
+    """Gera token de sessão seguro"""
+    return secrets.token_hex(32)
+
+# Funções para gerenciamento de usuários
+@instrumentada
+def criar_usuario(username, password, nome_completo, matricula, permissao='USER'):
+    try:
+        with transacao() as conn:
+            conn.execute('''
+                INSERT INTO usuarios (username, password_hash, nome_completo, matricula, permissao)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (username, hash_password(password), nome_completo, matricula, permissao))
+        return True
+    except sqlite3.IntegrityError:
+        return False
+
+@instrumentada
+def verificar_login(username, password):
+    with conexao() as conn:
+        usuario = conn.execute('''
+            SELECT id, username, nome_completo, permissao, matricula 
+            FROM usuarios 
+            WHERE username = ? AND password_hash = ? AND ativo = 1
+        ''', (username, hash_password(password))).fetchone()
+    
+    if usuario:
+        return {
+            'id': usuario[0],
+            'username': usuario[1],
+            'nome_completo': usuario[2],
+            'permissao': usuario[3],
+            'matricula': usuario[4]
+        }
+    return None
+
+@instrumentada
+def get_all_usuarios():
+    import pandas as pd
+
+    with conexao() as conn:
+        return pd.read_sql('''
+            SELECT id, username, nome_completo, matricula, permissao, data_criacao 
+            FROM usuarios 
+            WHERE ativo = 1
+        ''', conn)
+
+@instrumentada
+def excluir_usuario(usuario_id):
+    with transacao() as conn:
+        conn.execute('UPDATE usuarios SET ativo = 0 WHERE id = ?', (usuario_id,))
+        conn.execute('DELETE FROM sessoes WHERE usuario_id = ?', (usuario_id,))
+    # Sessões do usuário podem estar no cache de validação
+    get_cache_sessoes().invalidar()
+
+# Funções para sessões de login
+def hash_token(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+@instrumentada
+def criar_sessao(usuario_id):
+    """Cria uma sessão persistida para o usuário e retorna o token (não gravado em claro)"""
+    token = generate_session_token()
+    with transacao(invalidar_cache=False) as conn:
+        # Aproveita o login para limpar sessões vencidas
+        conn.execute("DELETE FROM sessoes WHERE expira_em < strftime('%Y-%m-%d %H:%M:%f', 'now')")
+        conn.execute('''
+            INSERT INTO sessoes (token_hash, usuario_id, expira_em)
+            VALUES (?, ?, strftime('%Y-%m-%d %H:%M:%f', 'now', ?))
+        ''', (hash_token(token), usuario_id, f'+{SESSAO_DURACAO_HORAS} hours'))
+    return token
+
+@instrumentada
+def _carregar_sessao(token_hash):
+    with conexao() as conn:
+        sessao = conn.execute('''
+            SELECT u.id, u.username, u.nome_completo, u.permissao, u.matricula, s.expira_em 
+            FROM sessoes s 
+            JOIN usuarios u ON s.usuario_id = u.id 
+            WHERE s.token_hash = ? AND u.ativo = 1 
+        ''', (token_hash,)).fetchone()
+    if sessao is None:
+        return None
+    usuario = dict(zip(['id', 'username', 'nome_completo', 'permissao', 'matricula'], sessao[:5]))
+    return usuario, datetime.strptime(sessao[5], '%Y-%m-%d %H:%M:%S.%f')
+
+def validar_sessao(token):
+    """Retorna o usuário dono do token, ou None se a sessão não existir ou tiver expirado"""
+    token_hash = hash_token(token)
+    sessao = get_cache_sessoes().obter((token_hash,), lambda: _carregar_sessao(token_hash))
+    if sessao is None:
+        return None
+    usuario, expira_em = sessao
+    if expira_em <= datetime.now(timezone.utc).replace(tzinfo=None):
+        encerrar_sessao(token)
+        return None
+    return usuario
+
+@instrumentada
+def encerrar_sessao(token):
+    token_hash = hash_token(token)
+    with transacao(invalidar_cache=False) as conn:
+        conn.execute('DELETE FROM sessoes WHERE token_hash = ?', (token_hash,))
+    get_cache_sessoes().descartar((token_hash,))
@@ -0,0 +1,27 @@
+"""Apoio aos testes: banco temporário compartilhado e consultas diretas"""
+import os
+import sqlite3
+import tempfile
+
+import statusrota
+
+_diretorio = None
+
+def configurar_banco_temporario():
+    """Aponta a camada de dados para um banco em um diretório temporário.
+
+    O banco é um por processo (ver banco.configurar): todos os módulos de teste o
+    compartilham, e o diretório é apagado ao fim do processo.
+    """
+    global _diretorio
+    if _diretorio is None:
+        _diretorio = tempfile.TemporaryDirectory()
+        statusrota.configurar(os.path.join(_diretorio.name, 'pops_rotas.db'))
+
+def consultar(sql, params=()):
+    """Leitura em uma conexão própria, fora do pool e do cache de leituras"""
+    conn = sqlite3.connect(statusrota.get_caminho_banco())
+    try:
+        return conn.execute(sql, params).fetchall()
+    finally:
+        conn.close()
@@ -0,0 +1,71 @@
+"""Controle de concorrência otimista nas atualizações de status das rotas"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import statusrota
+from apoio import configurar_banco_temporario, consultar
+
+def setUpModule():
+    configurar_banco_temporario()
+
+def _alteracao(rota, status_fusao):
+    return {'id': rota['id'], 'versao': rota['versao'], 'status_lancamento': rota['status_lancamento'],
+            'status_fusao': status_fusao, 'observacoes_lancamento': None, 'observacoes_fusao': None,
+            'status_alimentacao': None}
+
+class TestConcorrenciaRotas(unittest.TestCase):
+    def setUp(self):
+        nome_pop = f'POP {self.id()}'
+        statusrota.add_pop(nome_pop, '', 0)
+        pop_id = consultar('SELECT id FROM pops WHERE nome_pop = ?', (nome_pop,))[0][0]
+        statusrota.add_cidade('Cidade', pop_id)
+        cidade_id = consultar('SELECT id FROM cidades WHERE pop_id = ?', (pop_id,))[0][0]
+        for nome_rota in ('R1', 'R2'):
+            statusrota.add_rota(pop_id, cidade_id, nome_rota)
+        self.rota_ids = [rota_id for (rota_id,) in consultar('SELECT id FROM rotas WHERE pop_id = ? ORDER BY id', (pop_id,))]
+
+    def _atualizar(self, rota, status_fusao, usuario):
+        return statusrota.update_status_rota(rota['id'], rota['status_lancamento'], status_fusao,
+                                             usuario=usuario, versao=rota['versao'])
+
+    def test_versao_desatualizada_nao_grava(self):
+        # Duas pessoas leem a mesma versão; só a primeira gravação vale
+        lida = statusrota.get_rota(self.rota_ids[0])
+        self.assertTrue(self._atualizar(lida, statusrota.STATUS_EM_ANDAMENTO, 'ana'))
+        self.assertFalse(self._atualizar(lida, statusrota.STATUS_FINALIZADA, 'bruno'))
+
+        atual = statusrota.get_rota(self.rota_ids[0])
+        self.assertEqual(atual['status_fusao'], statusrota.STATUS_EM_ANDAMENTO)
+        self.assertEqual(atual['usuario_atualizacao'], 'ana')
+        self.assertEqual(atual['versao'], lida['versao'] + 1)
+
+        # Relida, a nova versão grava normalmente
+        self.assertTrue(self._atualizar(atual, statusrota.STATUS_FINALIZADA, 'bruno'))
+
+    def test_lote_informa_rotas_em_conflito(self):
+        lidas = [statusrota.get_rota(rota_id) for rota_id in self.rota_ids]
+        # Alguém altera a segunda rota depois da leitura do lote
+        self.assertTrue(self._atualizar(lidas[1], statusrota.STATUS_EM_ANDAMENTO, 'ana'))
+
+        atualizadas, conflitos = statusrota.update_status_rotas_em_lote(
+            [_alteracao(rota, statusrota.STATUS_FINALIZADA) for rota in lidas], 'bruno')
+
+        self.assertEqual(atualizadas, 1)
+        self.assertEqual(conflitos, [self.rota_ids[1]])
+        self.assertEqual(statusrota.get_rota(self.rota_ids[0])['status_fusao'], statusrota.STATUS_FINALIZADA)
+        self.assertEqual(statusrota.get_rota(self.rota_ids[1])['status_fusao'], statusrota.STATUS_EM_ANDAMENTO)
+
+    def test_lote_com_rota_excluida_informa_conflito(self):
+        lidas = [statusrota.get_rota(rota_id) for rota_id in self.rota_ids]
+        statusrota.delete_rota(self.rota_ids[0])
+
+        atualizadas, conflitos = statusrota.update_status_rotas_em_lote(
+            [_alteracao(rota, statusrota.STATUS_FINALIZADA) for rota in lidas], 'bruno')
+
+        self.assertEqual((atualizadas, conflitos), (1, [self.rota_ids[0]]))
+
+if __name__ == '__main__':
+    unittest.main()
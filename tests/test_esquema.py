@@ -0,0 +1,178 @@
+"""Migrações do esquema e contadores mantidos por triggers (estatisticas_status/estatisticas_arquivo)"""
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import statusrota
+from statusrota.esquema import init_db
+from apoio import configurar_banco_temporario, consultar
+
+def setUpModule():
+    configurar_banco_temporario()
+
+# Tabelas como eram criadas antes da primeira migração (user_version 0), com os status em texto
+ESQUEMA_ORIGINAL = '''
+    CREATE TABLE usuarios (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE NOT NULL,
+        password_hash TEXT NOT NULL,
+        nome_completo TEXT NOT NULL,
+        matricula TEXT UNIQUE NOT NULL,
+        permissao TEXT DEFAULT 'USER',
+        data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        ativo INTEGER DEFAULT 1
+    );
+    CREATE TABLE pops (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nome_pop TEXT NOT NULL,
+        localizacao TEXT,
+        capacidade INTEGER,
+        data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE cidades (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nome_cidade TEXT NOT NULL,
+        pop_id INTEGER,
+        data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (pop_id) REFERENCES pops (id)
+    );
+    CREATE TABLE rotas (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        pop_id INTEGER,
+        cidade_id INTEGER,
+        nome_rota TEXT NOT NULL,
+        status_lancamento TEXT DEFAULT 'PENDENTE',
+        status_fusao TEXT DEFAULT 'PENDENTE',
+        observacoes_lancamento TEXT,
+        observacoes_fusao TEXT,
+        status_alimentacao TEXT,
+        data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        data_atualizacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        usuario_atualizacao TEXT,
+        FOREIGN KEY (pop_id) REFERENCES pops (id),
+        FOREIGN KEY (cidade_id) REFERENCES cidades (id)
+    );
+    INSERT INTO pops (nome_pop, localizacao, capacidade) VALUES ('POP Centro', '-23.5505, -46.6333', 100);
+    INSERT INTO pops (nome_pop, localizacao, capacidade) VALUES ('POP Norte', 'Campinas - SP', 50);
+    INSERT INTO cidades (nome_cidade, pop_id) VALUES ('Cidade A', 1);
+    INSERT INTO cidades (nome_cidade, pop_id) VALUES ('Cidade B', 2);
+    INSERT INTO rotas (pop_id, cidade_id, nome_rota, status_lancamento, status_fusao, observacoes_fusao, status_alimentacao)
+    VALUES (1, 1, 'R1', 'FINALIZADA', 'em andamento', 'cabo rompido', 'ALIMENTADA');
+    INSERT INTO rotas (pop_id, cidade_id, nome_rota) VALUES (1, 1, 'R2');
+    INSERT INTO rotas (pop_id, cidade_id, nome_rota, status_lancamento, status_fusao) VALUES (2, 2, 'R3', 'FINALIZADA', 'FINALIZADA');
+'''
+
+def _contadores(c):
+    # Linhas zeradas sobram dos triggers e não existem em uma reconstrução
+    return (c.execute('SELECT * FROM estatisticas_status WHERE quantidade != 0 ORDER BY 1, 2, 3').fetchall(),
+            c.execute('SELECT * FROM estatisticas_arquivo WHERE quantidade != 0 ORDER BY 1').fetchall())
+
+class TestMigracoes(unittest.TestCase):
+    def setUp(self):
+        diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(diretorio.cleanup)
+        self.caminho = os.path.join(diretorio.name, 'original.db')
+        conn = sqlite3.connect(self.caminho)
+        conn.executescript(ESQUEMA_ORIGINAL)
+        conn.close()
+
+    def _migrar(self):
+        # Como em banco.get_pool: chaves estrangeiras ativas e uma única transação de escrita
+        conn = sqlite3.connect(self.caminho, isolation_level=None)
+        self.addCleanup(conn.close)
+        conn.execute('PRAGMA foreign_keys = ON')
+        conn.execute('BEGIN IMMEDIATE')
+        init_db(conn)
+        conn.execute('COMMIT')
+        return conn
+
+    def test_banco_original_chega_a_ultima_versao(self):
+        conn = self._migrar()
+
+        self.assertEqual(statusrota.get_versao_esquema(conn), len(statusrota.MIGRACOES))
+        self.assertEqual(conn.execute('PRAGMA integrity_check').fetchall(), [('ok',)])
+        self.assertEqual(conn.execute('PRAGMA foreign_key_check').fetchall(), [])
+
+        # Status em texto viram códigos; rotas começam na versão 0
+        self.assertEqual(conn.execute('''
+            SELECT nome_rota, status_lancamento, status_fusao, status_alimentacao, versao FROM rotas ORDER BY id
+        ''').fetchall(), [
+            ('R1', statusrota.STATUS_FINALIZADA, statusrota.STATUS_EM_ANDAMENTO, statusrota.CODIGOS_ALIMENTACAO['ALIMENTADA'], 0),
+            ('R2', statusrota.STATUS_PENDENTE, statusrota.STATUS_PENDENTE, None, 0),
+            ('R3', statusrota.STATUS_FINALIZADA, statusrota.STATUS_FINALIZADA, None, 0),
+        ])
+
+        # Contadores, busca e índice espacial preenchidos a partir dos dados existentes
+        contadores = _contadores(conn)
+        self.assertEqual(sum(quantidade for (_, tipo, _, quantidade) in contadores[0] if tipo == 'lancamento'), 3)
+        statusrota.reconstruir_estatisticas(conn)
+        self.assertEqual(_contadores(conn), contadores)
+        self.assertEqual(conn.execute("SELECT rowid FROM busca_rotas WHERE busca_rotas MATCH '\"cabo\"*'").fetchall(), [(1,)])
+        self.assertEqual(conn.execute('SELECT id, latitude, longitude FROM pops ORDER BY id').fetchall(),
+                         [(1, -23.5505, -46.6333), (2, None, None)])
+        self.assertEqual(conn.execute('SELECT id FROM pops_geo').fetchall(), [(1,)])
+
+    def test_reaplicar_nao_altera_nada(self):
+        self._migrar()
+        conn = self._migrar()
+        self.assertEqual(statusrota.get_versao_esquema(conn), len(statusrota.MIGRACOES))
+        self.assertEqual(conn.execute('SELECT COUNT(*) FROM rotas').fetchone(), (3,))
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM usuarios WHERE username = 'admin'").fetchone(), (1,))
+
+class TestContadores(unittest.TestCase):
+    """Depois de cada tipo de escrita, os contadores dos triggers equivalem a uma reconstrução"""
+
+    def assertContadoresConferem(self):
+        conn = sqlite3.connect(statusrota.get_caminho_banco())
+        try:
+            mantidos = _contadores(conn)
+            statusrota.reconstruir_estatisticas(conn)
+            self.assertEqual(_contadores(conn), mantidos)
+        finally:
+            conn.rollback()
+            conn.close()
+
+    def test_contadores_acompanham_as_escritas(self):
+        pop_ids = []
+        for nome_pop in ('POP Contadores A', 'POP Contadores B'):
+            statusrota.add_pop(nome_pop, '', 0)
+            pop_ids.append(consultar('SELECT id FROM pops WHERE nome_pop = ?', (nome_pop,))[0][0])
+            statusrota.add_cidade(f'Cidade {nome_pop}', pop_ids[-1])
+        cidade_ids = [consultar('SELECT id FROM cidades WHERE pop_id = ?', (pop_id,))[0][0] for pop_id in pop_ids]
+
+        # Inclusão
+        for nome_rota in ('C1', 'C2', 'C3'):
+            statusrota.add_rota(pop_ids[0], cidade_ids[0], nome_rota)
+        rota_ids = [rota_id for (rota_id,) in consultar('SELECT id FROM rotas WHERE pop_id = ? ORDER BY id', (pop_ids[0],))]
+        self.assertContadoresConferem()
+
+        # Atualização de status
+        statusrota.update_status_rota(rota_ids[0], statusrota.STATUS_FINALIZADA, statusrota.STATUS_FINALIZADA)
+        statusrota.update_status_rota(rota_ids[1], statusrota.STATUS_EM_ANDAMENTO, statusrota.STATUS_PENDENTE,
+                                      status_alimentacao=statusrota.CODIGOS_ALIMENTACAO['SEM SINAL TOTAL'])
+        self.assertContadoresConferem()
+
+        # Transferência para a cidade de outro POP
+        self.assertEqual(statusrota.mover_rotas([rota_ids[1]], cidade_ids[1]), 1)
+        self.assertContadoresConferem()
+
+        # Arquivamento e restauração
+        self.assertGreaterEqual(statusrota.arquivar_rotas(0), 1)
+        self.assertEqual(consultar('SELECT COUNT(*) FROM rotas_arquivo WHERE id = ?', (rota_ids[0],)), [(1,)])
+        self.assertContadoresConferem()
+        self.assertEqual(statusrota.restaurar_rotas_arquivadas([rota_ids[0]]), 1)
+        self.assertContadoresConferem()
+        statusrota.arquivar_rotas(0)
+
+        # Exclusão de uma rota e, em cascata, de um POP com rotas ativas e arquivadas
+        statusrota.delete_rota(rota_ids[2])
+        self.assertContadoresConferem()
+        self.assertEqual(statusrota.excluir_pops([pop_ids[0]]), 1)
+        self.assertContadoresConferem()
+
+if __name__ == '__main__':
+    unittest.main()
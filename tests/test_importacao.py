@@ -0,0 +1,74 @@
+"""Importação em lote: reimportação idempotente e coordenadas dos POPs"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+import statusrota
+from apoio import configurar_banco_temporario, consultar
+
+def setUpModule():
+    configurar_banco_temporario()
+
+def _importar(linhas):
+    dados, erros = statusrota.validar_planilha(pd.DataFrame(linhas, columns=statusrota.COLUNAS_IMPORTACAO))
+    assert erros.empty, erros
+    return statusrota.importar_planilha(dados, 'teste')
+
+class TestReimportacaoComArquivo(unittest.TestCase):
+    def setUp(self):
+        self.pop = f'POP {self.id()}'
+        self.linhas = [
+            [self.pop, '', '', 'Cidade A', 'R1', 'FINALIZADA', 'FINALIZADA', '', '', ''],
+            [self.pop, '', '', 'Cidade A', 'R2', 'PENDENTE', 'PENDENTE', '', '', ''],
+        ]
+        _importar(self.linhas)
+        self.assertEqual(statusrota.arquivar_rotas(0), 1)
+
+    def _rotas(self, tabela):
+        return consultar(f'''
+            SELECT r.nome_rota, r.status_fusao FROM {tabela} r JOIN pops p ON p.id = r.pop_id
+            WHERE p.nome_pop = ? ORDER BY r.nome_rota
+        ''', (self.pop,))
+
+    def test_reimportar_nao_duplica_rota_arquivada(self):
+        resumo = _importar(self.linhas)
+
+        self.assertEqual(resumo['rotas_novas'], 0)
+        self.assertEqual(resumo['rotas_atualizadas'], 0)
+        self.assertEqual(self._rotas('rotas'), [('R2', statusrota.STATUS_PENDENTE)])
+        self.assertEqual(self._rotas('rotas_arquivo'), [('R1', statusrota.STATUS_FINALIZADA)])
+
+    def test_reimportar_com_alteracao_restaura_rota_arquivada(self):
+        self.linhas[0][6] = 'EM ANDAMENTO'
+        resumo = _importar(self.linhas)
+
+        self.assertEqual(resumo['rotas_novas'], 0)
+        self.assertEqual(resumo['rotas_atualizadas'], 1)
+        self.assertEqual(self._rotas('rotas'), [('R1', statusrota.STATUS_EM_ANDAMENTO), ('R2', statusrota.STATUS_PENDENTE)])
+        self.assertEqual(self._rotas('rotas_arquivo'), [])
+
+class TestCoordenadasImportadas(unittest.TestCase):
+    def _coordenadas(self, nome_pop):
+        return consultar('SELECT latitude, longitude FROM pops WHERE nome_pop = ?', (nome_pop,))[0]
+
+    def test_localizacao_com_coordenadas_preenche_e_atualiza(self):
+        pop = f'POP {self.id()}'
+        _importar([[pop, '-23.5505, -46.6333', '', '', '', '', '', '', '', '']])
+        self.assertEqual(self._coordenadas(pop), (-23.5505, -46.6333))
+        self.assertEqual(statusrota.pops_proximos(-23.5505, -46.6333, 1)[0]['nome_pop'], pop)
+
+        _importar([[pop, '-22,9068; -43,1729', '', '', '', '', '', '', '', '']])
+        self.assertEqual(self._coordenadas(pop), (-22.9068, -43.1729))
+
+    def test_localizacao_sem_coordenadas_mantem_as_atuais(self):
+        pop = f'POP {self.id()}'
+        _importar([[pop, '-23.5505, -46.6333', '', '', '', '', '', '', '', '']])
+        _importar([[pop, 'São Paulo - SP', '', '', '', '', '', '', '', '']])
+        self.assertEqual(self._coordenadas(pop), (-23.5505, -46.6333))
+
+if __name__ == '__main__':
+    unittest.main()